@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Dataset, Equipment
+from .models import (
+    Anomaly, ColumnMapping, Dataset, DatasetDeletion, Equipment, EquipmentType, ParameterThreshold,
+    RetentionPolicy, UploadSession
+)
 
 
 @admin.register(Dataset)
@@ -13,4 +16,52 @@ class DatasetAdmin(admin.ModelAdmin):
 class EquipmentAdmin(admin.ModelAdmin):
     list_display = ['equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature']
     list_filter = ['equipment_type', 'dataset']
-    search_fields = ['equipment_name', 'equipment_type']
+    list_select_related = ['equipment_type']
+    search_fields = ['equipment_name', 'equipment_type__name']
+
+
+@admin.register(EquipmentType)
+class EquipmentTypeAdmin(admin.ModelAdmin):
+    list_display = ['name']
+    search_fields = ['name']
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'user', 'created_at', 'total_size']
+    list_filter = ['created_at', 'user']
+    search_fields = ['filename', 'user__username']
+
+
+@admin.register(RetentionPolicy)
+class RetentionPolicyAdmin(admin.ModelAdmin):
+    list_display = ['user', 'max_datasets', 'max_age_days', 'max_total_rows']
+    search_fields = ['user__username']
+
+
+@admin.register(Anomaly)
+class AnomalyAdmin(admin.ModelAdmin):
+    list_display = ['equipment', 'dataset', 'parameter', 'rule', 'direction', 'value', 'score']
+    list_filter = ['parameter', 'rule', 'direction']
+    list_select_related = ['equipment__equipment_type', 'dataset']
+    raw_id_fields = ['dataset', 'equipment']
+
+
+@admin.register(ParameterThreshold)
+class ParameterThresholdAdmin(admin.ModelAdmin):
+    list_display = ['user', 'parameter', 'min_value', 'max_value']
+    list_filter = ['parameter']
+    search_fields = ['user__username']
+
+
+@admin.register(ColumnMapping)
+class ColumnMappingAdmin(admin.ModelAdmin):
+    list_display = ['user']
+    search_fields = ['user__username']
+
+
+@admin.register(DatasetDeletion)
+class DatasetDeletionAdmin(admin.ModelAdmin):
+    list_display = ['dataset_id', 'user', 'deleted_at']
+    list_filter = ['deleted_at']
+    search_fields = ['user__username']
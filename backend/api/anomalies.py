@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .columnar import PARAMETER_COLUMNS
+from .models import Anomaly, Equipment, ParameterThreshold
+
+ANOMALY_RULES = [rule for rule, _ in Anomaly.RULE_CHOICES]
+
+# Anomaly rows inserted per statement
+ANOMALY_BATCH_SIZE = 5000
+
+
+def get_thresholds(user):
+    """
+    Return ``{parameter: (min_value, max_value)}`` for the user's configured limits
+    """
+    return {
+        parameter: (min_value, max_value)
+        for parameter, min_value, max_value in ParameterThreshold.objects.filter(
+            user=user
+        ).values_list('parameter', 'min_value', 'max_value')
+    }
+
+
+def load_readings(equipment):
+    """
+    Load ids, type ids and parameter values of an equipment queryset into
+    one structured NumPy array
+    """
+    parameters = list(PARAMETER_COLUMNS.values())
+    dtype = [('id', 'i8'), ('type', 'i8')] + [(parameter, 'f8') for parameter in parameters]
+    return np.fromiter(
+        equipment.order_by().values_list('id', 'equipment_type_id', *parameters).iterator(chunk_size=2000),
+        dtype=dtype
+    )
+
+
+def zscore_scores(codes, values, min_group_size):
+    """
+    Signed z-score of every value within its equipment type, NaN where the
+    type has fewer than ``min_group_size`` rows or no spread
+    """
+    counts = np.bincount(codes)
+    means = np.bincount(codes, weights=values) / np.maximum(counts, 1)
+    variances = np.bincount(codes, weights=values ** 2) / np.maximum(counts, 1) - means ** 2
+    stds = np.sqrt(np.maximum(variances, 0.0))
+    valid = (counts >= min_group_size) & (stds > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = (values - means[codes]) / stds[codes]
+    scores[~valid[codes]] = np.nan
+    return scores
+
+
+def iqr_scores(codes, values, factor, min_group_size):
+    """
+    Signed distance beyond the Tukey fences of each value's equipment type,
+    in multiples of the type's IQR; 0 inside the fences, NaN where the type
+    is too small or has no spread
+    """
+    quartiles = pd.Series(values).groupby(codes).quantile([0.25, 0.75]).unstack()
+    q1 = np.full(codes.max() + 1, np.nan)
+    q3 = np.full(codes.max() + 1, np.nan)
+    q1[quartiles.index] = quartiles[0.25].to_numpy()
+    q3[quartiles.index] = quartiles[0.75].to_numpy()
+    iqr = q3 - q1
+    counts = np.bincount(codes)
+    valid = (counts >= min_group_size) & (iqr > 0)
+
+    low, high = q1 - factor * iqr, q3 + factor * iqr
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(
+            values > high[codes], (values - high[codes]) / iqr[codes],
+            np.where(values < low[codes], (values - low[codes]) / iqr[codes], 0.0)
+        )
+    scores[~valid[codes]] = np.nan
+    return scores
+
+
+def threshold_scores(values, min_value, max_value):
+    """
+    Signed amount by which each value exceeds the limits, 0 within them
+    """
+    scores = np.zeros(len(values))
+    if max_value is not None:
+        scores = np.where(values > max_value, values - max_value, scores)
+    if min_value is not None:
+        scores = np.where(values < min_value, values - min_value, scores)
+    return scores
+
+
+def detect_anomalies(dataset, since_id=None):
+    """
+    Flag anomalous readings of a dataset and store them as Anomaly rows.
+
+    Every parameter is checked per equipment type with the z-score and IQR
+    rules and against the owner's ParameterThreshold limits, each as a few
+    whole-array NumPy operations. Previous results are replaced. With
+    ``since_id`` only equipment rows with a larger id (rows just appended)
+    are checked, against the threshold rule alone, and added to the existing
+    results; the statistical rules describe the whole dataset and are
+    refreshed by a full run. Returns the number of anomalies stored.
+    """
+    config = settings.ANOMALY_DETECTION
+    thresholds = get_thresholds(dataset.user)
+
+    equipment = Equipment.objects.filter(dataset=dataset)
+    if since_id is not None:
+        equipment = equipment.filter(id__gt=since_id)
+    else:
+        dataset.anomalies.all().delete()
+
+    readings = load_readings(equipment)
+    if not len(readings):
+        return 0
+    # Dense 0..n-1 codes keep the per-type bincounts small
+    codes, _ = pd.factorize(readings['type'])
+
+    anomalies = []
+    for parameter in PARAMETER_COLUMNS.values():
+        values = readings[parameter]
+        rules = []
+        if since_id is None:
+            z = zscore_scores(codes, values, config['MIN_GROUP_SIZE'])
+            z[np.abs(z) <= config['ZSCORE_LIMIT']] = np.nan
+            rules.append(('zscore', z))
+            rules.append(('iqr', iqr_scores(codes, values, config['IQR_FACTOR'], config['MIN_GROUP_SIZE'])))
+        if parameter in thresholds:
+            rules.append(('threshold', threshold_scores(values, *thresholds[parameter])))
+
+        for rule, scores in rules:
+            flagged = np.flatnonzero(np.nan_to_num(scores) != 0)
+            anomalies.extend(
+                Anomaly(
+                    dataset=dataset,
+                    equipment_id=equipment_id,
+                    parameter=parameter,
+                    rule=rule,
+                    direction='high' if score > 0 else 'low',
+                    value=value,
+                    score=abs(score)
+                )
+                for equipment_id, value, score in zip(
+                    readings['id'][flagged].tolist(), values[flagged].tolist(), scores[flagged].tolist()
+                )
+            )
+
+    Anomaly.objects.bulk_create(anomalies, batch_size=ANOMALY_BATCH_SIZE)
+    return len(anomalies)
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+    
+    def ready(self):
+        # Connect the token cache invalidation signals
+        from . import authentication  # noqa: F401
+        
+        # Count the queries of every request for /metrics
+        from django.db.backends.signals import connection_created
+        from .metrics import install_query_recorder
+        connection_created.connect(install_query_recorder, dispatch_uid='api.metrics.query_recorder')
@@ -0,0 +1,171 @@
+import functools
+from time import perf_counter
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from .authentication import atoken_user
+from . import metrics
+from .models import Dataset
+from .replicas import replica_reads
+from .serializers import DatasetSerializer
+from .views import with_equipment
+
+# As in views, modules needing pandas, NumPy or ReportLab are imported by
+# the views that use them; gunicorn.conf.py preloads them in production.
+
+
+def run_in_thread(func):
+    """
+    Run blocking work (serialization, PDF rendering) on the default thread
+    pool instead of the single thread Django shares between sync code, so
+    slow requests do not queue behind each other. Each pool thread keeps
+    its own database connection until ``CONN_MAX_AGE`` runs out, which
+    with ``DB_POOL=builtin`` returns it to the pool after every call.
+    """
+    @functools.wraps(func)
+    def call(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)
+
+
+async def token_user(request):
+    """
+    Resolve the user of an ``Authorization: Token <key>`` header, the same
+    credentials ``CachedTokenAuthentication`` accepts
+    """
+    keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+    if keyword != 'Token' or not key.strip():
+        return None
+    return await atoken_user(key.strip())
+
+
+def token_required(view):
+    """Async equivalent of ``@api_view(['GET'])`` with ``IsAuthenticated``"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return JsonResponse(
+                {'detail': f'Method "{request.method}" not allowed.'},
+                status=405,
+                headers={'Allow': 'GET, HEAD'}
+            )
+        user = await token_user(request)
+        if user is None:
+            return JsonResponse(
+                {'detail': 'Authentication credentials were not provided.'},
+                status=401,
+                headers={'WWW-Authenticate': 'Token'}
+            )
+        request.user = user
+        return await view(request, *args, **kwargs)
+    # Token authenticated like the DRF views, so no CSRF cookie is involved
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+async def get_user_dataset(request, dataset_id):
+    try:
+        return await Dataset.objects.aget(id=dataset_id, user=request.user)
+    except Dataset.DoesNotExist:
+        return None
+
+
+def json_response(data, **kwargs):
+    """JsonResponse whose encoding time is recorded as serialization time"""
+    started = perf_counter()
+    response = JsonResponse(data, **kwargs)
+    metrics.record_render(perf_counter() - started)
+    return response
+
+
+def dataset_not_found():
+    return JsonResponse({'error': 'Dataset not found'}, status=404)
+
+
+@token_required
+@replica_reads
+async def get_history(request):
+    """Get upload history (last 5 datasets)"""
+    @run_in_thread
+    def serialize():
+        datasets = with_equipment(Dataset.objects.filter(user=request.user))[:5]
+        return DatasetSerializer(datasets, many=True).data
+
+    return json_response(await serialize(), safe=False)
+
+
+@token_required
+@replica_reads
+async def get_dataset_detail(request, dataset_id):
+    """Get detailed information about a specific dataset"""
+    from .utils import get_dataset_summary
+
+    dataset = await get_user_dataset(request, dataset_id)
+    if dataset is None:
+        return dataset_not_found()
+    return json_response(await run_in_thread(get_dataset_summary)(dataset))
+
+
+@token_required
+@replica_reads
+async def generate_report(request, dataset_id):
+    """Generate PDF report for a dataset"""
+    from .pdf_generator import generate_pdf_report
+
+    dataset = await get_user_dataset(request, dataset_id)
+    if dataset is None:
+        return dataset_not_found()
+    pdf_buffer = await run_in_thread(generate_pdf_report)(dataset)
+
+    response = HttpResponse(pdf_buffer, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{dataset.filename}_report.pdf"'
+    return response
+
+
+@token_required
+async def export_column(request, dataset_id, parameter):
+    """Stream one parameter as raw little-endian float64 values in row order"""
+    from .export import acolumn_blocks
+
+    dataset = await get_user_dataset(request, dataset_id)
+    if dataset is None:
+        return dataset_not_found()
+    parameters = dataset.parameter_labels()
+    if parameter not in parameters:
+        return JsonResponse(
+            {'error': f"parameter must be one of: {', '.join(parameters)}"},
+            status=400
+        )
+
+    response = StreamingHttpResponse(
+        acolumn_blocks(dataset, parameter), content_type='application/octet-stream'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{dataset.filename}_{parameter}.f8"'
+    response['X-Row-Count'] = dataset.total_count
+    return response
+
+
+@token_required
+async def export_dataset(request, dataset_id):
+    """Stream a dataset as CSV, gzip-compressed CSV or Parquet"""
+    from .export import (
+        EXPORT_FORMATS, aiterate, export_filename, export_stream, parse_export_options
+    )
+
+    dataset = await get_user_dataset(request, dataset_id)
+    if dataset is None:
+        return dataset_not_found()
+    try:
+        export_format, fields, types = parse_export_options(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    response = StreamingHttpResponse(
+        aiterate(export_stream(dataset, export_format, fields, types)),
+        content_type=EXPORT_FORMATS[export_format][0]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(dataset, export_format)}"'
+    return response
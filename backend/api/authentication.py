@@ -0,0 +1,80 @@
+import hashlib
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+# Cache alias holding token -> (user, token) entries; its TIMEOUT bounds how
+# long a token revoked in another process can still be accepted
+TOKEN_CACHE = 'tokens'
+
+
+def token_cache_key(key):
+    # Hashed so raw credentials never end up in a shared cache backend
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_tokens(keys):
+    """Drop cached lookups of the given token keys"""
+    caches[TOKEN_CACHE].delete_many([token_cache_key(key) for key in keys])
+
+
+async def atoken_user(key):
+    """
+    Async lookup of the active user owning token ``key`` through the same
+    cache, or None
+    """
+    cache = caches[TOKEN_CACHE]
+    cache_key = token_cache_key(key)
+    cached = await cache.aget(cache_key)
+    if cached is None:
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            return None
+        cached = (token.user, token)
+        await cache.aset(cache_key, cached)
+
+    user, _ = cached
+    return user if user.is_active else None
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers token -> user lookups in the
+    ``tokens`` cache, so repeated requests with the same token skip the
+    token/user join. Entries are dropped when the token is deleted (logout,
+    rotation) or its user is saved or deleted, and otherwise expire after
+    the cache TIMEOUT.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = caches[TOKEN_CACHE]
+        cache_key = token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is None:
+            try:
+                token = Token.objects.select_related('user').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            cached = (token.user, token)
+            cache.set(cache_key, cached)
+
+        user, token = cached
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return user, token
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_tokens(sender, instance, **kwargs):
+    invalidate_tokens(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
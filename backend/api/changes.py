@@ -0,0 +1,55 @@
+"""
+What changed in a user's datasets since a cursor, for clients that poll
+instead of reloading their whole dataset list.
+
+A cursor is the server time of the previous poll. Datasets are reported by
+``Dataset.updated_at`` and deletions by their ``DatasetDeletion`` record,
+both from ``CHANGES_OVERLAP_SECONDS`` before the cursor on, so a change may
+be reported twice and clients apply them idempotently.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Dataset, DatasetDeletion
+
+# UTC with a 'Z' suffix, so a cursor needs no escaping in a query string
+CURSOR_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+
+def parse_cursor(value):
+    """Datetime of a cursor returned by ``dataset_changes``"""
+    try:
+        cursor = parse_datetime(value)
+    except ValueError:
+        cursor = None
+    if cursor is None or timezone.is_naive(cursor):
+        raise ValueError('since must be a cursor returned by a previous request')
+    return cursor
+
+
+def dataset_changes(user, since=None):
+    """
+    Return ``{'cursor', 'reset', 'changed', 'deleted'}``: the next cursor,
+    the user's datasets changed since ``since`` as a queryset and the ids of
+    those deleted. Without a cursor, or with one older than the deletions
+    kept, ``reset`` is True and ``changed`` holds every dataset, so the
+    client replaces its list.
+    """
+    now = timezone.now()
+    datasets = Dataset.objects.filter(user=user)
+    changes = {'cursor': now.strftime(CURSOR_FORMAT)}
+    if since is None or since < now - timedelta(days=settings.DATASET_TOMBSTONE_DAYS):
+        changes.update(reset=True, changed=datasets, deleted=[])
+        return changes
+
+    after = since - timedelta(seconds=settings.CHANGES_OVERLAP_SECONDS)
+    changes.update(
+        reset=False,
+        changed=datasets.filter(updated_at__gt=after),
+        deleted=list(
+            DatasetDeletion.objects.filter(user=user, deleted_at__gt=after)
+            .values_list('dataset_id', flat=True)
+        )
+    )
+    return changes
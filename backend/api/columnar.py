@@ -0,0 +1,251 @@
+import json
+import os
+import shutil
+import numpy as np
+from django.conf import settings
+
+COLUMN_DIR = os.path.join(settings.MEDIA_ROOT, 'columns')
+
+# CSV column -> column file for each numeric parameter
+PARAMETER_COLUMNS = {
+    'Flowrate': 'flowrate',
+    'Pressure': 'pressure',
+    'Temperature': 'temperature',
+}
+
+META_FILE = 'meta.json'
+
+# Equipment names decoded per read of the names blob
+NAME_BLOCK_ROWS = 65536
+
+
+def enabled():
+    """Whether new datasets are also written as column files"""
+    return getattr(settings, 'COLUMNAR_STORAGE', False)
+
+
+def dataset_dir(dataset_id):
+    """Directory holding the column files of a dataset"""
+    return os.path.join(COLUMN_DIR, str(dataset_id))
+
+
+class ColumnWriter:
+    """
+    Write column chunks of one dataset to raw little-endian column files.
+
+    Numeric parameters become flat ``float64`` (or ``float32`` with
+    ``EQUIPMENT_COMPACT_FLOATS``) files, equipment types are dictionary
+    encoded into ``int32`` codes and names are stored as one UTF-8 blob with
+    ``int64`` end offsets. ``meta.json`` is written last by ``close``, so a
+    directory without it is an incomplete write and is ignored by readers.
+
+    With ``append=True`` rows are added after the existing ones. Readers
+    keep seeing the previous row count until ``close`` replaces the metadata,
+    and ``abort`` cuts the files back to their previous length.
+    """
+
+    def __init__(self, dataset_id, append=False):
+        self.path = dataset_dir(dataset_id)
+        self.append = append
+        files = list(PARAMETER_COLUMNS.values()) + ['type_codes', 'names', 'name_offsets']
+        if append:
+            with open(os.path.join(self.path, META_FILE)) as f:
+                meta = json.load(f)
+            self.float_dtype = np.dtype(meta['float_dtype'])
+            self.rows = meta['rows']
+            self.types = {eq_type: code for code, eq_type in enumerate(meta['types'])}
+            # Sizes that cover the committed rows; anything past them is an
+            # interrupted append and is cut off before writing
+            self.sizes = {
+                name: self.rows * np.dtype(dtype).itemsize
+                for name, dtype in self._dtypes().items()
+            }
+            self.sizes['names'] = self._committed_name_bytes()
+            self.name_bytes = self.sizes['names']
+            self.files = {}
+            for name in files:
+                f = open(os.path.join(self.path, f'{name}.bin'), 'r+b')
+                f.truncate(self.sizes[name])
+                f.seek(self.sizes[name])
+                self.files[name] = f
+            return
+
+        self.float_dtype = np.dtype('<f4' if settings.EQUIPMENT_COMPACT_FLOATS else '<f8')
+        self.rows = 0
+        self.name_bytes = 0
+        self.types = {}
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path)
+        self.files = {name: open(os.path.join(self.path, f'{name}.bin'), 'wb') for name in files}
+
+    def _dtypes(self):
+        dtypes = {name: self.float_dtype for name in PARAMETER_COLUMNS.values()}
+        dtypes.update(type_codes='<i4', name_offsets='<i8')
+        return dtypes
+
+    def _committed_name_bytes(self):
+        if not self.rows:
+            return 0
+        with open(os.path.join(self.path, 'name_offsets.bin'), 'rb') as f:
+            f.seek((self.rows - 1) * 8)
+            return int(np.frombuffer(f.read(8), dtype='<i8')[0])
+
+    def write(self, columns):
+        for column, name in PARAMETER_COLUMNS.items():
+            self.files[name].write(columns[column].astype(self.float_dtype).tobytes())
+
+        codes = np.fromiter(
+            (self.types.setdefault(str(eq_type), len(self.types)) for eq_type in columns['Type']),
+            dtype='<i4', count=len(columns['Type'])
+        )
+        self.files['type_codes'].write(codes.tobytes())
+
+        encoded = [str(name).encode('utf-8') for name in columns['Equipment Name']]
+        offsets = np.cumsum([len(name) for name in encoded], dtype='<i8') + self.name_bytes
+        self.files['names'].write(b''.join(encoded))
+        self.files['name_offsets'].write(offsets.tobytes())
+        if len(offsets):
+            self.name_bytes = int(offsets[-1])
+        self.rows += len(encoded)
+
+    def passthrough(self, chunks):
+        """Write column chunks as they are iterated, yielding them unchanged"""
+        for columns in chunks:
+            self.write(columns)
+            yield columns
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        meta = {
+            'rows': self.rows,
+            'float_dtype': self.float_dtype.str,
+            'parameters': list(PARAMETER_COLUMNS.values()),
+            'types': sorted(self.types, key=self.types.get),
+        }
+        # Replace atomically so readers never see a half-written file
+        meta_path = os.path.join(self.path, META_FILE)
+        with open(f'{meta_path}.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(f'{meta_path}.tmp', meta_path)
+
+    def abort(self):
+        for name, f in self.files.items():
+            if self.append:
+                f.truncate(self.sizes[name])
+            f.close()
+        if not self.append:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+def capture(dataset_id, chunks):
+    """
+    Pass column chunks through unchanged while writing them to column files
+    """
+    writer = ColumnWriter(dataset_id)
+    completed = False
+    try:
+        yield from writer.passthrough(chunks)
+        completed = True
+    finally:
+        if completed:
+            writer.close()
+        else:
+            writer.abort()
+
+
+class DatasetColumns:
+    """Read-only, memory-mapped view of a dataset's column files"""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.rows = meta['rows']
+        self.float_dtype = np.dtype(meta['float_dtype'])
+        self.parameters = meta['parameters']
+        self.types = meta['types']
+
+    def _map(self, name, dtype):
+        if not self.rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, f'{name}.bin'), dtype=dtype, mode='r', shape=(self.rows,))
+
+    def values(self, parameter):
+        """Memory-mapped array of a numeric parameter"""
+        return self._map(parameter, self.float_dtype)
+
+    def type_codes(self):
+        """Memory-mapped array of indexes into ``types``"""
+        return self._map('type_codes', '<i4')
+
+    def name_slice(self, start, stop):
+        """List of the equipment names of rows ``start`` to ``stop``"""
+        stop = min(stop, self.rows)
+        if start >= stop:
+            return []
+        offsets = self._map('name_offsets', '<i8')
+        ends = offsets[start:stop].tolist()
+        base = int(offsets[start - 1]) if start else 0
+        with open(os.path.join(self.path, 'names.bin'), 'rb') as f:
+            f.seek(base)
+            raw = f.read(ends[-1] - base)
+        names = []
+        position = 0
+        for end in ends:
+            names.append(raw[position:end - base].decode('utf-8'))
+            position = end - base
+        return names
+
+    def names(self):
+        """Iterate equipment names in row order"""
+        if not self.rows:
+            return
+        names_path = os.path.join(self.path, 'names.bin')
+        if not os.path.getsize(names_path):
+            yield from ('' for _ in range(self.rows))
+            return
+        blob = np.memmap(names_path, dtype='u1', mode='r')
+        offsets = self._map('name_offsets', '<i8')
+        start = 0
+        for block in range(0, self.rows, NAME_BLOCK_ROWS):
+            ends = offsets[block:block + NAME_BLOCK_ROWS].tolist()
+            base = start
+            raw = blob[base:ends[-1]].tobytes()
+            text = raw.decode('utf-8')
+            # Byte offsets double as string offsets when the block is ASCII
+            block_names = text if len(text) == len(raw) else None
+            for end in ends:
+                if block_names is None:
+                    yield raw[start - base:end - base].decode('utf-8')
+                else:
+                    yield block_names[start - base:end - base]
+                start = end
+
+
+def open_columns(dataset):
+    """
+    Return the DatasetColumns of a dataset, or None if it has no column files
+    """
+    path = dataset_dir(dataset.pk)
+    try:
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    return DatasetColumns(path, meta)
+
+
+def open_writer(dataset):
+    """
+    Return a ColumnWriter appending to a dataset's column files, or None if
+    it has none. Column files are kept in step with the database even when
+    ``COLUMNAR_STORAGE`` has been turned off since they were written.
+    """
+    if not os.path.exists(os.path.join(dataset_dir(dataset.pk), META_FILE)):
+        return None
+    return ColumnWriter(dataset.pk, append=True)
+
+
+def delete_columns(dataset_ids):
+    """Remove the column files of the given datasets"""
+    for dataset_id in dataset_ids:
+        shutil.rmtree(dataset_dir(dataset_id), ignore_errors=True)
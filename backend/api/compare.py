@@ -0,0 +1,128 @@
+import math
+from django.db.models import Avg, Count, Max, Min, StdDev
+from .columnar import PARAMETER_COLUMNS
+from .models import Equipment
+
+# Most datasets that can be compared in one request
+MAX_COMPARE_DATASETS = 10
+
+AGGREGATES = ['mean', 'min', 'max', 'std']
+
+
+def _grouped_stats(dataset_ids):
+    """
+    Count, mean, min, max and population std of every parameter per
+    (dataset, equipment type), in one grouped query
+    """
+    annotations = {'count': Count('id')}
+    for parameter in PARAMETER_COLUMNS.values():
+        annotations[f'{parameter}_mean'] = Avg(parameter)
+        annotations[f'{parameter}_min'] = Min(parameter)
+        annotations[f'{parameter}_max'] = Max(parameter)
+        annotations[f'{parameter}_std'] = StdDev(parameter)
+    return (
+        Equipment.objects.filter(dataset_id__in=dataset_ids)
+        .values('dataset_id', 'equipment_type__name')
+        .annotate(**annotations)
+        .order_by()
+    )
+
+
+def _combine(groups, parameter):
+    """Merge per-type aggregates of one dataset into whole-dataset aggregates"""
+    total = sum(group['count'] for group in groups)
+    if not total:
+        return {'mean': None, 'min': None, 'max': None, 'std': None}
+    mean = sum(group['count'] * group[f'{parameter}_mean'] for group in groups) / total
+    # Pooled population variance from per-group means and variances
+    second_moment = sum(
+        group['count'] * ((group[f'{parameter}_std'] or 0.0) ** 2 + group[f'{parameter}_mean'] ** 2)
+        for group in groups
+    ) / total
+    return {
+        'mean': mean,
+        'min': min(group[f'{parameter}_min'] for group in groups),
+        'max': max(group[f'{parameter}_max'] for group in groups),
+        'std': math.sqrt(max(second_moment - mean ** 2, 0.0)),
+    }
+
+
+def _delta(value, baseline):
+    if value is None or baseline is None:
+        return None, None
+    delta = value - baseline
+    return round(delta, 4), round(delta / baseline * 100, 2) if baseline else None
+
+
+def _shift(stats, baseline):
+    """Standardized mean difference (Cohen's d) against the baseline"""
+    if stats['mean'] is None or baseline['mean'] is None:
+        return None
+    pooled = math.sqrt((stats['std'] ** 2 + baseline['std'] ** 2) / 2)
+    return round((stats['mean'] - baseline['mean']) / pooled, 4) if pooled else 0.0
+
+
+def _round(value):
+    return None if value is None else round(value, 4)
+
+
+def compare_datasets(datasets):
+    """
+    Aligned comparison of several datasets against the first one.
+
+    Every list in the result has one entry per dataset, in the order given.
+    ``parameters`` holds whole-dataset aggregates with deltas, percentage
+    changes and the standardized shift versus the baseline; ``types`` holds
+    per-equipment-type counts, shares and parameter means.
+    """
+    dataset_ids = [dataset.pk for dataset in datasets]
+    groups = {dataset_id: [] for dataset_id in dataset_ids}
+    for row in _grouped_stats(dataset_ids):
+        groups[row['dataset_id']].append(row)
+
+    parameters = {}
+    for parameter in PARAMETER_COLUMNS.values():
+        stats = [_combine(groups[dataset_id], parameter) for dataset_id in dataset_ids]
+        baseline = stats[0]
+        deltas = [_delta(s['mean'], baseline['mean']) for s in stats]
+        parameters[parameter] = {
+            aggregate: [_round(s[aggregate]) for s in stats] for aggregate in AGGREGATES
+        }
+        parameters[parameter]['delta'] = [delta for delta, _ in deltas]
+        parameters[parameter]['delta_pct'] = [pct for _, pct in deltas]
+        parameters[parameter]['shift'] = [_shift(s, baseline) for s in stats]
+
+    totals = [sum(group['count'] for group in groups[dataset_id]) for dataset_id in dataset_ids]
+    type_names = sorted({group['equipment_type__name'] for rows in groups.values() for group in rows})
+    types = {}
+    for name in type_names:
+        by_dataset = [
+            next((group for group in groups[dataset_id] if group['equipment_type__name'] == name), None)
+            for dataset_id in dataset_ids
+        ]
+        counts = [group['count'] if group else 0 for group in by_dataset]
+        shares = [round(count / total, 4) if total else 0.0 for count, total in zip(counts, totals)]
+        types[name] = {
+            'count': counts,
+            'share': shares,
+            'share_delta': [round(share - shares[0], 4) for share in shares],
+            'averages': {
+                parameter: [_round(group[f'{parameter}_mean']) if group else None for group in by_dataset]
+                for parameter in PARAMETER_COLUMNS.values()
+            },
+        }
+
+    return {
+        'datasets': [
+            {
+                'id': dataset.pk,
+                'filename': dataset.filename,
+                'uploaded_at': dataset.uploaded_at,
+                'total_count': total,
+            }
+            for dataset, total in zip(datasets, totals)
+        ],
+        'baseline': dataset_ids[0],
+        'parameters': parameters,
+        'types': types,
+    }
@@ -0,0 +1,9 @@
+"""
+PostgreSQL database backend whose connections come from a per-process pool.
+
+Enabled with ``DB_POOL=builtin`` (see ``settings.py``), which selects
+``ENGINE: 'api.db_pool'`` with ``CONN_MAX_AGE: 0``. Django then closes a
+thread's connection at the end of every request, which hands it back to
+the pool instead, so the threads of a worker share a bounded number of
+connections rather than holding one each.
+"""
@@ -0,0 +1,33 @@
+from django.db.backends.postgresql import base
+from .pool import PoolTimeout, get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL connection of one thread, borrowed from the process pool"""
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.alias, self.settings_dict.get('POOL', {}))
+        try:
+            connection = pool.acquire(
+                lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+            )
+        except PoolTimeout as e:
+            raise self.Database.OperationalError(str(e)) from e
+        # Set by the parent when it opens a connection; a pooled connection
+        # already carries the configured level
+        self.isolation_level = base.IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', base.IsolationLevel.READ_COMMITTED)
+        )
+        self._pool = pool
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django keeps the connection until the atomic block exits,
+                # so it must not be lent to another thread meanwhile
+                self._pool.discard(self.connection)
+            else:
+                self._pool.release(self.connection)
@@ -0,0 +1,187 @@
+import collections
+import os
+import threading
+import time
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from .. import metrics
+
+# Idle connections older than this many seconds get a ``SELECT 1`` before
+# they are handed out again, so one dropped by the server is replaced
+CHECK_AFTER = 30
+
+
+class PoolTimeout(Exception):
+    """No pooled connection became free in time"""
+
+
+class ConnectionPool:
+    """
+    Up to ``max_size`` open connections, each lent to one thread at a time.
+
+    ``acquire`` hands out the most recently released idle connection, opens
+    a new one while the pool is below ``max_size`` or waits up to
+    ``timeout`` seconds for a release. Whenever the pool is used, idle
+    connections unused for ``max_idle`` seconds are closed down to
+    ``min_size``; a connection open for ``max_lifetime`` seconds is closed
+    instead of being released.
+    """
+
+    def __init__(self, name, max_size=4, min_size=0, timeout=10, max_idle=300, max_lifetime=3600):
+        self.name = name
+        self.max_size = max_size
+        self.min_size = min_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.pid = os.getpid()
+        # Open connections, whether idle or lent out, and when each was opened
+        self.size = 0
+        self._opened = {}
+        # (connection, released at), least recently released first
+        self._idle = collections.deque()
+        self._condition = threading.Condition()
+
+    def acquire(self, connect):
+        """
+        Borrow a connection, opening it with ``connect()`` when the pool has
+        room; the wait, including any connect, is recorded in
+        ``chemparaviz_db_pool_wait_seconds``. Raises ``PoolTimeout``.
+        """
+        started = time.monotonic()
+        while True:
+            connection, idle_seconds = self._take(started + self.timeout)
+            if connection is None:
+                try:
+                    connection = connect()
+                except BaseException:
+                    self._forget(None)
+                    raise
+                with self._condition:
+                    self._opened[connection] = time.monotonic()
+                break
+            if idle_seconds < CHECK_AFTER or self._is_usable(connection):
+                break
+            self.discard(connection)
+
+        metrics.DB_POOL_WAIT.observe(time.monotonic() - started, self.name)
+        self._report()
+        return connection
+
+    def release(self, connection):
+        """
+        Return a borrowed connection, rolled back if a transaction is still
+        open; closed connections, old ones and those of another process are
+        dropped
+        """
+        reusable = (
+            os.getpid() == self.pid and not connection.closed
+            and time.monotonic() - self._opened.get(connection, 0) < self.max_lifetime
+        )
+        if reusable:
+            try:
+                if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except psycopg2.Error:
+                reusable = False
+        if not reusable:
+            self.discard(connection)
+            return
+
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._close_idle()
+            self._condition.notify()
+        self._report()
+
+    def discard(self, connection):
+        """Close a borrowed connection and free its place in the pool"""
+        _close_quietly(connection)
+        self._forget(connection)
+        self._report()
+
+    def _take(self, deadline):
+        """
+        Return ``(idle connection, seconds idle)``, or ``(None, 0)`` after
+        reserving room for a new connection
+        """
+        with self._condition:
+            while True:
+                self._close_idle()
+                if self._idle:
+                    connection, released = self._idle.pop()
+                    return connection, time.monotonic() - released
+                if self.size < self.max_size:
+                    self.size += 1
+                    return None, 0
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    metrics.DB_POOL_TIMEOUTS.inc(self.name)
+                    raise PoolTimeout(
+                        f'No database connection became free within {self.timeout}s '
+                        f'(all {self.max_size} of the pool are in use)'
+                    )
+                self._condition.wait(remaining)
+
+    def _close_idle(self):
+        """Close connections idle for too long; the condition must be held"""
+        now = time.monotonic()
+        while self._idle and self.size > self.min_size and now - self._idle[0][1] > self.max_idle:
+            connection, _ = self._idle.popleft()
+            _close_quietly(connection)
+            self._opened.pop(connection, None)
+            self.size -= 1
+
+    def _forget(self, connection):
+        with self._condition:
+            self._opened.pop(connection, None)
+            self.size -= 1
+            self._condition.notify()
+
+    def _is_usable(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _report(self):
+        with self._condition:
+            idle = len(self._idle)
+            in_use = self.size - idle
+        metrics.DB_POOL_CONNECTIONS.set(idle, self.name, 'idle')
+        metrics.DB_POOL_CONNECTIONS.set(in_use, self.name, 'in_use')
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except psycopg2.Error:
+        pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    """
+    The pool of database ``alias`` in this process, configured from the
+    ``POOL`` entry of its settings; a forked worker gets a fresh one rather
+    than the connections it inherited
+    """
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[alias] = ConnectionPool(
+                alias,
+                max_size=options.get('MAX_SIZE', 4),
+                min_size=options.get('MIN_SIZE', 0),
+                timeout=options.get('TIMEOUT', 10),
+                max_idle=options.get('MAX_IDLE', 300),
+                max_lifetime=options.get('MAX_LIFETIME', 3600),
+            )
+        return pool
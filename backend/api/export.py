@@ -0,0 +1,329 @@
+import io
+import itertools
+import zlib
+import numpy as np
+import pandas as pd
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from . import columnar
+from .models import EquipmentType
+from .parameter_blocks import extra_values
+
+# Rows per block of a streamed export
+EXPORT_BLOCK_ROWS = 65536
+
+COLUMN_EXPORT_DTYPE = '<f8'
+
+
+def column_blocks(dataset, parameter):
+    """
+    Yield one parameter of a dataset as little-endian float64 bytes in row
+    order, a block of ``EXPORT_BLOCK_ROWS`` values at a time
+    """
+    if parameter in dataset.extra_parameters:
+        yield from _value_blocks(extra_values(dataset, parameter))
+        return
+    columns = columnar.open_columns(dataset)
+    if columns is not None:
+        yield from _value_blocks(columns.values(parameter))
+        return
+
+    rows = dataset.equipment.order_by('id').values_list(parameter, flat=True).iterator(
+        chunk_size=EXPORT_BLOCK_ROWS
+    )
+    while True:
+        block = np.fromiter(itertools.islice(rows, EXPORT_BLOCK_ROWS), dtype=COLUMN_EXPORT_DTYPE)
+        if not len(block):
+            return
+        yield block.tobytes()
+
+
+def _value_blocks(values):
+    for start in range(0, len(values), EXPORT_BLOCK_ROWS):
+        yield values[start:start + EXPORT_BLOCK_ROWS].astype(COLUMN_EXPORT_DTYPE).tobytes()
+
+
+def column_block_after(dataset, parameter, after_id):
+    """
+    Return ``(last_id, bytes)`` for the next block of database rows with an
+    id above ``after_id``; a self-contained keyset query, so consecutive
+    blocks may run on different threads and connections
+    """
+    rows = np.array(
+        dataset.equipment.filter(id__gt=after_id).order_by('id').values_list('id', parameter)[:EXPORT_BLOCK_ROWS],
+        dtype='f8'
+    ).reshape(-1, 2)
+    if not len(rows):
+        return after_id, b''
+    return int(rows[-1, 0]), rows[:, 1].astype(COLUMN_EXPORT_DTYPE).tobytes()
+
+
+def _column_block_in_thread(dataset, parameter, after_id):
+    # Runs on a thread of the default pool; hand its connection back to the
+    # database pool (with DB_POOL=builtin) before the thread is reused
+    try:
+        return column_block_after(dataset, parameter, after_id)
+    finally:
+        close_old_connections()
+
+
+async def acolumn_blocks(dataset, parameter):
+    """
+    Async counterpart of ``column_blocks``; each block of database rows is
+    fetched and packed on a worker thread, so the event loop is never blocked
+    """
+    if parameter in dataset.extra_parameters:
+        values = await sync_to_async(extra_values, thread_sensitive=False)(dataset, parameter)
+        for block in _value_blocks(values):
+            yield block
+        return
+    columns = columnar.open_columns(dataset)
+    if columns is not None:
+        for block in column_blocks(dataset, parameter):
+            yield block
+        return
+
+    fetch = sync_to_async(_column_block_in_thread, thread_sensitive=False)
+    last_id = 0
+    while True:
+        last_id, block = await fetch(dataset, parameter, last_id)
+        if not block:
+            return
+        yield block
+
+
+# Query parameter name -> CSV header of every exportable field, in file order
+EXPORT_FIELDS = {
+    'equipment_name': 'Equipment Name',
+    'equipment_type': 'Type',
+    'flowrate': 'Flowrate',
+    'pressure': 'Pressure',
+    'temperature': 'Temperature',
+}
+
+# Format -> (content type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', '.csv'),
+    'csv.gz': ('application/gzip', '.csv.gz'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+}
+
+_END = object()
+
+
+def parquet_available():
+    """Parquet export needs the optional pyarrow package"""
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parse_export_options(params):
+    """
+    Validate the ``file_format``, ``fields`` and ``type`` query parameters
+    of an export, returning ``(file_format, fields, types)`` or raising
+    ValueError. (``format`` itself is taken by DRF's renderer selection.)
+    """
+    export_format = params.get('file_format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"file_format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if export_format == 'parquet' and not parquet_available():
+        raise ValueError('Parquet export is not available on this server (pyarrow is not installed)')
+
+    fields = [field.strip() for field in params.get('fields', '').split(',') if field.strip()]
+    unknown = [field for field in fields if field not in EXPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Valid fields: {', '.join(EXPORT_FIELDS)}")
+    fields = list(dict.fromkeys(fields)) or list(EXPORT_FIELDS)
+
+    types = [
+        eq_type.strip() for value in params.getlist('type')
+        for eq_type in value.split(',') if eq_type.strip()
+    ]
+    return export_format, fields, types or None
+
+
+def export_filename(dataset, export_format):
+    stem = dataset.filename
+    # plant.csv.gz -> plant
+    for suffix in ('.gz', '.zst', '.zip', '.csv'):
+        if stem.lower().endswith(suffix):
+            stem = stem[:-len(suffix)]
+    return f'{stem}{EXPORT_FORMATS[export_format][1]}'
+
+
+def export_frames(dataset, fields, types=None):
+    """
+    Yield the selected ``fields`` of a dataset as DataFrames of at most
+    ``EXPORT_BLOCK_ROWS`` rows, keyed by their CSV headers, optionally only
+    for rows whose equipment type is in ``types``.
+
+    Column files are sliced block by block when the dataset has them;
+    otherwise one database cursor is read in chunks, so memory stays bounded
+    by the block size either way.
+    """
+    columns = columnar.open_columns(dataset)
+    if columns is not None:
+        yield from _column_frames(columns, fields, types)
+        return
+
+    type_names = dict(EquipmentType.objects.values_list('id', 'name'))
+    equipment = dataset.equipment.order_by('id')
+    if types:
+        equipment = equipment.filter(equipment_type__name__in=types)
+    db_fields = ['equipment_type_id' if field == 'equipment_type' else field for field in fields]
+    rows = equipment.values_list(*db_fields).iterator(chunk_size=EXPORT_BLOCK_ROWS)
+    headers = [EXPORT_FIELDS[field] for field in fields]
+    while True:
+        block = list(itertools.islice(rows, EXPORT_BLOCK_ROWS))
+        if not block:
+            return
+        frame = pd.DataFrame.from_records(block, columns=headers)
+        if 'equipment_type' in fields:
+            frame['Type'] = frame['Type'].map(type_names)
+        yield frame
+
+
+def _column_frames(columns, fields, types):
+    type_names = np.array(columns.types, dtype=object)
+    wanted = None
+    if types:
+        wanted = [code for code, name in enumerate(columns.types) if name in types]
+    for start in range(0, columns.rows, EXPORT_BLOCK_ROWS):
+        stop = start + EXPORT_BLOCK_ROWS
+        codes = columns.type_codes()[start:stop]
+        mask = None if wanted is None else np.isin(codes, wanted)
+        if mask is not None and not mask.any():
+            continue
+        data = {}
+        for field in fields:
+            if field == 'equipment_name':
+                values = np.array(columns.name_slice(start, stop), dtype=object)
+            elif field == 'equipment_type':
+                values = type_names[codes]
+            else:
+                values = np.asarray(columns.values(field)[start:stop], dtype='f8')
+            data[EXPORT_FIELDS[field]] = values if mask is None else values[mask]
+        yield pd.DataFrame(data)
+
+
+class CsvEncoder:
+    """Encode DataFrame blocks as one UTF-8 CSV document"""
+
+    def __init__(self, fields):
+        self.headers = [EXPORT_FIELDS[field] for field in fields]
+
+    def start(self):
+        return (','.join(self.headers) + '\n').encode('utf-8')
+
+    def encode(self, frame):
+        return frame.to_csv(index=False, header=False).encode('utf-8')
+
+    def finish(self):
+        return b''
+
+
+class GzipCsvEncoder(CsvEncoder):
+    """CSV compressed into a single gzip member as it is produced"""
+
+    def __init__(self, fields):
+        super().__init__(fields)
+        # wbits=31 writes a gzip header and trailer around the deflate stream
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def start(self):
+        return self.compressor.compress(super().start())
+
+    def encode(self, frame):
+        return self.compressor.compress(super().encode(frame))
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class _BufferSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ParquetEncoder:
+    """Encode DataFrame blocks as row groups of one Parquet file"""
+
+    def __init__(self, fields):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([
+            (EXPORT_FIELDS[field], pa.string() if field in ('equipment_name', 'equipment_type') else pa.float64())
+            for field in fields
+        ])
+        self.sink = _BufferSink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema)
+
+    def start(self):
+        return self.sink.drain()
+
+    def encode(self, frame):
+        self.writer.write_table(self.pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False))
+        return self.sink.drain()
+
+    def finish(self):
+        self.writer.close()
+        return self.sink.drain()
+
+
+ENCODERS = {
+    'csv': CsvEncoder,
+    'csv.gz': GzipCsvEncoder,
+    'parquet': ParquetEncoder,
+}
+
+
+def export_stream(dataset, export_format, fields, types=None):
+    """
+    Yield a dataset export as bytes, encoded block by block so it can be
+    sent with a StreamingHttpResponse
+    """
+    encoder = ENCODERS[export_format](fields)
+    yield encoder.start()
+    for frame in export_frames(dataset, fields, types):
+        data = encoder.encode(frame)
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+async def aiterate(iterator):
+    """
+    Iterate a sync iterator from async code. Each step runs on the
+    request's sync thread, so a database cursor opened by the iterator keeps
+    being read through the same connection.
+    """
+    step = sync_to_async(next, thread_sensitive=True)
+    while True:
+        item = await step(iterator, _END)
+        if item is _END:
+            return
+        yield item
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db import models
+
+
+class CompactFloatField(models.FloatField):
+    """
+    FloatField stored as single precision when ``EQUIPMENT_COMPACT_FLOATS`` is
+    enabled, halving the size of measurement columns on PostgreSQL and MySQL.
+
+    SQLite always stores 8-byte REALs, so the setting has no effect there. The
+    column type is chosen when the table is created; see the setting's comment
+    for converting an existing database.
+    """
+
+    def db_type(self, connection):
+        if getattr(settings, 'EQUIPMENT_COMPACT_FLOATS', False):
+            if connection.vendor == 'postgresql':
+                return 'real'
+            if connection.vendor == 'mysql':
+                return 'float'
+        return super().db_type(connection)
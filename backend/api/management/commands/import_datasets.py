@@ -0,0 +1,139 @@
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from api.models import Dataset
+from api.parsing import parse_csv_file
+from api.pipeline import ingest_sequential
+from api.uploads import CSV_SUFFIXES, file_checksum
+from api.retention import expired_dataset_ids, prune_datasets
+from api.utils import get_column_mapping, load_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import a directory or glob of CSV exports, plain or compressed, '
+        'for a user. Files are parsed in a process pool and committed one dataset per transaction; '
+        'files already imported (by checksum) are skipped, so an interrupted '
+        'run can simply be restarted. The retention policy is only applied with --prune.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directory of .csv (.csv.gz, .csv.zst, .zip) files or a glob pattern')
+        parser.add_argument('--user', required=True, help='Username that owns the datasets')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Parser processes (default: CPU count)')
+        parser.add_argument('--encoding', help='Encoding of the files (default: detected per file)')
+        parser.add_argument('--prune', action='store_true',
+                            help="Apply the user's retention policy after the import, deleting the datasets "
+                                 'it no longer allows (by default at most 5 are kept, the newest ones)')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist")
+
+        source = options['source']
+        if os.path.isdir(source):
+            patterns = [os.path.join(source, f'*{suffix}') for suffix in CSV_SUFFIXES]
+        else:
+            patterns = [source]
+        paths = sorted({
+            path for pattern in patterns for path in glob.glob(pattern) if os.path.isfile(path)
+        })
+        if not paths:
+            raise CommandError(f'No CSV files match {options["source"]}')
+
+        imported = set(
+            Dataset.objects.filter(user=user).exclude(source_checksum='')
+            .values_list('source_checksum', flat=True)
+        )
+        pending = []
+        for path in paths:
+            checksum = file_checksum(path)
+            if checksum in imported:
+                self.stdout.write(f'skipped  {path} (already imported)')
+            else:
+                imported.add(checksum)
+                pending.append((path, checksum))
+
+        mapping = get_column_mapping(user)
+        totals = {'files': 0, 'rows': 0, 'failed': 0}
+        started = time.perf_counter()
+        workers = max(1, options['workers'] or 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Bound the parsed files held in memory to two per worker
+            window = workers * 2
+            futures = {}
+            queue = list(pending)
+            while queue or futures:
+                while queue and len(futures) < window:
+                    path, checksum = queue.pop(0)
+                    futures[executor.submit(_timed_parse, path, options['encoding'], mapping)] = (path, checksum)
+                future = next(iter(futures))
+                path, checksum = futures.pop(future)
+                self._commit(user, path, checksum, future, totals)
+
+        if options['prune']:
+            pruned = prune_datasets(user)
+            self.stdout.write(f'pruned   {pruned} dataset(s) by the retention policy')
+        elif totals['files']:
+            over = len(expired_dataset_ids(user))
+            if over:
+                self.stdout.write(self.style.WARNING(
+                    f'{over} dataset(s) are over the retention policy and will be deleted '
+                    'by the next upload or prune; run with --prune or raise the policy limits'
+                ))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {totals['files']} file(s), {totals['rows']} rows in {elapsed:.2f}s"
+            f" ({totals['rows'] / elapsed if elapsed else 0:,.0f} rows/s), {totals['failed']} failed"
+        ))
+
+    def _commit(self, user, path, checksum, future, totals):
+        """Load one parsed file in its own transaction and report throughput"""
+        try:
+            chunks, report, column_map, parse_seconds = future.result()
+            load_started = time.perf_counter()
+            with open(path, 'rb') as f:
+                dataset = load_dataset(
+                    user,
+                    File(f, name=os.path.basename(path)),
+                    chunks,
+                    ingest=ingest_sequential,
+                    report=report,
+                    column_map=column_map,
+                    source_checksum=checksum
+                )
+            load_seconds = time.perf_counter() - load_started
+        except Exception as e:
+            totals['failed'] += 1
+            self.stderr.write(f'failed   {path}: {e}')
+            return
+
+        totals['files'] += 1
+        totals['rows'] += dataset.total_count
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        seconds = parse_seconds + load_seconds
+        rejected = dataset.validation_report['rows_rejected']
+        skipped = f' ({rejected} invalid skipped)' if rejected else ''
+        self.stdout.write(
+            f'imported {path}: {dataset.total_count} rows{skipped}, {size_mb:.1f} MB, '
+            f'parse {parse_seconds:.2f}s, load {load_seconds:.2f}s, '
+            f'{dataset.total_count / seconds if seconds else 0:,.0f} rows/s'
+        )
+
+
+def _timed_parse(path, encoding=None, mapping=None):
+    """
+    Parse a file in a worker process and return
+    ``(chunks, report, column map, seconds)``
+    """
+    started = time.perf_counter()
+    chunks, report, column_map = parse_csv_file(path, encoding=encoding, mapping=mapping)
+    return chunks, report, column_map, time.perf_counter() - started
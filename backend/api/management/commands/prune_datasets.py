@@ -0,0 +1,35 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from api.retention import prune_datasets
+from api.uploads import expire_sessions
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply retention policies to stored datasets and delete abandoned '
+        'resumable uploads. Uploads prune their own user, so schedule this to '
+        'enforce age-based limits for idle accounts and to free upload space.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only prune this username')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(datasets__isnull=False).distinct()
+        owner = None
+        if options['user']:
+            users = users.filter(username=options['user'])
+            owner = User.objects.filter(username=options['user']).first()
+            if owner is None:
+                raise CommandError(f"User '{options['user']}' does not exist")
+
+        total = 0
+        for user in users:
+            pruned = prune_datasets(user)
+            if pruned:
+                self.stdout.write(f'{user.username}: pruned {pruned} dataset(s)')
+            total += pruned
+        expired = expire_sessions(owner)
+        self.stdout.write(self.style.SUCCESS(
+            f'Pruned {total} dataset(s), removed {expired} expired upload session(s)'
+        ))
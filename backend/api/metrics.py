@@ -0,0 +1,261 @@
+"""
+In-process performance metrics in the Prometheus text format.
+
+Counters, gauges and histograms live in one registry per process; ``/metrics``
+renders it for scraping. Under gunicorn every worker keeps its own
+registry, so a scrape sees the worker that answered it.
+"""
+import bisect
+import contextvars
+import threading
+from time import perf_counter
+
+# Histogram buckets: seconds for durations, a plain count for queries and
+# bytes for response sizes
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic total per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for label_values, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}'
+
+
+class Gauge:
+    """Current value per label set"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def set(self, value, *label_values):
+        with self.lock:
+            self.values[label_values] = value
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for label_values, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}'
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        # One slot per bucket plus +Inf; made cumulative when rendered
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.get(label_values, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self.values[label_values] = (counts, total + value)
+
+    def samples(self):
+        with self.lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self.values.items()}
+        for label_values, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, [('le', _format_value(bound))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labels, label_values)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+REQUESTS = Counter(
+    'chemparaviz_http_requests_total', 'HTTP requests by endpoint and status',
+    ['method', 'endpoint', 'status']
+)
+REQUEST_DURATION = Histogram(
+    'chemparaviz_http_request_duration_seconds', 'Wall time from request to response',
+    ['method', 'endpoint']
+)
+REQUEST_QUERIES = Histogram(
+    'chemparaviz_http_db_queries', 'Database queries run per request',
+    ['method', 'endpoint'], QUERY_BUCKETS
+)
+REQUEST_QUERY_DURATION = Histogram(
+    'chemparaviz_http_db_query_duration_seconds', 'Time spent in database queries per request',
+    ['method', 'endpoint']
+)
+REQUEST_SERIALIZATION = Histogram(
+    'chemparaviz_http_serialization_duration_seconds', 'Time spent rendering the response body',
+    ['method', 'endpoint']
+)
+RESPONSE_BYTES = Histogram(
+    'chemparaviz_http_response_bytes', 'Response body size in bytes',
+    ['method', 'endpoint'], SIZE_BUCKETS
+)
+SPAN_DURATION = Histogram(
+    'chemparaviz_span_duration_seconds', 'Wall time of named processing stages',
+    ['span']
+)
+DB_POOL_WAIT = Histogram(
+    'chemparaviz_db_pool_wait_seconds', 'Time spent waiting for a pooled database connection',
+    ['database']
+)
+DB_POOL_TIMEOUTS = Counter(
+    'chemparaviz_db_pool_timeouts_total', 'Requests for a pooled database connection that timed out',
+    ['database']
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'chemparaviz_db_pool_connections', 'Open pooled database connections by state',
+    ['database', 'state']
+)
+
+REGISTRY = [
+    REQUESTS, REQUEST_DURATION, REQUEST_QUERIES, REQUEST_QUERY_DURATION,
+    REQUEST_SERIALIZATION, RESPONSE_BYTES, SPAN_DURATION,
+    DB_POOL_WAIT, DB_POOL_TIMEOUTS, DB_POOL_CONNECTIONS,
+]
+
+
+def render():
+    """Return every metric in the registry in the Prometheus text format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+class Span:
+    """
+    Time a named stage into ``chemparaviz_span_duration_seconds``; started
+    on creation, stopped by ``finish()`` or by leaving a ``with`` block
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = perf_counter()
+        self.seconds = None
+
+    def finish(self):
+        if self.seconds is None:
+            self.seconds = perf_counter() - self.started
+            SPAN_DURATION.observe(self.seconds, self.name)
+        return self.seconds
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.finish()
+
+
+def span(name):
+    """Start timing the stage ``name``; use as ``with span(name):``"""
+    return Span(name)
+
+
+def timed_iter(name, iterable):
+    """Yield from ``iterable``, recording each step as one ``name`` span"""
+    iterator = iter(iterable)
+    while True:
+        started = perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        SPAN_DURATION.observe(perf_counter() - started, name)
+        yield item
+
+
+class RequestStats:
+    """Database and rendering time of the request being handled"""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.render_seconds = 0.0
+
+
+def record_render(seconds):
+    """Add time spent encoding a response body to the current request"""
+    stats = current_request.get()
+    if stats is not None:
+        stats.render_seconds += seconds
+
+
+# Stats of the current request; context variables are copied into
+# sync_to_async threads, so queries of async views are counted too
+current_request = contextvars.ContextVar('current_request', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query to the current request"""
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver wrapping every new database connection"""
+    # Inserted first, so ``connection.execute_wrapper()`` blocks that pop
+    # their own wrapper off the end leave it in place
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
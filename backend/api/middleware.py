@@ -0,0 +1,158 @@
+from time import perf_counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from rest_framework.permissions import SAFE_METHODS
+from . import metrics, replicas
+
+
+class RequestMetricsMiddleware:
+    """
+    Record wall time, database queries and query time, response rendering
+    time and bytes sent of every request, labelled by its URL pattern, into
+    the registry served on ``/metrics``.
+
+    Works in both sync and async mode, so async views under ASGI are not
+    pushed onto a thread by it. The wall time ends when the response is
+    returned; bytes of a streamed response are counted as they are sent.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = metrics.RequestStats()
+        token = metrics.current_request.set(stats)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        return self.record(request, response, stats, perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = metrics.RequestStats()
+        token = metrics.current_request.set(stats)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        return self.record(request, response, stats, perf_counter() - started)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time it
+        stats = metrics.current_request.get()
+        if stats is not None:
+            started = perf_counter()
+
+            def rendered(response):
+                stats.render_seconds += perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def record(self, request, response, stats, seconds):
+        method = request.method
+        endpoint = endpoint_label(request)
+        metrics.REQUESTS.inc(method, endpoint, str(response.status_code))
+        metrics.REQUEST_DURATION.observe(seconds, method, endpoint)
+        metrics.REQUEST_QUERIES.observe(stats.queries, method, endpoint)
+        metrics.REQUEST_QUERY_DURATION.observe(stats.query_seconds, method, endpoint)
+        metrics.REQUEST_SERIALIZATION.observe(stats.render_seconds, method, endpoint)
+        if response.streaming:
+            response.streaming_content = count_bytes(response, method, endpoint)
+        else:
+            metrics.RESPONSE_BYTES.observe(len(response.content), method, endpoint)
+        return response
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pin the user of every successful write request (an upload through
+    ``process_csv``, an append, a delete...) to the primary database for
+    ``REPLICA_STICKY_SECONDS``, so the dashboard reads that follow it see
+    the change however far the replica lags. Does nothing without a
+    replica. Needs ``request.user``, so it goes after AuthenticationMiddleware;
+    DRF sets it there for token-authenticated requests too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if successful_write(request, response):
+            user_id = authenticated_user_id(request)
+            if user_id is not None:
+                replicas.pin_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if successful_write(request, response):
+            # request.user may still be a lazy session lookup
+            user_id = await sync_to_async(authenticated_user_id)(request)
+            if user_id is not None:
+                await replicas.apin_to_primary(user_id)
+        return response
+
+
+def successful_write(request, response):
+    return (
+        request.method not in SAFE_METHODS and response.status_code < 400
+        and replicas.replica_configured()
+    )
+
+
+def authenticated_user_id(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+def endpoint_label(request):
+    """
+    The matched URL pattern, e.g. ``api/dataset/<int:dataset_id>/``, so
+    label values stay bounded however many ids are requested
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None or match.route is None:
+        return 'unmatched'
+    return '/' + match.route
+
+
+def count_bytes(response, method, endpoint):
+    """Wrap streamed content, observing its total size once it is sent"""
+    if response.is_async:
+        async def counted(content=response.streaming_content):
+            sent = 0
+            try:
+                async for chunk in content:
+                    sent += len(chunk)
+                    yield chunk
+            finally:
+                metrics.RESPONSE_BYTES.observe(sent, method, endpoint)
+    else:
+        def counted(content=response.streaming_content):
+            sent = 0
+            try:
+                for chunk in content:
+                    sent += len(chunk)
+                    yield chunk
+            finally:
+                metrics.RESPONSE_BYTES.observe(sent, method, endpoint)
+    return counted()
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='source_checksum',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,84 @@
+import api.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def encode_types(apps, schema_editor):
+    Equipment = apps.get_model('api', 'Equipment')
+    EquipmentType = apps.get_model('api', 'EquipmentType')
+    db_alias = schema_editor.connection.alias
+    names = Equipment.objects.using(db_alias).values_list('equipment_type', flat=True).distinct()
+    for name in names:
+        equipment_type = EquipmentType.objects.using(db_alias).create(name=name)
+        Equipment.objects.using(db_alias).filter(equipment_type=name).update(type_ref=equipment_type)
+
+
+def decode_types(apps, schema_editor):
+    Equipment = apps.get_model('api', 'Equipment')
+    EquipmentType = apps.get_model('api', 'EquipmentType')
+    db_alias = schema_editor.connection.alias
+    for equipment_type in EquipmentType.objects.using(db_alias).all():
+        Equipment.objects.using(db_alias).filter(type_ref=equipment_type).update(
+            equipment_type=equipment_type.name
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_retention_policy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='equipment',
+            name='type_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.equipmenttype'),
+        ),
+        migrations.RunPython(encode_types, decode_types),
+        # Gives the old column a default so the migration can be reversed
+        migrations.AlterField(
+            model_name='equipment',
+            name='equipment_type',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.RemoveField(
+            model_name='equipment',
+            name='equipment_type',
+        ),
+        migrations.RenameField(
+            model_name='equipment',
+            old_name='type_ref',
+            new_name='equipment_type',
+        ),
+        migrations.AlterField(
+            model_name='equipment',
+            name='equipment_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='equipment', to='api.equipmenttype'),
+        ),
+        migrations.AlterField(
+            model_name='equipment',
+            name='flowrate',
+            field=api.fields.CompactFloatField(),
+        ),
+        migrations.AlterField(
+            model_name='equipment',
+            name='pressure',
+            field=api.fields.CompactFloatField(),
+        ),
+        migrations.AlterField(
+            model_name='equipment',
+            name='temperature',
+            field=api.fields.CompactFloatField(),
+        ),
+    ]
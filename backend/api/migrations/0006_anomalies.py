@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0005_equipment_type_lookup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParameterThreshold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parameter', models.CharField(choices=[('flowrate', 'Flowrate'), ('pressure', 'Pressure'), ('temperature', 'Temperature')], max_length=20)),
+                ('min_value', models.FloatField(blank=True, null=True)),
+                ('max_value', models.FloatField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parameter_thresholds', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'parameter')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Anomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parameter', models.CharField(choices=[('flowrate', 'Flowrate'), ('pressure', 'Pressure'), ('temperature', 'Temperature')], max_length=20)),
+                ('rule', models.CharField(choices=[('zscore', 'Z-score'), ('iqr', 'Interquartile range'), ('threshold', 'Threshold')], max_length=20)),
+                ('direction', models.CharField(choices=[('high', 'High'), ('low', 'Low')], max_length=10)),
+                ('value', models.FloatField()),
+                ('score', models.FloatField()),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='api.dataset')),
+                ('equipment', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='anomalies', to='api.equipment')),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['dataset', 'parameter', '-score'], name='anomaly_top_offenders')],
+            },
+        ),
+    ]
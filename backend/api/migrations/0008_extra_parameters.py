@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0007_dataset_validation_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='extra_parameters',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name='ColumnMapping',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('columns', models.JSONField(blank=True, default=dict)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='column_mapping', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ParameterBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parameter', models.CharField(max_length=40)),
+                ('start_row', models.BigIntegerField()),
+                ('dtype', models.CharField(max_length=4)),
+                ('values', models.BinaryField()),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parameter_blocks', to='api.dataset')),
+            ],
+            options={
+                'unique_together': {('dataset', 'parameter', 'start_row')},
+            },
+        ),
+    ]
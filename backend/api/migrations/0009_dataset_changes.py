@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def copy_uploaded_at(apps, schema_editor):
+    Dataset = apps.get_model('api', 'Dataset')
+    Dataset.objects.using(schema_editor.connection.alias).update(updated_at=models.F('uploaded_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0008_extra_parameters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        # Existing datasets were last changed no earlier than their upload
+        migrations.RunPython(copy_uploaded_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='dataset',
+            index=models.Index(fields=['user', 'updated_at'], name='dataset_changes'),
+        ),
+        migrations.CreateModel(
+            name='DatasetDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dataset_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dataset_deletions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['user', 'deleted_at'], name='dataset_deletions'),
+                    models.Index(fields=['deleted_at'], name='dataset_deletion_expiry'),
+                ],
+            },
+        ),
+    ]
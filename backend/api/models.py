@@ -1,5 +1,13 @@
+import uuid
 from django.db import models
 from django.contrib.auth.models import User
+from .fields import CompactFloatField
+
+PARAMETER_CHOICES = [
+    ('flowrate', 'Flowrate'),
+    ('pressure', 'Pressure'),
+    ('temperature', 'Temperature'),
+]
 
 
 class Dataset(models.Model):
@@ -8,6 +16,11 @@ class Dataset(models.Model):
     filename = models.CharField(max_length=255)
     file = models.FileField(upload_to='datasets/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Set by every save, e.g. of the statistics after an upload or append;
+    # /api/datasets-changes/ finds changed datasets by it
+    updated_at = models.DateTimeField(auto_now=True)
+    # SHA-256 of the source file, set by batch imports to skip files already loaded
+    source_checksum = models.CharField(max_length=64, blank=True, db_index=True)
     
     # Summary statistics
     total_count = models.IntegerField(default=0)
@@ -15,22 +28,222 @@ class Dataset(models.Model):
     avg_pressure = models.FloatField(default=0.0)
     avg_temperature = models.FloatField(default=0.0)
     equipment_type_distribution = models.JSONField(default=dict)
+    # Rows rejected and bad cells found while parsing the upload (see
+    # parsing.ValidationReport); empty for datasets loaded before it existed
+    validation_report = models.JSONField(default=dict, blank=True)
+    # Numeric parameters beyond the core ones, mapped in through the owner's
+    # ColumnMapping: {key: {'label': CSV header, 'count': values, 'mean': mean}}.
+    # Their values are stored in ParameterBlock rows
+    extra_parameters = models.JSONField(default=dict, blank=True)
     
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            models.Index(fields=['user', 'updated_at'], name='dataset_changes'),
+        ]
     
     def __str__(self):
         return f"{self.filename} - {self.uploaded_at.strftime('%Y-%m-%d %H:%M')}"
+    
+    def parameter_labels(self):
+        """Key -> label of every numeric parameter, the core ones first"""
+        labels = dict(PARAMETER_CHOICES)
+        labels.update((key, extra['label']) for key, extra in self.extra_parameters.items())
+        return labels
+
+
+class DatasetDeletion(models.Model):
+    """Model to remember a deleted dataset, so clients polling for changes can drop it"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='dataset_deletions')
+    # Not a foreign key; the dataset is gone
+    dataset_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='dataset_deletions'),
+            models.Index(fields=['deleted_at'], name='dataset_deletion_expiry'),
+        ]
+    
+    def __str__(self):
+        return f"Dataset {self.dataset_id} deleted at {self.deleted_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class EquipmentTypeManager(models.Manager):
+    def ids_for(self, names):
+        """
+        Map equipment type names to their ids, creating any missing types
+        """
+        names = {str(name) for name in names}
+        ids = dict(self.filter(name__in=names).values_list('name', 'id'))
+        missing = names - ids.keys()
+        if missing:
+            self.bulk_create([self.model(name=name) for name in missing], ignore_conflicts=True)
+            ids.update(self.filter(name__in=missing).values_list('name', 'id'))
+        return ids
+
+
+class EquipmentType(models.Model):
+    """Lookup table of distinct equipment types, shared by all datasets"""
+    name = models.CharField(max_length=100, unique=True)
+    
+    objects = EquipmentTypeManager()
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
 
 
 class Equipment(models.Model):
     """Model to store individual equipment records"""
     dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='equipment')
     equipment_name = models.CharField(max_length=255)
-    equipment_type = models.CharField(max_length=100)
-    flowrate = models.FloatField()
-    pressure = models.FloatField()
-    temperature = models.FloatField()
+    equipment_type = models.ForeignKey(EquipmentType, on_delete=models.PROTECT, related_name='equipment')
+    flowrate = CompactFloatField()
+    pressure = CompactFloatField()
+    temperature = CompactFloatField()
     
     def __str__(self):
         return f"{self.equipment_name} ({self.equipment_type})"
+
+
+class ParameterBlock(models.Model):
+    """
+    Values of one extra numeric parameter for a run of consecutive rows of a
+    dataset, packed as a little-endian float array. Rows are counted in
+    equipment id order from 0; rows no block covers have no value.
+    """
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='parameter_blocks')
+    parameter = models.CharField(max_length=40)
+    start_row = models.BigIntegerField()
+    # NumPy dtype string of values: '<f8', or '<f4' with EQUIPMENT_COMPACT_FLOATS
+    dtype = models.CharField(max_length=4)
+    values = models.BinaryField()
+    
+    class Meta:
+        unique_together = ['dataset', 'parameter', 'start_row']
+    
+    def __str__(self):
+        return f"{self.parameter} of dataset {self.dataset_id} from row {self.start_row}"
+
+
+class Anomaly(models.Model):
+    """Model to store an equipment reading flagged by anomaly detection"""
+    RULE_CHOICES = [
+        ('zscore', 'Z-score'),
+        ('iqr', 'Interquartile range'),
+        ('threshold', 'Threshold'),
+    ]
+    DIRECTION_CHOICES = [
+        ('high', 'High'),
+        ('low', 'Low'),
+    ]
+    
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='anomalies')
+    # No database constraint so equipment rows keep their set-based deletes;
+    # anomalies go away with their dataset
+    equipment = models.ForeignKey(
+        Equipment, on_delete=models.DO_NOTHING, db_constraint=False, related_name='anomalies'
+    )
+    parameter = models.CharField(max_length=20, choices=PARAMETER_CHOICES)
+    rule = models.CharField(max_length=20, choices=RULE_CHOICES)
+    direction = models.CharField(max_length=10, choices=DIRECTION_CHOICES)
+    value = models.FloatField()
+    # How far the reading is out of range: |z| for zscore, IQRs beyond the
+    # fence for iqr and units beyond the limit for threshold
+    score = models.FloatField()
+    
+    class Meta:
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['dataset', 'parameter', '-score'], name='anomaly_top_offenders'),
+        ]
+    
+    def __str__(self):
+        return f"{self.equipment_id} {self.parameter} {self.rule} ({self.score:.2f})"
+
+
+class ParameterThreshold(models.Model):
+    """Model to store a user's operating limits for one parameter"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='parameter_thresholds')
+    parameter = models.CharField(max_length=20, choices=PARAMETER_CHOICES)
+    # Readings below min_value or above max_value are flagged; either may be unset
+    min_value = models.FloatField(null=True, blank=True)
+    max_value = models.FloatField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ['user', 'parameter']
+    
+    def __str__(self):
+        return f"{self.parameter} limits for {self.user.username}"
+
+
+class RetentionPolicy(models.Model):
+    """Model to store how much upload history a user keeps"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='retention_policy')
+    # Each limit is optional; a dataset is pruned once it exceeds any of them
+    max_datasets = models.PositiveIntegerField(null=True, blank=True, default=5)
+    max_age_days = models.PositiveIntegerField(null=True, blank=True)
+    max_total_rows = models.PositiveBigIntegerField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Retention for {self.user.username}"
+
+
+# Targets of a ColumnMapping besides the keys of extra parameters, with
+# the CSV header each is read from unless it is remapped (as in
+# parsing.CORE_TARGETS, which does not import the models)
+CORE_COLUMN_TARGETS = {
+    'equipment_name': 'Equipment Name',
+    'equipment_type': 'Type',
+    'flowrate': 'Flowrate',
+    'pressure': 'Pressure',
+    'temperature': 'Temperature',
+}
+
+# Extra parameters a user may map at most
+MAX_EXTRA_PARAMETERS = 16
+
+
+class ColumnMapping(models.Model):
+    """Model to store how the columns of a user's CSV exports are read"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='column_mapping')
+    # CSV header -> 'equipment_name', 'equipment_type', a core parameter or
+    # the key of an extra numeric parameter to keep
+    columns = models.JSONField(default=dict, blank=True)
+    
+    def __str__(self):
+        return f"Column mapping for {self.user.username}"
+
+
+class UploadSession(models.Model):
+    """Model to track a resumable, chunked CSV upload"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.filename} ({self.total_size} bytes)"
+
+
+class UploadChunk(models.Model):
+    """Model to store a received byte range of an upload session"""
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    offset = models.BigIntegerField()
+    size = models.IntegerField()
+    checksum = models.CharField(max_length=64)
+    
+    class Meta:
+        ordering = ['offset']
+        unique_together = ['session', 'offset']
+    
+    def __str__(self):
+        return f"{self.session_id} @ {self.offset} ({self.size} bytes)"
@@ -0,0 +1,42 @@
+import numpy as np
+from django.conf import settings
+from .models import ParameterBlock
+
+
+def block_dtype():
+    """Float type extra parameters are stored with, matching the equipment columns"""
+    return np.dtype('<f4' if settings.EQUIPMENT_COMPACT_FLOATS else '<f8')
+
+
+def write_blocks(dataset, start_row, extras):
+    """
+    Store one chunk of extra parameter values, ``{key: float array}``, for
+    the rows of a dataset from ``start_row`` on; one row per parameter
+    """
+    dtype = block_dtype()
+    ParameterBlock.objects.bulk_create([
+        ParameterBlock(
+            dataset=dataset,
+            parameter=key,
+            start_row=start_row,
+            dtype=dtype.str,
+            values=values.astype(dtype).tobytes()
+        )
+        for key, values in extras.items()
+        if len(values)
+    ])
+
+
+def extra_values(dataset, parameter):
+    """
+    NumPy float64 array of an extra parameter over every row of a dataset,
+    in row order, with NaN where it has no value
+    """
+    values = np.full(dataset.total_count, np.nan)
+    blocks = ParameterBlock.objects.filter(dataset=dataset, parameter=parameter).values_list(
+        'start_row', 'dtype', 'values'
+    )
+    for start_row, dtype, data in blocks.iterator(chunk_size=16):
+        block = np.frombuffer(data, dtype=dtype)
+        values[start_row:start_row + len(block)] = block
+    return values
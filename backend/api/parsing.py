@@ -0,0 +1,495 @@
+import codecs
+import gzip
+import io
+import zipfile
+import zlib
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from django.core.files import File
+from .metrics import timed_iter
+
+REQUIRED_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+TEXT_COLUMNS = ['Equipment Name', 'Type']
+NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+
+# ColumnMapping target -> required column it feeds; any other target is
+# the key of an extra numeric parameter
+CORE_TARGETS = {
+    'equipment_name': 'Equipment Name',
+    'equipment_type': 'Type',
+    'flowrate': 'Flowrate',
+    'pressure': 'Pressure',
+    'temperature': 'Temperature',
+}
+
+# Rows parsed and inserted per step of the streaming ingest
+CSV_CHUNK_ROWS = 50000
+
+# Bytes per record batch of pyarrow's streaming reader, which splits the
+# file by size rather than by rows; about CSV_CHUNK_ROWS typical rows
+PYARROW_BLOCK_BYTES = 2 * 1024 * 1024
+
+# Bad cells listed one by one in a validation report; the rest are counted
+MAX_REPORTED_ISSUES = 100
+
+# Leading bytes of each compression format an upload may use
+COMPRESSION_MAGIC = {
+    b'\x1f\x8b': 'gzip',
+    b'PK\x03\x04': 'zip',
+    b'\x28\xb5\x2f\xfd': 'zstd',
+}
+
+# Compressed bytes read per step of a zstd stream
+ZSTD_READ_BYTES = 64 * 1024
+
+
+class ZstdError(Exception):
+    """Damaged zstd data (zstandard's own error class is only there when it is installed)"""
+
+
+# Raised by the decompressors on damaged or truncated input
+DECOMPRESSION_ERRORS = (EOFError, zlib.error, gzip.BadGzipFile, zipfile.BadZipFile, ZstdError)
+
+# Decompressed bytes looked at to guess the encoding of a CSV
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+BYTE_ORDER_MARKS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Column types of the fast path
+FAST_DTYPES = {
+    'Equipment Name': object,
+    'Type': object,
+    'Flowrate': 'float64',
+    'Pressure': 'float64',
+    'Temperature': 'float64',
+}
+
+
+class CsvSource:
+    """
+    An uploaded CSV, plain or gzip, zip or zstd-compressed, and its encoding.
+
+    The compression is recognised from the first bytes of the file, not
+    its name. ``encoding`` is guessed with ``detect_encoding`` unless given.
+    Every ``open`` starts a fresh decompressing stream from the beginning of
+    the file, so the decompressed CSV is never held in memory or on disk.
+    """
+
+    def __init__(self, file, encoding=None):
+        self.file = file
+        if encoding:
+            try:
+                codecs.lookup(encoding)
+            except LookupError:
+                raise ValueError(f'Unknown encoding: {encoding}')
+        with read_errors():
+            self.compression = sniff_compression(file)
+            self.encoding = encoding or detect_encoding(self.open())
+
+    def open(self):
+        """Binary stream of the CSV; closing it leaves the file open"""
+        file = self.file
+        file.seek(0)
+        if self.compression == 'gzip':
+            return gzip.GzipFile(fileobj=file, mode='rb')
+        if self.compression == 'zip':
+            archive = zipfile.ZipFile(file)
+            members = [info for info in archive.infolist() if not info.is_dir()]
+            csv_members = [info for info in members if info.filename.lower().endswith('.csv')]
+            if len(csv_members or members) != 1:
+                raise ValueError('ZIP archive must contain exactly one CSV file')
+            return archive.open((csv_members or members)[0])
+        if self.compression == 'zstd':
+            return io.BufferedReader(ZstdReader(file))
+        # pandas takes Django's upload wrappers for text streams
+        return file.file if isinstance(file, File) else file
+
+
+class ZstdReader(io.RawIOBase):
+    """
+    Decompressing stream over the frames of a zstd file. Unlike zstandard's
+    ``stream_reader`` it raises EOFError when the last frame is cut off,
+    so a truncated upload fails like a truncated gzip file instead of
+    loading part of the rows. Closing it leaves the file open.
+    """
+
+    def __init__(self, file):
+        super().__init__()
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError('zstd-compressed files need the zstandard package on the server')
+        self.file = file
+        self.errors = zstandard.ZstdError
+        self.decompressor = zstandard.ZstdDecompressor()
+        self.frame = self.decompressor.decompressobj()
+        self.pending = memoryview(b'')
+        self.unused = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            data = self.unused or self.file.read(ZSTD_READ_BYTES)
+            self.unused = b''
+            if not data:
+                if not self.frame.eof:
+                    raise EOFError('zstd stream ended before the end of its last frame')
+                return 0
+            if self.frame.eof:
+                # Concatenated frames decompress to one stream
+                self.frame = self.decompressor.decompressobj()
+            try:
+                self.pending = memoryview(self.frame.decompress(data))
+            except self.errors as e:
+                raise ZstdError(str(e)) from e
+            if self.frame.eof:
+                self.unused = self.frame.unused_data
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def sniff_compression(file):
+    """'gzip', 'zip' or 'zstd' from the leading bytes of a file, or None"""
+    file.seek(0)
+    head = file.read(4)
+    file.seek(0)
+    for magic, compression in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def detect_encoding(stream):
+    """
+    Guess the encoding of a binary CSV stream from its first
+    ``ENCODING_SAMPLE_BYTES``: a byte order mark if there is one, UTF-16 if
+    the sample holds NUL bytes, else UTF-8 when it decodes as such and
+    Latin-1 (which accepts any byte) otherwise
+    """
+    sample = stream.read(ENCODING_SAMPLE_BYTES)
+    for bom, encoding in BYTE_ORDER_MARKS:
+        if sample.startswith(bom):
+            return encoding
+    if b'\x00' in sample:
+        # ASCII characters in UTF-16 have a zero high byte
+        return 'utf-16-le' if sample[1::2].count(0) >= sample[::2].count(0) else 'utf-16-be'
+    try:
+        # A character cut off at the end of the sample is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(sample)
+    except UnicodeDecodeError:
+        return 'latin-1'
+    return 'utf-8'
+
+
+@contextmanager
+def read_errors():
+    """Turn decoding and decompression failures into ValueErrors"""
+    try:
+        yield
+    except UnicodeDecodeError as e:
+        raise ValueError(f'File is not valid {e.encoding} text; upload it again with its encoding') from e
+    except DECOMPRESSION_ERRORS as e:
+        raise ValueError(f'Compressed file is damaged or incomplete: {e}') from e
+
+
+def read_csv(source, **kwargs):
+    """
+    Read a ``CsvSource`` from the start with ``pd.read_csv``.
+
+    Passing ``chunksize`` returns an iterator of DataFrame chunks.
+    """
+    with read_errors():
+        return pd.read_csv(source.open(), encoding=source.encoding, **kwargs)
+
+
+class ColumnMap:
+    """
+    Which columns of a CSV are read and what they become, from the CSV's
+    header and a user's ``ColumnMapping.columns``.
+
+    Each required column is read from the header of the same name unless
+    the mapping names another one. An extra parameter is read when its
+    mapped column is in the file. ``sources`` maps every column read, by
+    its internal name (a ``REQUIRED_COLUMNS`` entry or an extra parameter
+    key), to its CSV header; the headers left over are ``ignored``.
+    """
+
+    def __init__(self, header, mapping=None):
+        header = list(header)
+        mapping = mapping or {}
+        self.sources = {column: column for column in REQUIRED_COLUMNS}
+        for source, target in mapping.items():
+            if target in CORE_TARGETS:
+                self.sources[CORE_TARGETS[target]] = source
+        if len(set(self.sources.values())) < len(REQUIRED_COLUMNS):
+            raise ValueError(
+                'Column mapping reads one CSV column for two required columns; '
+                'correct it at /api/column-mapping/'
+            )
+        if not all(self.sources[column] in header for column in REQUIRED_COLUMNS):
+            required = ', '.join(self.sources[column] for column in REQUIRED_COLUMNS)
+            raise ValueError(f"CSV must contain columns: {required}")
+
+        core_sources = set(self.sources.values())
+        self.extras = []
+        for source, target in mapping.items():
+            if target not in CORE_TARGETS and source in header and source not in core_sources:
+                self.sources[target] = source
+                self.extras.append(target)
+        self.ignored = [column for column in header if column not in self.sources.values()]
+
+    @property
+    def usecols(self):
+        return list(self.sources.values())
+
+    @property
+    def rename(self):
+        return {source: column for column, source in self.sources.items()}
+
+    @property
+    def dtypes(self):
+        """Column types of the fast path, by CSV header"""
+        return {source: FAST_DTYPES.get(column, 'float64') for column, source in self.sources.items()}
+
+    @property
+    def extra_labels(self):
+        return {key: self.sources[key] for key in self.extras}
+
+
+class ValidationReport:
+    """
+    What parsing made of a CSV: rows read and rejected, bad cells per column
+    and the first ``MAX_REPORTED_ISSUES`` of them with their row number
+    (1-based, header excluded), value and problem. A row with a missing
+    name or type, or a missing or non-numeric reading, is rejected; an
+    extra parameter may be missing, and a non-numeric one is reported but
+    kept as missing. Columns are named by their CSV header.
+    """
+
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_rejected = 0
+        self.bad_cells = {}
+        self.issues = []
+        # Issues of the chunks already parsed, which come before any new one
+        self.settled_issues = 0
+        self.engine = None
+        self.compression = None
+        self.encoding = None
+        self.ignored_columns = []
+        # First row parsed as text and coerced after the fast path failed
+        self.coerced_from_row = None
+
+    def add_bad_cells(self, first_row, column, mask, values, problem):
+        count = int(mask.sum())
+        if not count:
+            return
+        self.bad_cells[column] = self.bad_cells.get(column, 0) + count
+        room = MAX_REPORTED_ISSUES - self.settled_issues
+        for position in np.flatnonzero(mask)[:max(room, 0)]:
+            value = values[position]
+            self.issues.append({
+                'row': first_row + int(position),
+                'column': column,
+                'value': None if pd.isna(value) else str(value),
+                'problem': problem,
+            })
+
+    def settle_issues(self):
+        """
+        Order the issues of the chunk just checked by row, each row's in
+        column order, and keep the first ``MAX_REPORTED_ISSUES`` overall
+        """
+        chunk = sorted(self.issues[self.settled_issues:], key=lambda issue: issue['row'])
+        self.issues[self.settled_issues:] = chunk
+        del self.issues[MAX_REPORTED_ISSUES:]
+        self.settled_issues = len(self.issues)
+
+    def as_dict(self):
+        return {
+            'rows_read': self.rows_read,
+            'rows_accepted': self.rows_read - self.rows_rejected,
+            'rows_rejected': self.rows_rejected,
+            'bad_cells': dict(self.bad_cells),
+            'issues': list(self.issues),
+            'engine': self.engine,
+            'compression': self.compression,
+            'encoding': self.encoding,
+            'ignored_columns': list(self.ignored_columns),
+            'coerced_from_row': self.coerced_from_row,
+        }
+
+
+def clean_chunk(df, first_row, report, column_map):
+    """
+    Turn a parsed DataFrame chunk whose data starts at row ``first_row``
+    into plain per-column arrays, coercing text readings to numbers and
+    dropping (and reporting) rows with a missing or non-numeric cell.
+    Extra parameters go under ``'extras'``, with NaN for missing values.
+    """
+    rejected = np.zeros(len(df), dtype=bool)
+    columns = {}
+    for column in TEXT_COLUMNS:
+        values = df[column].to_numpy(dtype=object)
+        missing = pd.isna(values)
+        report.add_bad_cells(first_row, column_map.sources[column], missing, values, 'missing')
+        rejected |= missing
+        columns[column] = values
+    for column in NUMERIC_COLUMNS:
+        raw = df[column].to_numpy()
+        values = raw if raw.dtype == 'float64' else pd.to_numeric(raw, errors='coerce').astype('float64')
+        invalid = ~np.isfinite(values)
+        if invalid.any():
+            missing = pd.isna(raw)
+            report.add_bad_cells(first_row, column_map.sources[column], invalid & missing, raw, 'missing')
+            report.add_bad_cells(first_row, column_map.sources[column], invalid & ~missing, raw, 'not a number')
+            rejected |= invalid
+        columns[column] = values
+    extras = {}
+    for key in column_map.extras:
+        raw = df[key].to_numpy()
+        values = pd.to_numeric(raw, errors='coerce').astype('float64')
+        invalid = ~np.isfinite(values)
+        if invalid.any():
+            report.add_bad_cells(first_row, column_map.sources[key], invalid & ~pd.isna(raw), raw, 'not a number')
+            values[invalid] = np.nan
+        extras[key] = values
+
+    report.settle_issues()
+    report.rows_read += len(df)
+    if rejected.any():
+        report.rows_rejected += int(rejected.sum())
+        columns = {column: values[~rejected] for column, values in columns.items()}
+        extras = {key: values[~rejected] for key, values in extras.items()}
+    columns['extras'] = extras
+    return columns
+
+
+def pyarrow_csv():
+    """The optional ``pyarrow.csv`` module, or None if pyarrow is not installed"""
+    try:
+        from pyarrow import csv
+    except ImportError:
+        return None
+    return csv
+
+
+def pyarrow_frames(csv, source, column_map):
+    """DataFrames of the mapped columns from pyarrow's streaming reader"""
+    import pyarrow as pa
+    # pyarrow reads UTF-8, skipping a byte order mark, and transcodes the rest
+    encoding = source.encoding
+    if codecs.lookup(encoding).name in ('utf-8', 'utf-8-sig'):
+        encoding = 'utf8'
+    reader = csv.open_csv(
+        source.open(),
+        read_options=csv.ReadOptions(block_size=PYARROW_BLOCK_BYTES, encoding=encoding),
+        convert_options=csv.ConvertOptions(
+            include_columns=column_map.usecols,
+            column_types={
+                column: pa.string() if dtype is object else pa.float64()
+                for column, dtype in column_map.dtypes.items()
+            },
+            strings_can_be_null=True,
+        ),
+    )
+    rename = column_map.rename
+    for batch in reader:
+        yield batch.to_pandas().rename(columns=rename)
+
+
+def pandas_frames(source, column_map, chunk_rows, dtype, skip_rows=0):
+    """DataFrames of the mapped columns from pandas' C parser"""
+    frames = read_csv(
+        source, usecols=column_map.usecols, dtype=dtype, chunksize=chunk_rows,
+        skiprows=range(1, skip_rows + 1) if skip_rows else None
+    )
+    rename = column_map.rename
+    for df in frames:
+        yield df.rename(columns=rename)
+
+
+def iter_frames(source, column_map, chunk_rows, report):
+    """
+    Yield ``(DataFrame, first row)`` for the mapped columns of a CSV,
+    named as in ``column_map.sources``.
+
+    The fast path reads them with their final types, through pyarrow when
+    it is installed. A cell that is not a number stops it; the file is then
+    read again from the chunk that failed with every column as text, for
+    ``clean_chunk`` to coerce.
+    """
+    csv = pyarrow_csv()
+    report.engine = 'pyarrow' if csv is not None else 'c'
+    if csv is not None:
+        frames = pyarrow_frames(csv, source, column_map)
+    else:
+        frames = pandas_frames(source, column_map, chunk_rows, column_map.dtypes)
+    rows = 0
+    while True:
+        try:
+            df = next(frames)
+        except StopIteration:
+            return
+        except UnicodeDecodeError:
+            raise
+        except ValueError:
+            break
+        yield df, rows + 1
+        rows += len(df)
+
+    report.coerced_from_row = rows + 1
+    for df in pandas_frames(source, column_map, chunk_rows, object, skip_rows=rows):
+        yield df, rows + 1
+        rows += len(df)
+
+
+def iter_column_chunks(source, chunk_rows=CSV_CHUNK_ROWS, report=None, column_map=None):
+    """
+    Lazily parse a CSV into column chunks of about ``chunk_rows`` rows,
+    recording rejected rows and bad cells in ``report`` (a
+    ``ValidationReport``). Only the columns of ``column_map``, by default
+    the required ones, are parsed. ``source`` is a ``CsvSource`` or a file,
+    whose encoding is then detected.
+    """
+    if not isinstance(source, CsvSource):
+        source = CsvSource(source)
+    if column_map is None:
+        column_map = ColumnMap(read_csv(source, nrows=0).columns)
+    if report is None:
+        report = ValidationReport()
+    report.compression = source.compression
+    report.encoding = source.encoding
+    report.ignored_columns = column_map.ignored
+    chunks = (
+        clean_chunk(df, first_row, report, column_map)
+        for df, first_row in iter_frames(source, column_map, chunk_rows, report)
+    )
+    with read_errors():
+        yield from timed_iter('ingest.parse', chunks)
+
+
+def parse_csv_file(path, chunk_rows=CSV_CHUNK_ROWS, encoding=None, mapping=None):
+    """
+    Validate and fully parse a CSV on disk, plain or compressed, into
+    ``(column chunks, report, column map)``; ``mapping`` is a
+    ``ColumnMapping.columns`` dict.
+
+    Only depends on pandas, so it can run in a worker process that has no
+    database access.
+    """
+    report = ValidationReport()
+    with open(path, 'rb') as f:
+        source = CsvSource(f, encoding)
+        column_map = ColumnMap(read_csv(source, nrows=0).columns, mapping)
+        chunks = list(iter_column_chunks(source, chunk_rows, report, column_map))
+    return chunks, report, column_map
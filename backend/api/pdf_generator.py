@@ -6,12 +6,15 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from io import BytesIO
 from datetime import datetime
+from .metrics import span
+from .utils import iter_equipment_rows
 
 
 def generate_pdf_report(dataset):
     """
     Generate a PDF report for a dataset
     """
+    build = span('report.build')
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
     
@@ -75,6 +78,9 @@ def generate_pdf_report(dataset):
         ['Average Pressure', f"{dataset.avg_pressure:.2f}"],
         ['Average Temperature', f"{dataset.avg_temperature:.2f}"],
     ]
+    for extra in dataset.extra_parameters.values():
+        mean = '-' if extra['mean'] is None else f"{extra['mean']:.2f}"
+        summary_data.append([f"Average {extra['label']}", mean])
     
     summary_table = Table(summary_data, colWidths=[3*inch, 3*inch])
     summary_table.setStyle(TableStyle([
@@ -116,19 +122,20 @@ def generate_pdf_report(dataset):
     details_heading = Paragraph("Equipment Details", heading_style)
     elements.append(details_heading)
     
-    equipment = dataset.equipment.all()
-    details_data = [['Name', 'Type', 'Flowrate', 'Pressure', 'Temp']]
+    extras = list(dataset.extra_parameters)
+    details_data = [
+        ['Name', 'Type', 'Flowrate', 'Pressure', 'Temp']
+        + [dataset.extra_parameters[key]['label'] for key in extras]
+    ]
     
-    for eq in equipment:
-        details_data.append([
-            eq.equipment_name,
-            eq.equipment_type,
-            f"{eq.flowrate:.1f}",
-            f"{eq.pressure:.1f}",
-            f"{eq.temperature:.1f}"
-        ])
+    for name, eq_type, *values in iter_equipment_rows(dataset, extras):
+        details_data.append(
+            [name, eq_type] + ['-' if value != value else f"{value:.1f}" for value in values]
+        )
     
-    details_table = Table(details_data, colWidths=[1.5*inch, 1.3*inch, 1.2*inch, 1.2*inch, 1.2*inch])
+    # Name and type keep their width; the parameters share the rest
+    value_width = 3.6*inch / (3 + len(extras))
+    details_table = Table(details_data, colWidths=[1.5*inch, 1.3*inch] + [value_width] * (3 + len(extras)))
     details_table.setStyle(TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e74c3c')),
         ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
@@ -142,7 +149,10 @@ def generate_pdf_report(dataset):
     ]))
     elements.append(details_table)
     
+    build.finish()
+    
     # Build PDF
-    doc.build(elements)
+    with span('report.render'):
+        doc.build(elements)
     buffer.seek(0)
     return buffer
@@ -0,0 +1,233 @@
+import queue
+import threading
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .metrics import span
+from .models import Equipment, EquipmentType
+from .parameter_blocks import write_blocks
+
+# Column chunks buffered between pipeline stages before the parser blocks
+PIPELINE_QUEUE_SIZE = 4
+
+# Seconds a blocked stage waits before re-checking whether the pipeline stopped
+POLL_INTERVAL = 0.1
+
+STAT_FIELDS = [
+    'total_count', 'avg_flowrate', 'avg_pressure', 'avg_temperature',
+    'equipment_type_distribution', 'extra_parameters'
+]
+
+_DONE = object()
+
+
+class IngestAggregate:
+    """Running totals for the summary statistics of one ingest"""
+
+    def __init__(self):
+        self.total_count = 0
+        self.sums = {'Flowrate': 0.0, 'Pressure': 0.0, 'Temperature': 0.0}
+        self.type_distribution = {}
+        # Extra parameters may be missing, so they are averaged over their own counts
+        self.extra_sums = {}
+        self.extra_counts = {}
+
+    def add(self, columns):
+        """Fold one column chunk into the totals"""
+        self.total_count += len(columns['Type'])
+        for column in self.sums:
+            self.sums[column] += float(columns[column].sum())
+        for eq_type, count in pd.Series(columns['Type']).value_counts().items():
+            self.type_distribution[eq_type] = self.type_distribution.get(eq_type, 0) + int(count)
+        for key, values in columns['extras'].items():
+            self.extra_sums[key] = self.extra_sums.get(key, 0.0) + float(np.nansum(values))
+            self.extra_counts[key] = self.extra_counts.get(key, 0) + int(np.count_nonzero(~np.isnan(values)))
+
+    def apply(self, dataset, labels=None):
+        """
+        Copy the summary statistics onto a dataset (without saving it);
+        ``labels`` maps extra parameter keys to their CSV headers
+        """
+        dataset.total_count = self.total_count
+        if self.total_count:
+            dataset.avg_flowrate = self.sums['Flowrate'] / self.total_count
+            dataset.avg_pressure = self.sums['Pressure'] / self.total_count
+            dataset.avg_temperature = self.sums['Temperature'] / self.total_count
+        dataset.equipment_type_distribution = self.type_distribution
+        dataset.extra_parameters = {}
+        self._fold_extras(dataset, labels)
+
+    def extend(self, dataset, labels=None):
+        """
+        Fold the totals into a dataset's existing statistics (without saving
+        it); the stored averages are turned back into sums, so no row of the
+        dataset is read
+        """
+        existing = dataset.total_count
+        total = existing + self.total_count
+        if total:
+            dataset.avg_flowrate = (dataset.avg_flowrate * existing + self.sums['Flowrate']) / total
+            dataset.avg_pressure = (dataset.avg_pressure * existing + self.sums['Pressure']) / total
+            dataset.avg_temperature = (dataset.avg_temperature * existing + self.sums['Temperature']) / total
+        dataset.total_count = total
+        distribution = dict(dataset.equipment_type_distribution)
+        for eq_type, count in self.type_distribution.items():
+            distribution[eq_type] = distribution.get(eq_type, 0) + count
+        dataset.equipment_type_distribution = distribution
+        self._fold_extras(dataset, labels)
+
+    def _fold_extras(self, dataset, labels):
+        extras = dict(dataset.extra_parameters)
+        for key, total in self.extra_sums.items():
+            previous = extras.get(key, {'label': (labels or {}).get(key, key), 'count': 0, 'mean': None})
+            count = previous['count'] + self.extra_counts[key]
+            if count:
+                mean = ((previous['mean'] or 0.0) * previous['count'] + total) / count
+            else:
+                mean = None
+            extras[key] = {'label': previous['label'], 'count': count, 'mean': mean}
+        dataset.extra_parameters = extras
+
+
+def write_equipment(dataset, columns, start_row=0):
+    """
+    Bulk insert the equipment rows of one column chunk, the first of which
+    is row ``start_row`` of the dataset.
+
+    Type names are dictionary-encoded: each distinct name in the chunk is
+    resolved to its EquipmentType id once, and rows only carry the id.
+    Extra parameters are stored as one ParameterBlock each.
+    """
+    codes, names = pd.factorize(columns['Type'], use_na_sentinel=False)
+    type_ids = EquipmentType.objects.ids_for(names)
+    code_ids = [type_ids[str(name)] for name in names]
+    
+    equipment_list = [
+        Equipment(
+            dataset=dataset,
+            equipment_name=name,
+            equipment_type_id=code_ids[code],
+            flowrate=flowrate,
+            pressure=pressure,
+            temperature=temperature
+        )
+        for name, code, flowrate, pressure, temperature in zip(
+            columns['Equipment Name'], codes.tolist(),
+            columns['Flowrate'].tolist(), columns['Pressure'].tolist(),
+            columns['Temperature'].tolist()
+        )
+    ]
+    Equipment.objects.bulk_create(equipment_list)
+    if columns['extras']:
+        write_blocks(dataset, start_row, columns['extras'])
+
+
+def default_ingest():
+    """``ingest_pipelined`` with ``INGEST_PIPELINED`` enabled, else ``ingest_sequential``"""
+    return ingest_pipelined if settings.INGEST_PIPELINED else ingest_sequential
+
+
+def ingest_sequential(chunks, dataset):
+    """
+    Parse, aggregate and insert column chunks one after another
+    """
+    aggregate = IngestAggregate()
+    # Rows of the dataset before this ingest (an append)
+    start_row = dataset.total_count
+    for columns in chunks:
+        with span('ingest.aggregate'):
+            aggregate.add(columns)
+        with span('ingest.insert'):
+            write_equipment(dataset, columns, start_row)
+        start_row += len(columns['Type'])
+    return aggregate
+
+
+def ingest_pipelined(chunks, dataset, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Stream column chunks into the database with overlapping stages.
+
+    A parser thread pulls chunks from ``chunks`` (typically the lazy
+    ``parsing.iter_column_chunks``, so parsing itself happens on that thread)
+    and hands them to an aggregator thread and to the DB writer through
+    bounded queues. The writer runs on the calling thread so inserts use its
+    database connection and transaction. When either consumer falls behind its queue fills up and the
+    parser blocks, so at most ``queue_size`` chunks are buffered per stage.
+    A failure in any stage stops the others and is re-raised here.
+    """
+    aggregate = IngestAggregate()
+    aggregate_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    def parse():
+        try:
+            for columns in chunks:
+                for stage_queue in (aggregate_queue, write_queue):
+                    if not _put(stage_queue, columns, stop):
+                        return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            for stage_queue in (aggregate_queue, write_queue):
+                _put(stage_queue, _DONE, stop)
+
+    def aggregate_chunks():
+        try:
+            for columns in _drain(aggregate_queue, stop):
+                with span('ingest.aggregate'):
+                    aggregate.add(columns)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [
+        threading.Thread(target=parse, name='ingest-parser', daemon=True),
+        threading.Thread(target=aggregate_chunks, name='ingest-aggregator', daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    start_row = dataset.total_count
+    try:
+        for columns in _drain(write_queue, stop):
+            with span('ingest.insert'):
+                write_equipment(dataset, columns, start_row)
+            start_row += len(columns['Type'])
+    except Exception:
+        stop.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    return aggregate
+
+
+def _put(stage_queue, item, stop):
+    """Put an item on a bounded queue, giving up once the pipeline stops"""
+    while not stop.is_set():
+        try:
+            stage_queue.put(item, timeout=POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _drain(stage_queue, stop):
+    """Yield items from a queue until the producer finishes or the pipeline stops"""
+    while True:
+        try:
+            item = stage_queue.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+        if item is _DONE:
+            return
+        yield item
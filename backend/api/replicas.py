@@ -0,0 +1,85 @@
+"""
+Routing of dashboard reads to the ``replica`` database, when one is configured.
+
+Views wrapped in ``replica_reads`` run their queries against the replica,
+unless their user was pinned to the primary by a recent write (see
+``ReadYourWritesMiddleware``). Everything else, writes included, uses
+``default``.
+"""
+import contextvars
+import functools
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+REPLICA = 'replica'
+
+# Alias that reads of the running view are routed to; context variables are
+# copied into sync_to_async threads, so this covers async views too
+read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+class ReplicaRouter:
+    """Send reads to ``read_alias`` while it is set, otherwise to ``default``"""
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Read from the primary for ``REPLICA_STICKY_SECONDS`` on behalf of the user"""
+    if replica_configured():
+        cache.set(pin_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+async def apin_to_primary(user_id):
+    if replica_configured():
+        await cache.aset(pin_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def replica_reads(view):
+    """
+    Run a read-only view, sync or async, against the replica unless its
+    user is pinned to the primary. A 404 from the replica, e.g. for a
+    dataset it has not received yet, is answered from the primary instead.
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not replica_configured() or await cache.aget(pin_key(request.user.pk)):
+                return await view(request, *args, **kwargs)
+            token = read_alias.set(REPLICA)
+            try:
+                response = await view(request, *args, **kwargs)
+            finally:
+                read_alias.reset(token)
+            if response.status_code == 404:
+                response = await view(request, *args, **kwargs)
+            return response
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not replica_configured() or cache.get(pin_key(request.user.pk)):
+            return view(request, *args, **kwargs)
+        token = read_alias.set(REPLICA)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            read_alias.reset(token)
+        if response.status_code == 404:
+            response = view(request, *args, **kwargs)
+        return response
+    return wrapper
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from .models import Dataset, DatasetDeletion, Equipment, ParameterBlock, RetentionPolicy
+
+# Stored files are removed off the request path, one at a time
+_file_cleanup = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dataset-file-cleanup')
+
+
+def get_policy(user):
+    """
+    Return the user's retention policy, or an unsaved one built from the
+    ``DATASET_RETENTION`` setting if they never configured their own
+    """
+    policy = RetentionPolicy.objects.filter(user=user).first()
+    if policy is None:
+        policy = RetentionPolicy(user=user, **settings.DATASET_RETENTION)
+    return policy
+
+
+def expired_dataset_ids(user, policy=None):
+    """
+    Ids of the user's datasets that fall outside their retention policy.
+
+    Datasets are walked newest first; a dataset is expired once it is past
+    ``max_datasets``, older than ``max_age_days`` or pushes the running row
+    total over ``max_total_rows``. The newest dataset is always kept.
+    """
+    policy = policy or get_policy(user)
+    cutoff = None
+    if policy.max_age_days is not None:
+        cutoff = timezone.now() - timedelta(days=policy.max_age_days)
+
+    rows = Dataset.objects.filter(user=user).order_by('-uploaded_at').values_list(
+        'id', 'uploaded_at', 'total_count'
+    )
+    expired = []
+    total_rows = 0
+    for index, (dataset_id, uploaded_at, count) in enumerate(rows):
+        total_rows += count
+        if index == 0:
+            continue
+        if (
+            (policy.max_datasets is not None and index >= policy.max_datasets)
+            or (cutoff is not None and uploaded_at < cutoff)
+            or (policy.max_total_rows is not None and total_rows > policy.max_total_rows)
+        ):
+            expired.append(dataset_id)
+    return expired
+
+
+def delete_datasets(datasets):
+    """
+    Delete a queryset of datasets with set-based statements.
+
+    Equipment rows and blocks of extra parameters are removed with a single
+    ``DELETE ... WHERE dataset_id IN`` each instead of being collected per
+    dataset, and the stored CSV files are deleted in the background once the
+    transaction commits, together with any column files. Each deletion is
+    recorded for clients polling for changes, and records older than
+    ``DATASET_TOMBSTONE_DAYS`` are dropped.
+    Returns the number of datasets deleted.
+    """
+    files = list(datasets.exclude(file='').values_list('file', flat=True))
+    owners = dict(datasets.values_list('id', 'user_id'))
+    dataset_ids = list(owners)
+    if not dataset_ids:
+        return 0
+
+    expired = timezone.now() - timedelta(days=settings.DATASET_TOMBSTONE_DAYS)
+    with transaction.atomic():
+        DatasetDeletion.objects.bulk_create([
+            DatasetDeletion(user_id=user_id, dataset_id=dataset_id) for dataset_id, user_id in owners.items()
+        ])
+        DatasetDeletion.objects.filter(deleted_at__lt=expired).delete()
+        Equipment.objects.filter(dataset_id__in=dataset_ids).delete()
+        ParameterBlock.objects.filter(dataset_id__in=dataset_ids).delete()
+        Dataset.objects.filter(id__in=dataset_ids).delete()
+        transaction.on_commit(lambda: _file_cleanup.submit(_delete_files, files, dataset_ids))
+    return len(dataset_ids)
+
+
+def prune_datasets(user):
+    """
+    Apply the user's retention policy, returning the number of datasets pruned
+    """
+    expired = expired_dataset_ids(user)
+    if not expired:
+        return 0
+    return delete_datasets(Dataset.objects.filter(id__in=expired))
+
+
+def _delete_files(names, dataset_ids):
+    # columnar needs NumPy, which the views module does not load up front
+    from .columnar import delete_columns
+    
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except OSError:
+            pass
+    delete_columns(dataset_ids)
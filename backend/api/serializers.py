@@ -1,6 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Dataset, Equipment
+import codecs
+import os
+import re
+from .models import (
+    CORE_COLUMN_TARGETS, MAX_EXTRA_PARAMETERS, Anomaly, ColumnMapping, Dataset, Equipment,
+    ParameterThreshold, RetentionPolicy, UploadSession
+)
+from .uploads import CSV_SUFFIXES, DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -10,6 +17,8 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class EquipmentSerializer(serializers.ModelSerializer):
+    equipment_type = serializers.CharField(source='equipment_type.name', read_only=True)
+    
     class Meta:
         model = Equipment
         fields = ['id', 'equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature']
@@ -22,18 +31,133 @@ class DatasetSerializer(serializers.ModelSerializer):
     class Meta:
         model = Dataset
         fields = [
-            'id', 'filename', 'file', 'uploaded_at', 'user',
+            'id', 'filename', 'file', 'uploaded_at', 'updated_at', 'user',
             'total_count', 'avg_flowrate', 'avg_pressure', 'avg_temperature',
-            'equipment_type_distribution', 'equipment'
+            'equipment_type_distribution', 'extra_parameters', 'validation_report', 'equipment'
+        ]
+        read_only_fields = ['uploaded_at', 'updated_at', 'total_count', 'avg_flowrate', 
+                           'avg_pressure', 'avg_temperature', 'equipment_type_distribution',
+                           'extra_parameters', 'validation_report']
+
+
+class DatasetStatsSerializer(serializers.ModelSerializer):
+    """Dataset summary statistics without the equipment rows"""
+    
+    class Meta:
+        model = Dataset
+        fields = [
+            'id', 'filename', 'uploaded_at', 'updated_at', 'total_count', 'avg_flowrate',
+            'avg_pressure', 'avg_temperature', 'equipment_type_distribution',
+            'extra_parameters', 'validation_report'
         ]
-        read_only_fields = ['uploaded_at', 'total_count', 'avg_flowrate', 
-                           'avg_pressure', 'avg_temperature', 'equipment_type_distribution']
+        read_only_fields = fields
+
+
+class DatasetChangeSerializer(serializers.ModelSerializer):
+    """What a dataset list shows of a changed dataset"""
+    
+    class Meta:
+        model = Dataset
+        fields = ['id', 'filename', 'uploaded_at', 'updated_at', 'total_count']
+        read_only_fields = fields
 
 
 class DatasetUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
+    # Detected from the file when left out
+    encoding = serializers.CharField(required=False, max_length=32)
     
     def validate_file(self, value):
-        if not value.name.endswith('.csv'):
-            raise serializers.ValidationError("Only CSV files are allowed.")
+        if not value.name.lower().endswith(CSV_SUFFIXES):
+            raise serializers.ValidationError("Only CSV files (.csv, .csv.gz, .csv.zst or .zip) are allowed.")
+        return value
+    
+    def validate_encoding(self, value):
+        try:
+            codecs.lookup(value)
+        except LookupError:
+            raise serializers.ValidationError(f"Unknown encoding: {value}")
         return value
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.IntegerField(
+        min_value=1, max_value=MAX_CHUNK_SIZE, default=DEFAULT_CHUNK_SIZE
+    )
+    total_size = serializers.IntegerField(min_value=1)
+    
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'filename', 'total_size', 'chunk_size', 'created_at']
+        read_only_fields = ['id', 'created_at']
+    
+    def validate_filename(self, value):
+        value = os.path.basename(value)
+        if not value.lower().endswith(CSV_SUFFIXES):
+            raise serializers.ValidationError("Only CSV files (.csv, .csv.gz, .csv.zst or .zip) are allowed.")
+        return value
+
+
+class RetentionPolicySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RetentionPolicy
+        fields = ['max_datasets', 'max_age_days', 'max_total_rows']
+
+
+class ColumnMappingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ColumnMapping
+        fields = ['columns']
+    
+    def validate_columns(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Expected an object of CSV column -> target.")
+        for source, target in value.items():
+            if not isinstance(target, str) or not (
+                target in CORE_COLUMN_TARGETS or re.fullmatch(r'[a-z][a-z0-9_]{0,39}', target)
+            ):
+                raise serializers.ValidationError(
+                    f"Target of {source!r} must be one of {', '.join(CORE_COLUMN_TARGETS)} "
+                    "or a lowercase parameter key of at most 40 letters, digits and underscores."
+                )
+        targets = list(value.values())
+        if len(targets) != len(set(targets)):
+            raise serializers.ValidationError("Each target can only be mapped once.")
+        # A core column that is not remapped keeps reading its default header
+        sources = {**CORE_COLUMN_TARGETS}
+        sources.update((target, source) for source, target in value.items() if target in CORE_COLUMN_TARGETS)
+        for source in value:
+            readers = [target for target, header in sources.items() if header == source]
+            if len(readers) > 1:
+                raise serializers.ValidationError(
+                    f"Column {source!r} cannot feed both {' and '.join(readers)}; "
+                    "map the other one to a different column."
+                )
+        extras = [target for target in targets if target not in CORE_COLUMN_TARGETS]
+        if len(extras) > MAX_EXTRA_PARAMETERS:
+            raise serializers.ValidationError(f"At most {MAX_EXTRA_PARAMETERS} extra parameters can be mapped.")
+        return value
+
+
+class AnomalySerializer(serializers.ModelSerializer):
+    equipment_name = serializers.CharField(source='equipment.equipment_name', read_only=True)
+    equipment_type = serializers.CharField(source='equipment.equipment_type.name', read_only=True)
+    
+    class Meta:
+        model = Anomaly
+        fields = [
+            'id', 'equipment_id', 'equipment_name', 'equipment_type',
+            'parameter', 'rule', 'direction', 'value', 'score'
+        ]
+
+
+class ParameterThresholdSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ParameterThreshold
+        fields = ['parameter', 'min_value', 'max_value']
+    
+    def validate(self, data):
+        min_value, max_value = data.get('min_value'), data.get('max_value')
+        if min_value is not None and max_value is not None and min_value > max_value:
+            raise serializers.ValidationError("min_value cannot be greater than max_value.")
+        return data
@@ -0,0 +1,167 @@
+import numpy as np
+from django.core.cache import cache
+from . import columnar
+from .parameter_blocks import extra_values
+
+SERIES_METHODS = ['lttb', 'minmax', 'histogram']
+
+# Upper bound on the points (or histogram bins) a client may request
+MAX_SERIES_POINTS = 10000
+
+# Seconds a computed series stays cached
+SERIES_CACHE_TIMEOUT = 60 * 60
+
+
+def series_values(dataset, parameter, equipment_type=None):
+    """
+    Values of one parameter in row order, optionally for a single equipment
+    type, as ``(values, rows)``.
+
+    Rows without a value for an extra parameter are left out; ``rows`` then
+    holds the row position of each kept value, and is None when every row
+    is kept.
+    """
+    if parameter in dataset.extra_parameters:
+        values = extra_values(dataset, parameter)
+        if equipment_type is not None:
+            values = values[type_mask(dataset, equipment_type)]
+        rows = np.flatnonzero(~np.isnan(values))
+        return values[rows], rows
+
+    columns = columnar.open_columns(dataset)
+    if columns is not None:
+        values = columns.values(parameter)
+        if equipment_type is None:
+            return values, None
+        if equipment_type not in columns.types:
+            return values[:0], None
+        return values[columns.type_codes() == columns.types.index(equipment_type)], None
+
+    equipment = dataset.equipment.order_by('id')
+    if equipment_type is not None:
+        equipment = equipment.filter(equipment_type__name=equipment_type)
+    return np.fromiter(
+        equipment.values_list(parameter, flat=True).iterator(chunk_size=2000),
+        dtype='float64'
+    ), None
+
+
+def type_mask(dataset, equipment_type):
+    """Boolean array, in row order, of the rows of one equipment type"""
+    columns = columnar.open_columns(dataset)
+    if columns is not None:
+        if equipment_type not in columns.types:
+            return np.zeros(dataset.total_count, dtype=bool)
+        return columns.type_codes() == columns.types.index(equipment_type)
+    return np.fromiter(
+        (
+            name == equipment_type
+            for name in dataset.equipment.order_by('id').values_list(
+                'equipment_type__name', flat=True
+            ).iterator(chunk_size=2000)
+        ),
+        dtype=bool,
+        count=dataset.total_count
+    )
+
+
+def minmax_downsample(values, points):
+    """
+    Keep the minimum and maximum of ``points // 2`` equal-width buckets,
+    which preserves spikes. Returns ``(x, y)`` with x the row positions.
+    """
+    n = len(values)
+    if n <= points:
+        return np.arange(n), np.asarray(values)
+
+    buckets = max(1, points // 2)
+    size = n // buckets
+    body = np.asarray(values[:buckets * size]).reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    x = np.concatenate([offsets + body.argmin(axis=1), offsets + body.argmax(axis=1)])
+    # The last bucket absorbs the remainder rows
+    if n > buckets * size:
+        tail = np.asarray(values[(buckets - 1) * size:])
+        x[buckets - 1] = (buckets - 1) * size + tail.argmin()
+        x[-1] = (buckets - 1) * size + tail.argmax()
+    x = np.unique(x)
+    return x, np.asarray(values[x])
+
+
+def lttb_downsample(values, points):
+    """
+    Largest-Triangle-Three-Buckets downsampling to ``points`` points.
+
+    The bucket loop is inherently sequential, but each bucket's triangle
+    areas are computed as one vectorized expression, so the cost is
+    O(points) Python steps regardless of the number of rows.
+    """
+    n = len(values)
+    if n <= points or points < 3:
+        return np.arange(n), np.asarray(values)
+
+    y = np.asarray(values, dtype='float64')
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    x = np.empty(points, dtype=np.int64)
+    x[0], x[-1] = 0, n - 1
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        next_x = (next_start + next_end - 1) / 2
+        next_y = y[next_start:next_end].mean()
+        candidates = np.arange(start, end)
+        areas = np.abs(
+            (previous - next_x) * (y[start:end] - y[previous])
+            - (previous - candidates) * (next_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        x[i + 1] = previous
+    return x, y[x]
+
+
+def histogram(values, bins):
+    """Counts of ``values`` in ``bins`` equal-width bins"""
+    if not len(values):
+        return [], []
+    counts, edges = np.histogram(values, bins=bins)
+    return counts.tolist(), edges.tolist()
+
+
+def get_series(dataset, parameter, method, points, equipment_type=None):
+    """
+    Chart-ready series of a dataset parameter capped at ``points`` points.
+
+    Results are cached per (dataset, parameter, type, method, budget); the
+    key includes the dataset's row count so appended rows are never served
+    from a stale entry.
+    """
+    key = (
+        f'series:{dataset.pk}:{dataset.total_count}:{parameter}:'
+        f'{equipment_type or ""}:{method}:{points}'
+    )
+    series = cache.get(key)
+    if series is not None:
+        return series
+
+    values, rows = series_values(dataset, parameter, equipment_type)
+    series = {
+        'parameter': parameter,
+        'equipment_type': equipment_type,
+        'method': method,
+        'total_points': len(values),
+    }
+    if method == 'histogram':
+        series['counts'], series['bin_edges'] = histogram(values, points)
+    else:
+        downsample = lttb_downsample if method == 'lttb' else minmax_downsample
+        x, y = downsample(values, points)
+        if rows is not None:
+            # Positions in the value array back to row positions
+            x = rows[x]
+        series['x'] = x.tolist()
+        series['y'] = y.tolist()
+
+    cache.set(key, series, SERIES_CACHE_TIMEOUT)
+    return series
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from .models import ColumnMapping
+from .serializers import ColumnMappingSerializer
+
+CSV = (
+    'Equipment Name,Type,Flowrate,Pressure,Temperature\n'
+    'Pump-1,Pump,120,5.2,110\n'
+    'Valve-1,Valve,60,4.1,105\n'
+)
+
+
+class MediaTestCase(TestCase):
+    """Test case whose uploaded files go to a throwaway MEDIA_ROOT"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create_user('tester', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, content=CSV, name='plant.csv'):
+        return self.client.post(
+            '/api/upload/', {'file': SimpleUploadedFile(name, content.encode())}, format='multipart'
+        )
+
+
+class ColumnMappingSerializerTests(TestCase):
+    def test_accepts_remapped_core_columns(self):
+        serializer = ColumnMappingSerializer(data={'columns': {'Q': 'flowrate', 'Visc': 'viscosity'}})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_accepts_swapped_default_headers(self):
+        serializer = ColumnMappingSerializer(data={'columns': {'Flowrate': 'pressure', 'Pressure': 'flowrate'}})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_rejects_header_shared_with_another_core_column(self):
+        serializer = ColumnMappingSerializer(data={'columns': {'Flowrate': 'pressure'}})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('columns', serializer.errors)
+
+
+class ColumnMappingUploadTests(MediaTestCase):
+    def test_shared_header_mapping_cannot_break_uploads(self):
+        response = self.client.put(
+            '/api/column-mapping/', {'columns': {'Flowrate': 'pressure'}}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.upload().status_code, 201)
+
+    def test_stored_shared_header_mapping_is_a_client_error(self):
+        # Saved before the serializer rejected it
+        ColumnMapping.objects.create(user=self.user, columns={'Flowrate': 'pressure'})
+        response = self.upload()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('column-mapping', response.json()['error'])
+
+
+class ChunkedUploadTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        upload_dir = patch('api.uploads.UPLOAD_DIR', os.path.join(settings.MEDIA_ROOT, 'uploads'))
+        upload_dir.start()
+        self.addCleanup(upload_dir.stop)
+
+    def start_upload(self, content, chunk_size):
+        response = self.client.post(
+            '/api/uploads/',
+            {'filename': 'plant.csv', 'total_size': len(content), 'chunk_size': chunk_size},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def send_chunk(self, upload_id, offset, chunk):
+        return self.client.generic(
+            'PUT', f'/api/uploads/{upload_id}/chunks/{offset}/', chunk,
+            content_type='application/octet-stream',
+            HTTP_X_CHUNK_CHECKSUM=hashlib.sha256(chunk).hexdigest()
+        )
+
+    def test_chunks_assemble_into_a_dataset(self):
+        content = CSV.encode()
+        upload_id = self.start_upload(content, 32)
+        for offset in range(0, len(content), 32):
+            self.assertEqual(self.send_chunk(upload_id, offset, content[offset:offset + 32]).status_code, 200)
+        response = self.client.post(f'/api/uploads/{upload_id}/finalize/', {}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['total_count'], 2)
+
+    def test_short_middle_chunk_is_rejected(self):
+        content = CSV.encode()
+        upload_id = self.start_upload(content, 32)
+        response = self.send_chunk(upload_id, 32, content[32:60])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(32, self.client.get(f'/api/uploads/{upload_id}/').json()['missing_offsets'])
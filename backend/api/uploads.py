@@ -0,0 +1,158 @@
+import hashlib
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from .models import UploadChunk, UploadSession
+
+# Plain or compressed CSV; how a file is read is decided by its content
+CSV_SUFFIXES = ('.csv', '.csv.gz', '.csv.zst', '.zip')
+
+# Default and maximum size of a single chunk of a resumable upload
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Bytes copied from the request stream to disk per read
+STREAM_BLOCK_SIZE = 64 * 1024
+
+UPLOAD_DIR = os.path.join(settings.MEDIA_ROOT, 'uploads')
+
+
+def session_path(session):
+    """
+    Path of the partial file that chunks of an upload session are written into
+    """
+    return os.path.join(UPLOAD_DIR, f'{session.id}.part')
+
+
+def create_session_file(session):
+    """
+    Pre-allocate the partial file so chunks can be written at any offset
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    with open(session_path(session), 'wb') as f:
+        f.truncate(session.total_size)
+
+
+def write_chunk(session, offset, stream, size, checksum):
+    """
+    Copy ``size`` bytes from ``stream`` into the session file at ``offset``;
+    every chunk must be ``chunk_size`` bytes except the last, which holds
+    the rest of the file.
+
+    The chunk is streamed to disk without buffering it in memory and is only
+    recorded once its SHA-256 matches ``checksum``. Re-sending a chunk at the
+    same offset overwrites it, so retries are idempotent.
+    """
+    if offset < 0 or offset % session.chunk_size or offset >= session.total_size:
+        raise ValueError('Chunk offset must be a multiple of the chunk size within the file')
+    # Every chunk but the last is full, so a recorded offset is a whole range
+    expected = min(session.chunk_size, session.total_size - offset)
+    if size != expected:
+        raise ValueError(f'Chunk at offset {offset} must be {expected} bytes, got {size}')
+
+    digest = hashlib.sha256()
+    written = 0
+    with open(session_path(session), 'r+b') as f:
+        f.seek(offset)
+        while written < size:
+            block = stream.read(min(STREAM_BLOCK_SIZE, size - written))
+            if not block:
+                break
+            digest.update(block)
+            f.write(block)
+            written += len(block)
+
+    if written != size or digest.hexdigest() != checksum.lower():
+        # The range on disk no longer holds a verified chunk
+        UploadChunk.objects.filter(session=session, offset=offset).delete()
+        if written != size:
+            raise ValueError(f'Expected {size} bytes but received {written}')
+        raise ValueError('Chunk checksum mismatch')
+
+    # Single-statement upsert so parallel chunk requests never contend on a
+    # read-then-write transaction
+    chunk = UploadChunk(session=session, offset=offset, size=size, checksum=digest.hexdigest())
+    UploadChunk.objects.bulk_create(
+        [chunk],
+        update_conflicts=True,
+        unique_fields=['session', 'offset'],
+        update_fields=['size', 'checksum']
+    )
+    return chunk
+
+
+def missing_offsets(session):
+    """
+    Return the chunk offsets that have not been received yet
+    """
+    received = set(session.chunks.values_list('offset', flat=True))
+    return [
+        offset for offset in range(0, session.total_size, session.chunk_size)
+        if offset not in received
+    ]
+
+
+def file_checksum(path):
+    """
+    SHA-256 of a file, read in blocks
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(STREAM_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize_session(session, checksum=None, encoding=None):
+    """
+    Verify that every chunk of the session arrived and ingest the file.
+
+    The assembled file is handed straight to the streaming ``process_csv``
+    path from disk, with ``encoding`` if the client gave one. The session
+    and its partial file are removed afterwards.
+    """
+    # Deferred so importing the serializers does not load pandas
+    from .utils import process_csv
+
+    if missing_offsets(session):
+        raise ValueError('Upload is incomplete')
+
+    path = session_path(session)
+    if checksum and file_checksum(path) != checksum.lower():
+        raise ValueError('File checksum mismatch')
+
+    with open(path, 'rb') as f:
+        dataset = process_csv(File(f, name=session.filename), session.user, encoding=encoding)
+
+    discard_session(session)
+    return dataset
+
+
+def expire_sessions(user=None):
+    """
+    Delete upload sessions started more than UPLOAD_SESSION_EXPIRY_HOURS ago,
+    with their chunks and partial files, returning how many were removed
+    """
+    cutoff = timezone.now() - timedelta(hours=settings.UPLOAD_SESSION_EXPIRY_HOURS)
+    sessions = UploadSession.objects.filter(created_at__lt=cutoff)
+    if user is not None:
+        sessions = sessions.filter(user=user)
+
+    expired = 0
+    for session in sessions.iterator():
+        discard_session(session)
+        expired += 1
+    return expired
+
+
+def discard_session(session):
+    """
+    Delete an upload session together with its partial file
+    """
+    try:
+        os.remove(session_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
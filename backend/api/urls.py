@@ -1,18 +1,38 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'datasets', views.DatasetViewSet, basename='dataset')
 
+# Read-heavy and streaming endpoints have async versions for ASGI deployments
+read_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/register/', views.register_user, name='register'),
     path('auth/login/', views.login_user, name='login'),
+    path('auth/logout/', views.logout_user, name='logout'),
+    path('auth/token/rotate/', views.rotate_token, name='token-rotate'),
     path('upload/', views.upload_dataset, name='upload'),
+    path('uploads/', views.init_upload, name='upload-init'),
+    path('uploads/<uuid:upload_id>/', views.upload_session, name='upload-session'),
+    path('uploads/<uuid:upload_id>/chunks/<int:offset>/', views.upload_chunk, name='upload-chunk'),
+    path('uploads/<uuid:upload_id>/finalize/', views.finalize_upload, name='upload-finalize'),
     path('datasets-list/', views.get_datasets, name='datasets-list'),
-    path('dataset/<int:dataset_id>/', views.get_dataset_detail, name='dataset-detail'),
+    path('datasets-changes/', views.get_dataset_changes, name='datasets-changes'),
+    path('dataset/<int:dataset_id>/', read_views.get_dataset_detail, name='dataset-detail'),
+    path('dataset/<int:dataset_id>/append/', views.append_dataset, name='dataset-append'),
     path('dataset/<int:dataset_id>/delete/', views.delete_dataset, name='dataset-delete'),
-    path('dataset/<int:dataset_id>/report/', views.generate_report, name='generate-report'),
-    path('history/', views.get_history, name='history'),
+    path('dataset/<int:dataset_id>/report/', read_views.generate_report, name='generate-report'),
+    path('dataset/<int:dataset_id>/columns/<str:parameter>/', read_views.export_column, name='dataset-column-export'),
+    path('dataset/<int:dataset_id>/export/', read_views.export_dataset, name='dataset-export'),
+    path('dataset/<int:dataset_id>/series/', views.get_dataset_series, name='dataset-series'),
+    path('dataset/<int:dataset_id>/anomalies/', views.dataset_anomalies, name='dataset-anomalies'),
+    path('thresholds/', views.parameter_thresholds, name='parameter-thresholds'),
+    path('compare/', views.compare_dataset_list, name='compare-datasets'),
+    path('history/', read_views.get_history, name='history'),
+    path('retention/', views.retention_policy, name='retention-policy'),
+    path('column-mapping/', views.column_mapping, name='column-mapping'),
 ]
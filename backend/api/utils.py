@@ -1,96 +1,259 @@
-import pandas as pd
-from io import StringIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
-from .models import Dataset, Equipment
+import numpy as np
+from django.db import transaction
+from .models import ColumnMapping, Dataset, Equipment
+from . import columnar
+from .anomalies import detect_anomalies
+from .metrics import span
+from .parameter_blocks import extra_values
+from .parsing import ColumnMap, CsvSource, ValidationReport, iter_column_chunks, read_csv
+from .pipeline import STAT_FIELDS, default_ingest
+from .retention import prune_datasets
 
 
-def process_csv(file, user):
+def process_csv(file, user, encoding=None):
     """
-    Process uploaded CSV file and create dataset with equipment records
+    Process uploaded CSV file and create dataset with equipment records.
+
+    The file may be gzip, zip or zstd-compressed and is decompressed as it
+    is parsed; its ``encoding`` is detected unless given.
+
+    The file is parsed in chunks of ``CSV_CHUNK_ROWS`` rows (see ``parsing``)
+    that are aggregated as running sums and inserted one after another (or
+    overlapped, with ``INGEST_PIPELINED``), so the whole file never has to
+    be held in memory at once. Rows with missing or non-numeric cells are
+    skipped and listed in the dataset's ``validation_report``. Columns are
+    read as the user's ``ColumnMapping`` says, extra parameters included. The
+    retention policy is applied once the new dataset is committed, so a
+    failed upload never costs an older dataset.
     """
-    # Read CSV file
-    if isinstance(file, InMemoryUploadedFile):
-        csv_data = file.read().decode('utf-8')
-        df = pd.read_csv(StringIO(csv_data))
-    else:
-        df = pd.read_csv(file)
-    
     # Validate required columns
-    required_columns = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
-    if not all(col in df.columns for col in required_columns):
-        raise ValueError(f"CSV must contain columns: {', '.join(required_columns)}")
+    source = CsvSource(file, encoding)
+    column_map = ColumnMap(read_csv(source, nrows=0).columns, get_column_mapping(user))
     
-    # Calculate summary statistics
-    total_count = len(df)
-    avg_flowrate = float(df['Flowrate'].mean())
-    avg_pressure = float(df['Pressure'].mean())
-    avg_temperature = float(df['Temperature'].mean())
+    # Stages are timed as ingest.* spans, the whole upload as process_csv
+    upload = span('process_csv')
+    report = ValidationReport()
+    chunks = iter_column_chunks(source, report=report, column_map=column_map)
+    dataset = load_dataset(user, file, chunks, report=report, column_map=column_map)
     
-    # Equipment type distribution
-    type_distribution = df['Type'].value_counts().to_dict()
+    def prune():
+        with span('ingest.prune'):
+            prune_datasets(user)
     
-    # Create dataset
-    dataset = Dataset.objects.create(
-        user=user,
-        filename=file.name,
-        file=file,
-        total_count=total_count,
-        avg_flowrate=avg_flowrate,
-        avg_pressure=avg_pressure,
-        avg_temperature=avg_temperature,
-        equipment_type_distribution=type_distribution
-    )
+    # A pruning error is logged rather than failing an upload that is stored
+    transaction.on_commit(prune, robust=True)
+    upload.finish()
     
-    # Create equipment records
-    equipment_list = []
-    for _, row in df.iterrows():
-        equipment = Equipment(
-            dataset=dataset,
-            equipment_name=row['Equipment Name'],
-            equipment_type=row['Type'],
-            flowrate=float(row['Flowrate']),
-            pressure=float(row['Pressure']),
-            temperature=float(row['Temperature'])
-        )
-        equipment_list.append(equipment)
+    return dataset
+
+
+def load_dataset(user, file, chunks, ingest=None, report=None, column_map=None, **fields):
+    """
+    Bulk load column chunks into a new dataset for ``user``.
+
+    ``file`` is stored as the dataset's source file; extra ``fields`` are set
+    on the Dataset row, and ``report``, the ``ValidationReport`` filled in
+    while ``chunks`` are parsed, is stored once they are consumed.
+    ``column_map``, the ``ColumnMap`` they were parsed with, labels the
+    extra parameters. ``ingest`` defaults to ``pipeline.default_ingest()``. With ``COLUMNAR_STORAGE`` enabled the chunks are also
+    written to column files as they stream past. Anomaly detection runs
+    once every row is stored.
+
+    The whole load is one transaction: other connections see the dataset
+    only once its rows, statistics and anomalies are all in place, and a
+    failure at any stage rolls it back and removes the stored file and
+    column files, leaving nothing to clean up before a retry.
+    """
+    dataset = None
+    try:
+        with transaction.atomic():
+            # Create dataset, statistics are filled in once every chunk is stored
+            dataset = Dataset.objects.create(
+                user=user,
+                filename=file.name,
+                file=file,
+                **fields
+            )
+            
+            if columnar.enabled():
+                chunks = columnar.capture(dataset.pk, chunks)
+            aggregate = (ingest or default_ingest())(chunks, dataset)
+            
+            # Store summary statistics
+            aggregate.apply(dataset, column_map.extra_labels if column_map else None)
+            update_fields = STAT_FIELDS + ['updated_at']
+            if report is not None:
+                dataset.validation_report = report.as_dict()
+                update_fields.append('validation_report')
+            dataset.save(update_fields=update_fields)
+            
+            with span('ingest.anomalies'):
+                detect_anomalies(dataset)
+    except BaseException:
+        if dataset is not None:
+            # Files are outside the transaction; the rolled back id may be reused
+            dataset.file.delete(save=False)
+            columnar.delete_columns([dataset.pk])
+        raise
     
-    Equipment.objects.bulk_create(equipment_list)
+    return dataset
+
+
+def append_csv(file, dataset, ingest=None, report=None, encoding=None):
+    """
+    Append the rows of a CSV file to an existing dataset.
+
+    Statistics are updated incrementally from the running sums of the new
+    rows only, and column files, when the dataset has them, are extended in
+    place. The new rows are checked against the owner's thresholds.
+    Everything happens in one transaction with the dataset row locked,
+    so concurrent appends are serialized and a failed append leaves the
+    dataset untouched. Rows skipped while parsing are recorded in
+    ``report``. The file is read like an upload (see ``process_csv``); rows
+    without an extra parameter the dataset already has are left without a
+    value. Returns the updated dataset and the number of rows appended.
+    """
+    source = CsvSource(file, encoding)
+    column_map = ColumnMap(read_csv(source, nrows=0).columns, get_column_mapping(dataset.user))
     
-    # Keep only last 5 datasets per user
-    user_datasets = Dataset.objects.filter(user=user).order_by('-uploaded_at')
-    if user_datasets.count() > 5:
-        datasets_to_delete = user_datasets[5:]
-        for ds in datasets_to_delete:
-            ds.file.delete()
-            ds.delete()
+    with transaction.atomic():
+        dataset = Dataset.objects.select_for_update().get(pk=dataset.pk)
+        # Rows inserted from here on get larger ids
+        last_id = Equipment.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        chunks = iter_column_chunks(source, report=report, column_map=column_map)
+        writer = columnar.open_writer(dataset)
+        if writer is not None:
+            chunks = writer.passthrough(chunks)
+        try:
+            aggregate = (ingest or default_ingest())(chunks, dataset)
+            aggregate.extend(dataset, column_map.extra_labels)
+            dataset.save(update_fields=STAT_FIELDS + ['updated_at'])
+            detect_anomalies(dataset, since_id=last_id)
+            if writer is not None:
+                writer.close()
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
     
-    return dataset
+    return dataset, aggregate.total_count
+
+
+def get_column_mapping(user):
+    """The user's ``ColumnMapping.columns``, empty if they never set one"""
+    return ColumnMapping.objects.filter(user=user).values_list('columns', flat=True).first() or {}
+
+
+def iter_equipment_rows(dataset, extras=()):
+    """
+    Iterate ``(name, type, flowrate, pressure, temperature)`` tuples of a
+    dataset, from its column files when present and the database otherwise,
+    followed by the values of the ``extras`` parameters (NaN where missing)
+    """
+    rows = _iter_core_rows(dataset)
+    if not extras:
+        yield from rows
+        return
+    values = [extra_values(dataset, key).tolist() for key in extras]
+    for row, *extra in zip(rows, *values):
+        yield (*row, *extra)
+
+
+def _iter_core_rows(dataset):
+    columns = columnar.open_columns(dataset)
+    if columns is None:
+        yield from dataset.equipment.order_by('id').values_list(
+            'equipment_name', 'equipment_type__name', 'flowrate', 'pressure', 'temperature'
+        ).iterator(chunk_size=2000)
+        return
+    
+    types = columns.types
+    yield from zip(
+        columns.names(),
+        (types[code] for code in columns.type_codes().tolist()),
+        columns.values('flowrate').tolist(),
+        columns.values('pressure').tolist(),
+        columns.values('temperature').tolist()
+    )
+
+
+def parameter_values(dataset, parameter):
+    """
+    NumPy array of one numeric parameter of a dataset; a zero-copy memory map
+    when the dataset has column files. Extra parameters are NaN where missing.
+    """
+    if parameter in dataset.extra_parameters:
+        return extra_values(dataset, parameter)
+    columns = columnar.open_columns(dataset)
+    if columns is not None:
+        return columns.values(parameter)
+    return np.fromiter(
+        dataset.equipment.values_list(parameter, flat=True).iterator(chunk_size=2000),
+        dtype='float64'
+    )
+
+
+def parameter_statistics(dataset):
+    """
+    Min, quartiles, max and standard deviation of each numeric parameter
+    """
+    statistics = {}
+    for parameter in dataset.parameter_labels():
+        values = parameter_values(dataset, parameter)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            statistics[parameter] = None
+            continue
+        minimum, q1, median, q3, maximum = np.percentile(values, [0, 25, 50, 75, 100])
+        statistics[parameter] = {
+            'min': round(float(minimum), 2),
+            'q1': round(float(q1), 2),
+            'median': round(float(median), 2),
+            'q3': round(float(q3), 2),
+            'max': round(float(maximum), 2),
+            'std': round(float(np.std(values)), 2)
+        }
+    return statistics
+
+
+def parameter_averages(dataset):
+    """Average of every numeric parameter, None for an extra one with no values"""
+    averages = {
+        'flowrate': round(dataset.avg_flowrate, 2),
+        'pressure': round(dataset.avg_pressure, 2),
+        'temperature': round(dataset.avg_temperature, 2)
+    }
+    for key, extra in dataset.extra_parameters.items():
+        averages[key] = None if extra['mean'] is None else round(extra['mean'], 2)
+    return averages
 
 
 def get_dataset_summary(dataset):
     """
     Get comprehensive summary of a dataset
     """
-    equipment = dataset.equipment.all()
-    
+    extras = list(dataset.extra_parameters)
     summary = {
         'total_count': dataset.total_count,
-        'averages': {
-            'flowrate': round(dataset.avg_flowrate, 2),
-            'pressure': round(dataset.avg_pressure, 2),
-            'temperature': round(dataset.avg_temperature, 2)
-        },
+        'parameters': [
+            {'key': key, 'label': label} for key, label in dataset.parameter_labels().items()
+        ],
+        'averages': parameter_averages(dataset),
+        'statistics': parameter_statistics(dataset),
         'equipment_type_distribution': dataset.equipment_type_distribution,
         'equipment_details': []
     }
     
-    for eq in equipment:
-        summary['equipment_details'].append({
-            'equipment_name': eq.equipment_name,
-            'equipment_type': eq.equipment_type,
-            'flowrate': eq.flowrate,
-            'pressure': eq.pressure,
-            'temperature': eq.temperature
-        })
+    for name, eq_type, flowrate, pressure, temperature, *extra in iter_equipment_rows(dataset, extras):
+        details = {
+            'equipment_name': name,
+            'equipment_type': eq_type,
+            'flowrate': flowrate,
+            'pressure': pressure,
+            'temperature': temperature
+        }
+        for key, value in zip(extras, extra):
+            details[key] = None if value != value else value
+        summary['equipment_details'].append(details)
     
     return summary
@@ -5,17 +5,45 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Prefetch
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render
-from .models import Dataset, Equipment
+from .models import ColumnMapping, Dataset, Equipment, ParameterThreshold, UploadSession
 from .serializers import (
+    AnomalySerializer,
+    ColumnMappingSerializer,
+    DatasetChangeSerializer,
     DatasetSerializer, 
+    DatasetStatsSerializer,
     DatasetUploadSerializer,
     EquipmentSerializer,
+    ParameterThresholdSerializer,
+    RetentionPolicySerializer,
+    UploadSessionSerializer,
     UserSerializer
 )
-from .utils import process_csv, get_dataset_summary
-from .pdf_generator import generate_pdf_report
+from .changes import dataset_changes, parse_cursor
+from .retention import delete_datasets, get_policy, prune_datasets
+from .replicas import replica_reads
+from . import metrics, uploads
+
+# Modules built on pandas, NumPy or ReportLab (utils, columnar, series,
+# anomalies, compare, export, pdf_generator) are imported inside the views
+# that use them, so starting a worker or a manage.py command does not pay
+# for them.
+
+
+# Most anomalies returned by one request
+MAX_ANOMALY_RESULTS = 1000
+
+
+def with_equipment(datasets):
+    """Prefetch equipment rows and their types for DatasetSerializer"""
+    return datasets.prefetch_related(
+        Prefetch('equipment', queryset=Equipment.objects.select_related('equipment_type'))
+    )
 
 
 def index(request):
@@ -23,6 +51,16 @@ def index(request):
     return render(request, 'index.html')
 
 
+def prometheus_metrics(request):
+    """
+    Request and processing metrics of this process in the Prometheus text
+    format, served to clients from ``METRICS_ALLOWED_IPS`` only
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_user(request):
@@ -75,10 +113,30 @@ def login_user(request):
     })
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_user(request):
+    """Revoke the user's token"""
+    Token.objects.filter(user=request.user).delete()
+    return Response({'message': 'Logged out successfully'})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def rotate_token(request):
+    """Replace the user's token with a new one"""
+    with transaction.atomic():
+        Token.objects.filter(user=request.user).delete()
+        token = Token.objects.create(user=request.user)
+    return Response({'token': token.key})
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def upload_dataset(request):
     """Upload and process CSV dataset"""
+    from .utils import process_csv
+    
     serializer = DatasetUploadSerializer(data=request.data)
     
     if not serializer.is_valid():
@@ -86,10 +144,155 @@ def upload_dataset(request):
     
     try:
         file = serializer.validated_data['file']
-        dataset = process_csv(file, request.user)
+        dataset = process_csv(file, request.user, encoding=serializer.validated_data.get('encoding'))
         
         return Response(
-            DatasetSerializer(dataset).data,
+            DatasetSerializer(with_equipment(Dataset.objects.filter(pk=dataset.pk)).get()).data,
+            status=status.HTTP_201_CREATED
+        )
+    except ValueError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except Exception as e:
+        return Response(
+            {'error': f'Error processing file: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def append_dataset(request, dataset_id):
+    """Append the rows of a CSV file to an existing dataset"""
+    from .parsing import ValidationReport
+    from .utils import append_csv
+    
+    try:
+        dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+    except Dataset.DoesNotExist:
+        return Response(
+            {'error': 'Dataset not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    serializer = DatasetUploadSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        report = ValidationReport()
+        dataset, appended = append_csv(
+            serializer.validated_data['file'], dataset, report=report,
+            encoding=serializer.validated_data.get('encoding')
+        )
+    except ValueError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except Exception as e:
+        return Response(
+            {'error': f'Error processing file: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    
+    return Response({
+        **DatasetStatsSerializer(dataset).data,
+        'appended': appended,
+        'append_validation_report': report.as_dict(),
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def init_upload(request):
+    """Start a resumable, chunked upload"""
+    serializer = UploadSessionSerializer(data=request.data)
+    
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    session = serializer.save(user=request.user)
+    uploads.create_session_file(session)
+    
+    data = UploadSessionSerializer(session).data
+    data['missing_offsets'] = uploads.missing_offsets(session)
+    return Response(data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def upload_session(request, upload_id):
+    """Get the progress of a chunked upload, or abort it"""
+    try:
+        session = UploadSession.objects.get(id=upload_id, user=request.user)
+    except UploadSession.DoesNotExist:
+        return Response(
+            {'error': 'Upload not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    if request.method == 'DELETE':
+        uploads.discard_session(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    data = UploadSessionSerializer(session).data
+    data['missing_offsets'] = uploads.missing_offsets(session)
+    return Response(data)
+
+
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def upload_chunk(request, upload_id, offset):
+    """Receive one chunk of a chunked upload as the raw request body"""
+    try:
+        session = UploadSession.objects.get(id=upload_id, user=request.user)
+    except UploadSession.DoesNotExist:
+        return Response(
+            {'error': 'Upload not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    checksum = request.headers.get('X-Chunk-Checksum')
+    if not checksum:
+        return Response(
+            {'error': 'X-Chunk-Checksum header is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        size = int(request.headers.get('Content-Length') or 0)
+        chunk = uploads.write_chunk(session, offset, request.stream, size, checksum)
+    except ValueError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response({'offset': chunk.offset, 'size': chunk.size})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def finalize_upload(request, upload_id):
+    """Assemble a chunked upload and process it as a dataset"""
+    try:
+        session = UploadSession.objects.get(id=upload_id, user=request.user)
+    except UploadSession.DoesNotExist:
+        return Response(
+            {'error': 'Upload not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    try:
+        dataset = uploads.finalize_session(
+            session, request.data.get('checksum'), request.data.get('encoding')
+        )
+        
+        return Response(
+            DatasetSerializer(with_equipment(Dataset.objects.filter(pk=dataset.pk)).get()).data,
             status=status.HTTP_201_CREATED
         )
     except ValueError as e:
@@ -106,17 +309,40 @@ def upload_dataset(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def get_datasets(request):
     """Get all datasets for the authenticated user"""
-    datasets = Dataset.objects.filter(user=request.user)
+    datasets = with_equipment(Dataset.objects.filter(user=request.user))
     serializer = DatasetSerializer(datasets, many=True)
     return Response(serializer.data)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
+def get_dataset_changes(request):
+    """Get the datasets added, changed or deleted since a cursor"""
+    since = request.query_params.get('since')
+    try:
+        since = parse_cursor(since) if since else None
+    except ValueError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    changes = dataset_changes(request.user, since)
+    changes['changed'] = DatasetChangeSerializer(changes['changed'], many=True).data
+    return Response(changes)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@replica_reads
 def get_dataset_detail(request, dataset_id):
     """Get detailed information about a specific dataset"""
+    from .utils import get_dataset_summary
+    
     try:
         dataset = Dataset.objects.get(id=dataset_id, user=request.user)
         summary = get_dataset_summary(dataset)
@@ -132,25 +358,24 @@ def get_dataset_detail(request, dataset_id):
 @permission_classes([IsAuthenticated])
 def delete_dataset(request, dataset_id):
     """Delete a dataset"""
-    try:
-        dataset = Dataset.objects.get(id=dataset_id, user=request.user)
-        dataset.file.delete()
-        dataset.delete()
-        return Response(
-            {'message': 'Dataset deleted successfully'},
-            status=status.HTTP_204_NO_CONTENT
-        )
-    except Dataset.DoesNotExist:
+    if not delete_datasets(Dataset.objects.filter(id=dataset_id, user=request.user)):
         return Response(
             {'error': 'Dataset not found'},
             status=status.HTTP_404_NOT_FOUND
         )
+    return Response(
+        {'message': 'Dataset deleted successfully'},
+        status=status.HTTP_204_NO_CONTENT
+    )
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def generate_report(request, dataset_id):
     """Generate PDF report for a dataset"""
+    from .pdf_generator import generate_pdf_report
+    
     try:
         dataset = Dataset.objects.get(id=dataset_id, user=request.user)
         pdf_buffer = generate_pdf_report(dataset)
@@ -167,24 +392,265 @@ def generate_report(request, dataset_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+def export_column(request, dataset_id, parameter):
+    """Stream one parameter as raw little-endian float64 values in row order"""
+    from .export import column_blocks
+    
+    try:
+        dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+    except Dataset.DoesNotExist:
+        return Response(
+            {'error': 'Dataset not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    parameters = dataset.parameter_labels()
+    if parameter not in parameters:
+        return Response(
+            {'error': f"parameter must be one of: {', '.join(parameters)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    response = StreamingHttpResponse(
+        column_blocks(dataset, parameter), content_type='application/octet-stream'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{dataset.filename}_{parameter}.f8"'
+    response['X-Row-Count'] = dataset.total_count
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_dataset(request, dataset_id):
+    """Stream a dataset as CSV, gzip-compressed CSV or Parquet"""
+    from .export import EXPORT_FORMATS, export_filename, export_stream, parse_export_options
+    
+    try:
+        dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+    except Dataset.DoesNotExist:
+        return Response(
+            {'error': 'Dataset not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    try:
+        export_format, fields, types = parse_export_options(request.query_params)
+    except ValueError as e:
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    response = StreamingHttpResponse(
+        export_stream(dataset, export_format, fields, types),
+        content_type=EXPORT_FORMATS[export_format][0]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(dataset, export_format)}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_dataset_series(request, dataset_id):
+    """Get a downsampled series or histogram of one parameter for charting"""
+    from .series import MAX_SERIES_POINTS, SERIES_METHODS, get_series
+    
+    try:
+        dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+    except Dataset.DoesNotExist:
+        return Response(
+            {'error': 'Dataset not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    parameter = request.query_params.get('parameter', 'flowrate')
+    method = request.query_params.get('method', 'lttb')
+    equipment_type = request.query_params.get('type') or None
+    
+    parameters = dataset.parameter_labels()
+    if parameter not in parameters:
+        return Response(
+            {'error': f"parameter must be one of: {', '.join(parameters)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if method not in SERIES_METHODS:
+        return Response(
+            {'error': f"method must be one of: {', '.join(SERIES_METHODS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        points = int(request.query_params.get('points', 1000))
+    except ValueError:
+        points = 0
+    if not 3 <= points <= MAX_SERIES_POINTS:
+        return Response(
+            {'error': f'points must be an integer between 3 and {MAX_SERIES_POINTS}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response(get_series(dataset, parameter, method, points, equipment_type))
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def dataset_anomalies(request, dataset_id):
+    """List a dataset's flagged readings, worst first, or re-run detection"""
+    from .anomalies import ANOMALY_RULES, detect_anomalies
+    from .columnar import PARAMETER_COLUMNS
+    
+    try:
+        dataset = Dataset.objects.get(id=dataset_id, user=request.user)
+    except Dataset.DoesNotExist:
+        return Response(
+            {'error': 'Dataset not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    if request.method == 'POST':
+        with transaction.atomic():
+            count = detect_anomalies(dataset)
+        return Response({'anomalies': count})
+    
+    anomalies = dataset.anomalies.select_related('equipment__equipment_type')
+    filters = {
+        'parameter': PARAMETER_COLUMNS.values(),
+        'rule': ANOMALY_RULES,
+        'direction': ['high', 'low'],
+    }
+    for field, choices in filters.items():
+        value = request.query_params.get(field)
+        if value is None:
+            continue
+        if value not in choices:
+            return Response(
+                {'error': f"{field} must be one of: {', '.join(choices)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        anomalies = anomalies.filter(**{field: value})
+    equipment_type = request.query_params.get('type')
+    if equipment_type:
+        anomalies = anomalies.filter(equipment__equipment_type__name=equipment_type)
+    
+    try:
+        limit = int(request.query_params.get('limit', 100))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_ANOMALY_RESULTS:
+        return Response(
+            {'error': f'limit must be an integer between 1 and {MAX_ANOMALY_RESULTS}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response({
+        'count': anomalies.count(),
+        'results': AnomalySerializer(anomalies[:limit], many=True).data
+    })
+
+
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+def parameter_thresholds(request):
+    """Get or replace the user's operating limits used by anomaly detection"""
+    if request.method == 'PUT':
+        serializer = ParameterThresholdSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        parameters = [item['parameter'] for item in serializer.validated_data]
+        if len(parameters) != len(set(parameters)):
+            return Response(
+                {'error': 'Each parameter can only be listed once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        with transaction.atomic():
+            ParameterThreshold.objects.filter(user=request.user).delete()
+            serializer.save(user=request.user)
+    
+    thresholds = ParameterThreshold.objects.filter(user=request.user).order_by('parameter')
+    return Response(ParameterThresholdSerializer(thresholds, many=True).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def compare_dataset_list(request):
+    """Compare several datasets against the first one in a single request"""
+    from .compare import MAX_COMPARE_DATASETS, compare_datasets
+    
+    try:
+        dataset_ids = [int(i) for i in request.query_params.get('ids', '').split(',') if i.strip()]
+    except ValueError:
+        dataset_ids = []
+    dataset_ids = list(dict.fromkeys(dataset_ids))
+    if not 2 <= len(dataset_ids) <= MAX_COMPARE_DATASETS:
+        return Response(
+            {'error': f'ids must list between 2 and {MAX_COMPARE_DATASETS} dataset ids'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    datasets = Dataset.objects.filter(user=request.user).in_bulk(dataset_ids)
+    if len(datasets) != len(dataset_ids):
+        return Response(
+            {'error': 'Dataset not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    return Response(compare_datasets([datasets[pk] for pk in dataset_ids]))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@replica_reads
 def get_history(request):
     """Get upload history (last 5 datasets)"""
-    datasets = Dataset.objects.filter(user=request.user)[:5]
+    datasets = with_equipment(Dataset.objects.filter(user=request.user))[:5]
     serializer = DatasetSerializer(datasets, many=True)
     return Response(serializer.data)
 
 
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+def retention_policy(request):
+    """Get or update how much upload history the user keeps"""
+    policy = get_policy(request.user)
+    
+    if request.method == 'PUT':
+        serializer = RetentionPolicySerializer(policy, data=request.data, partial=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        policy = serializer.save()
+        prune_datasets(request.user)
+    
+    return Response(RetentionPolicySerializer(policy).data)
+
+
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+def column_mapping(request):
+    """Get or replace how the columns of the user's CSV files are read"""
+    mapping = ColumnMapping.objects.filter(user=request.user).first() or ColumnMapping(user=request.user)
+    
+    if request.method == 'PUT':
+        serializer = ColumnMappingSerializer(mapping, data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        mapping = serializer.save()
+    
+    return Response(ColumnMappingSerializer(mapping).data)
+
+
 class DatasetViewSet(viewsets.ModelViewSet):
     """ViewSet for dataset CRUD operations"""
     serializer_class = DatasetSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Dataset.objects.filter(user=self.request.user)
+        return with_equipment(Dataset.objects.filter(user=self.request.user))
+    
+    def perform_destroy(self, instance):
+        delete_datasets(Dataset.objects.filter(pk=instance.pk))
     
     @action(detail=True, methods=['get'])
     def summary(self, request, pk=None):
         """Get dataset summary"""
+        from .utils import get_dataset_summary
+        
         dataset = self.get_object()
         summary = get_dataset_summary(dataset)
         return Response(summary)
@@ -192,6 +658,8 @@ class DatasetViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def report(self, request, pk=None):
         """Generate PDF report"""
+        from .pdf_generator import generate_pdf_report
+        
         dataset = self.get_object()
         pdf_buffer = generate_pdf_report(dataset)
         
@@ -0,0 +1,11 @@
+"""
+Standalone performance benchmarks for the ChemParaViz backend.
+
+Run them from the ``backend`` directory, e.g.::
+
+    python -m benchmarks.bench_ingest --rows 500000
+
+``benchmarks.suite`` runs the core operations over several dataset sizes
+and keeps the results as JSON for comparing versions; datasets come from
+the seeded generator in ``benchmarks.generate``.
+"""
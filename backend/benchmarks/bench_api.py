@@ -0,0 +1,319 @@
+"""
+Load test the API with virtual dashboard users running a weighted mix of calls.
+
+    python -m benchmarks.bench_api --server gunicorn --workers 4 --users 32 --duration 60
+    python -m benchmarks.bench_api --url http://127.0.0.1:8000 --mix read --users 16
+
+Each virtual user registers its own account, uploads a generated dataset
+and then picks calls from the mix (login, history, list, detail, series,
+anomalies, report, upload, ...) until ``--duration`` runs out, optionally
+pausing ``--think`` milliseconds between calls. Throughput and p50/p95/p99
+latency are reported per endpoint, so worker counts can be sized from the
+point where latency starts climbing.
+
+Without ``--url`` the harness starts ``runserver``, gunicorn or gunicorn
+with uvicorn workers itself against a throwaway SQLite database, or a
+``test_`` database on the PostgreSQL server given by ``--database-url``;
+``--db-pool`` then picks how that server manages its connections (see
+``DB_POOL`` in settings.py) and the pool's wait times, as reported on
+``/metrics`` by one of its workers, are printed after the run. With
+``--url`` any running deployment is used; only the API is touched.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from .common import setup_django, server_database_url, write_equipment_csv
+from .http_load import gunicorn_command, runserver_command, start_server, stop_server, summarize
+
+# Action -> (method, route) as reported in the results
+ACTIONS = {
+    'login': ('POST', '/api/auth/login/'),
+    'history': ('GET', '/api/history/'),
+    'list': ('GET', '/api/datasets-list/'),
+    'detail': ('GET', '/api/dataset/<id>/'),
+    'series': ('GET', '/api/dataset/<id>/series/'),
+    'anomalies': ('GET', '/api/dataset/<id>/anomalies/'),
+    'compare': ('GET', '/api/compare/'),
+    'export': ('GET', '/api/dataset/<id>/export/'),
+    'report': ('GET', '/api/dataset/<id>/report/'),
+    'upload': ('POST', '/api/upload/'),
+}
+
+# Relative weight of every action per mix; ``dashboard`` approximates the
+# web app: mostly reads of the current dataset, an occasional upload,
+# report download or fresh login
+MIXES = {
+    'dashboard': {
+        'login': 2, 'history': 15, 'list': 5, 'detail': 30, 'series': 20,
+        'anomalies': 10, 'compare': 3, 'export': 2, 'report': 5, 'upload': 3,
+    },
+    'read': {'history': 25, 'list': 10, 'detail': 40, 'series': 25},
+    'upload': {'upload': 60, 'detail': 20, 'history': 20},
+    'report': {'report': 50, 'detail': 25, 'history': 25},
+}
+
+# Datasets a user keeps referring to; stays within the default retention
+RECENT_DATASETS = 3
+
+SERVERS = {
+    'runserver': lambda port, workers, threads: runserver_command(port),
+    'gunicorn': lambda port, workers, threads: gunicorn_command(
+        'chemparaviz.wsgi:application', port, workers, '--timeout', '300',
+        *(['--threads', str(threads)] if threads > 1 else [])
+    ),
+    'uvicorn': lambda port, workers, threads: gunicorn_command(
+        'chemparaviz.asgi:application', port, workers, '--timeout', '300',
+        '--worker-class', 'uvicorn.workers.UvicornWorker'
+    ),
+}
+
+
+def endpoint(action):
+    method, route = ACTIONS[action]
+    return f'{method} {route}'
+
+
+class VirtualUser:
+    """One dashboard user with its own account, session and datasets"""
+
+    def __init__(self, base_url, username, csv_data, seed, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = uuid.uuid4().hex
+        self.csv_data = csv_data
+        self.rng = np.random.default_rng(seed)
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.datasets = []
+
+    def setup(self):
+        """
+        Register and upload two datasets (compare needs two); not part of
+        the measurement
+        """
+        response = self.session.post(
+            f'{self.base_url}/api/auth/register/',
+            json={'username': self.username, 'password': self.password},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        self.use_token(response.json()['token'])
+        for _ in range(2):
+            if not self.upload().ok:
+                raise RuntimeError(f'initial upload failed for {self.username}')
+
+    def use_token(self, token):
+        self.session.headers['Authorization'] = f'Token {token}'
+
+    def dataset_id(self):
+        return self.datasets[self.rng.integers(len(self.datasets))]
+
+    def upload(self):
+        response = self.session.post(
+            f'{self.base_url}/api/upload/',
+            files={'file': ('load.csv', self.csv_data, 'text/csv')},
+            timeout=self.timeout
+        )
+        if response.ok:
+            self.datasets = (self.datasets + [response.json()['id']])[-RECENT_DATASETS:]
+        return response
+
+    def perform(self, action):
+        url = self.base_url
+        if action == 'login':
+            response = self.session.post(
+                f'{url}/api/auth/login/',
+                json={'username': self.username, 'password': self.password},
+                timeout=self.timeout
+            )
+            if response.ok:
+                self.use_token(response.json()['token'])
+            return response
+        if action == 'upload':
+            return self.upload()
+        if action == 'history':
+            return self.session.get(f'{url}/api/history/', timeout=self.timeout)
+        if action == 'list':
+            return self.session.get(f'{url}/api/datasets-list/', timeout=self.timeout)
+        if action == 'compare':
+            ids = ','.join(str(pk) for pk in self.datasets)
+            return self.session.get(f'{url}/api/compare/', params={'ids': ids}, timeout=self.timeout)
+
+        dataset_url = f'{url}/api/dataset/{self.dataset_id()}/'
+        if action == 'detail':
+            return self.session.get(dataset_url, timeout=self.timeout)
+        if action == 'series':
+            return self.session.get(f'{dataset_url}series/', params={'points': 500}, timeout=self.timeout)
+        if action == 'anomalies':
+            return self.session.get(f'{dataset_url}anomalies/', params={'limit': 50}, timeout=self.timeout)
+        if action == 'export':
+            return self.session.get(f'{dataset_url}export/', timeout=self.timeout)
+        if action == 'report':
+            return self.session.get(f'{dataset_url}report/', timeout=self.timeout)
+        raise ValueError(f'Unknown action: {action}')
+
+
+def run_mix(base_url, mix, users, duration, think, upload_rows, seed, timeout=300):
+    """
+    Run ``users`` virtual users against ``base_url`` for ``duration``
+    seconds and summarize latencies per endpoint, plus an ``all`` total
+    """
+    weights = MIXES[mix]
+    actions = list(weights)
+    probabilities = np.array([weights[action] for action in actions], dtype=float)
+    probabilities /= probabilities.sum()
+
+    handle, csv_path = tempfile.mkstemp(suffix='.csv')
+    os.close(handle)
+    write_equipment_csv(csv_path, upload_rows, seed)
+    with open(csv_path, 'rb') as f:
+        csv_data = f.read()
+    os.remove(csv_path)
+
+    run_id = uuid.uuid4().hex[:8]
+    clients = [
+        VirtualUser(base_url, f'load-{run_id}-{index}', csv_data, seed + index, timeout)
+        for index in range(users)
+    ]
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(VirtualUser.setup, clients))
+
+    labels = [endpoint(action) for action in actions]
+    latencies = {label: [] for label in labels + ['all']}
+    errors = {label: 0 for label in labels + ['all']}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def drive(client):
+        while time.monotonic() < deadline:
+            action = actions[client.rng.choice(len(actions), p=probabilities)]
+            start = time.perf_counter()
+            try:
+                ok = client.perform(action).ok
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                for label in (endpoint(action), 'all'):
+                    if ok:
+                        latencies[label].append(elapsed)
+                    else:
+                        errors[label] += 1
+            if think:
+                time.sleep(think / 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(drive, clients))
+    seconds = time.perf_counter() - start
+
+    for client in clients:
+        client.session.close()
+    return summarize(latencies, errors, seconds)
+
+
+def print_results(results):
+    print(f'  {"endpoint":<36} {"requests":>8} {"errors":>6} {"req/s":>8} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}')
+    for label, stats in results.items():
+        if not stats['requests'] and not stats['errors']:
+            continue
+        print(
+            f'  {label:<36} {stats["requests"]:8} {stats["errors"]:6} {stats["rps"]:8.1f}'
+            f' {stats["p50"]:9.1f} {stats["p95"]:9.1f} {stats["p99"]:9.1f}'
+        )
+
+
+def pool_stats(url):
+    """
+    ``{'waits', 'wait_seconds', 'timeouts'}`` of the database connection
+    pool of whichever worker answers ``url``/metrics
+    """
+    stats = {'waits': 0, 'wait_seconds': 0.0, 'timeouts': 0}
+    keys = {
+        'chemparaviz_db_pool_wait_seconds_count': 'waits',
+        'chemparaviz_db_pool_wait_seconds_sum': 'wait_seconds',
+        'chemparaviz_db_pool_timeouts_total': 'timeouts',
+    }
+    for line in requests.get(f'{url}/metrics', timeout=30).text.splitlines():
+        name, _, value = line.partition('{')
+        if name in keys:
+            stats[keys[name]] += type(stats[keys[name]])(float(value.rsplit(' ', 1)[1]))
+    return stats
+
+
+def run(
+    url, server, workers, threads, port, database_url, db_pool, db_pool_size,
+    mix, users, duration, think, upload_rows, seed, output
+):
+    process = None
+    if url is None:
+        setup_django(database_url=database_url)
+        env = {
+            'DATABASE_URL': server_database_url(),
+            'DEBUG': 'False',
+            'ASYNC_VIEWS': 'True' if server == 'uvicorn' else 'False',
+            'DB_POOL': db_pool,
+            'DB_POOL_MAX_SIZE': str(db_pool_size),
+        }
+        process = start_server(SERVERS[server](port, workers, threads), port, env=env)
+        url = f'http://127.0.0.1:{port}'
+
+    try:
+        print(f'{url}: mix {mix}, {users} users, {duration}s, think {think}ms, uploads of {upload_rows} rows')
+        results = run_mix(url, mix, users, duration, think, upload_rows, seed)
+        pool = pool_stats(url) if process is not None and database_url and db_pool == 'builtin' else None
+    finally:
+        if process is not None:
+            stop_server(process)
+    print_results(results)
+    if pool:
+        mean_ms = pool['wait_seconds'] / max(pool['waits'], 1) * 1000
+        print(f"  pool of one worker: {pool['waits']} checkouts, mean wait {mean_ms:.2f}ms, {pool['timeouts']} timeouts")
+
+    if output:
+        meta = {
+            'url': url, 'server': server if process is not None else None,
+            'workers': workers, 'threads': threads, 'db_pool': db_pool, 'db_pool_size': db_pool_size,
+            'mix': mix, 'users': users,
+            'duration': duration, 'think_ms': think, 'upload_rows': upload_rows, 'seed': seed,
+        }
+        with open(output, 'w') as f:
+            json.dump({'meta': meta, 'results': results, 'pool': pool}, f, indent=2)
+        print(f'results written to {output}')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='running server to test instead of starting one')
+    parser.add_argument('--server', choices=SERVERS, default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker')
+    parser.add_argument('--port', type=int, default=8797)
+    parser.add_argument('--database-url', help='PostgreSQL server to run against instead of SQLite')
+    parser.add_argument('--db-pool', choices=['off', 'builtin', 'pgbouncer'], default='off', help='DB_POOL of the server')
+    parser.add_argument('--db-pool-size', type=int, default=4, help='DB_POOL_MAX_SIZE of the server')
+    parser.add_argument('--mix', choices=MIXES, default='dashboard')
+    parser.add_argument('--users', type=int, default=16, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load')
+    parser.add_argument('--think', type=float, default=0, help='pause between calls of one user, in ms')
+    parser.add_argument('--upload-rows', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+    run(
+        args.url, args.server, args.workers, args.threads, args.port, args.database_url, args.db_pool,
+        args.db_pool_size, args.mix, args.users, args.duration, args.think, args.upload_rows, args.seed,
+        args.output
+    )
+
+
+if __name__ == '__main__':
+    main()
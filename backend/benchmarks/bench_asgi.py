@@ -0,0 +1,97 @@
+"""
+Load test the sync (WSGI) and async (ASGI) deployments with equal worker counts.
+
+    python -m benchmarks.bench_asgi --rows 5000 --workers 2 --concurrency 32
+
+Both deployments run under gunicorn against the same throwaway database:
+sync workers serving the DRF views, and uvicorn workers serving the async
+views of history, dataset detail, report download and column export. The
+``mixed`` scenario sends report downloads and history requests at the same
+time, which is where a blocked sync worker hurts the fast endpoint.
+"""
+import argparse
+import os
+from .common import benchmark_user, server_database_url, setup_django, write_equipment_csv
+from .http_load import (
+    MemorySampler, gunicorn_command, run_load, start_server, stop_server
+)
+
+DEPLOYMENTS = {
+    'wsgi': ('chemparaviz.wsgi:application', ['--timeout', '300'], 'False'),
+    'asgi': (
+        'chemparaviz.asgi:application',
+        ['--timeout', '300', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+        'True'
+    ),
+}
+
+
+def scenarios(dataset_id):
+    return {
+        'history': ['/api/history/'],
+        'detail': [f'/api/dataset/{dataset_id}/'],
+        'report': [f'/api/dataset/{dataset_id}/report/'],
+        'column': [f'/api/dataset/{dataset_id}/columns/flowrate/'],
+        'mixed': [f'/api/dataset/{dataset_id}/report/', '/api/history/'],
+    }
+
+
+def run(rows, workers, concurrency, requests_per_client, port):
+    workdir = setup_django()
+
+    from django.core.files import File
+    from rest_framework.authtoken.models import Token
+    from api.utils import process_csv
+
+    user = benchmark_user()
+    token, _ = Token.objects.get_or_create(user=user)
+    path = write_equipment_csv(os.path.join(workdir, 'bench.csv'), rows)
+    with open(path, 'rb') as f:
+        dataset = process_csv(File(f, name='bench.csv'), user)
+
+    env = {
+        'DATABASE_URL': server_database_url(),
+        'DEBUG': 'False',
+        'COLUMNAR_STORAGE': 'False',
+    }
+    headers = {'Authorization': f'Token {token.key}'}
+
+    print(f'rows: {rows}, workers: {workers}, concurrency: {concurrency}')
+    for deployment, (app, options, async_views) in DEPLOYMENTS.items():
+        server = start_server(
+            gunicorn_command(app, port, workers, *options),
+            port,
+            env={**env, 'ASYNC_VIEWS': async_views}
+        )
+        try:
+            print(f'{deployment}:')
+            for name, paths in scenarios(dataset.pk).items():
+                urls = [f'http://127.0.0.1:{port}{path}' for path in paths]
+                with MemorySampler(server.pid) as memory:
+                    results = run_load(urls, headers, concurrency, requests_per_client)
+                for path, url in zip(paths, urls):
+                    stats = results[url]
+                    label = name if len(paths) == 1 else f'{name} {path.split("/")[-2]}'
+                    print(
+                        f'  {label:<16} {stats["rps"]:8.1f} req/s'
+                        f'  p50 {stats["p50"]:8.1f}ms  p99 {stats["p99"]:8.1f}ms'
+                        f'  errors {stats["errors"]}'
+                        f'  peak rss {memory.peak / 2 ** 20:6.0f} MB'
+                    )
+        finally:
+            stop_server(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=10, help='requests per client')
+    parser.add_argument('--port', type=int, default=8799)
+    args = parser.parse_args()
+    run(args.rows, args.workers, args.concurrency, args.requests, args.port)
+
+
+if __name__ == '__main__':
+    main()
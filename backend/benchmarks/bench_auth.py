@@ -0,0 +1,61 @@
+"""
+Compare database queries and time per request of TokenAuthentication and the cached variant.
+
+    python -m benchmarks.bench_auth --requests 2000
+
+Both classes authenticate the same token-bearing request repeatedly, the
+way a polling dashboard does; the last line shows a full API request with
+the configured authentication for scale.
+"""
+import argparse
+from .common import benchmark_user, setup_django, timed
+
+
+def run(requests):
+    setup_django()
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIClient, APIRequestFactory
+    from api.authentication import CachedTokenAuthentication
+
+    token, _ = Token.objects.get_or_create(user=benchmark_user())
+    request = APIRequestFactory().get('/api/thresholds/', HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    print(f'requests: {requests}')
+    for authentication in (TokenAuthentication(), CachedTokenAuthentication()):
+        def authenticate_all():
+            for _ in range(requests):
+                authentication.authenticate(request)
+
+        with CaptureQueriesContext(connection) as queries:
+            _, seconds = timed(authenticate_all)
+        print(
+            f'  {type(authentication).__name__:<26}'
+            f' {len(queries) / requests:5.2f} queries/request'
+            f' {seconds / requests * 1e6:8.1f} us/request'
+        )
+
+    client = APIClient(SERVER_NAME='localhost')
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    client.get('/api/thresholds/')
+    with CaptureQueriesContext(connection) as queries:
+        _, seconds = timed(lambda: [client.get('/api/thresholds/') for _ in range(requests)])
+    print(
+        f'  {"GET /api/thresholds/":<26}'
+        f' {len(queries) / requests:5.2f} queries/request'
+        f' {seconds / requests * 1e6:8.1f} us/request'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    run(args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Compare dataset scans through Equipment rows and through column files.
+
+    python -m benchmarks.bench_columnar --rows 1000000
+"""
+import argparse
+import os
+from .common import benchmark_user, setup_django, timed, write_equipment_csv
+
+
+def run(rows):
+    workdir = setup_django()
+
+    from django.conf import settings
+    from django.core.files import File
+    from api import columnar
+    from api.utils import load_dataset, parameter_statistics, iter_equipment_rows
+    from api.parsing import iter_column_chunks
+
+    settings.COLUMNAR_STORAGE = True
+    path = write_equipment_csv(os.path.join(workdir, 'bench.csv'), rows)
+    with open(path, 'rb') as f:
+        dataset = load_dataset(benchmark_user(), File(f, name='bench.csv'), iter_column_chunks(f))
+
+    def scan():
+        parameter_statistics(dataset)
+        for _ in iter_equipment_rows(dataset):
+            pass
+
+    _, columnar_seconds = timed(scan)
+    columnar.delete_columns([dataset.pk])
+    _, orm_seconds = timed(scan)
+
+    print(f'rows: {rows}, statistics + full row scan')
+    print(f'  equipment rows {orm_seconds:8.3f}s')
+    print(f'  column files   {columnar_seconds:8.3f}s')
+    print(f'  speedup        {orm_seconds / columnar_seconds:8.2f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+    run(args.rows)
+
+
+if __name__ == '__main__':
+    main()
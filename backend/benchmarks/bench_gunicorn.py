@@ -0,0 +1,104 @@
+"""
+Compare gunicorn.conf.py profiles: worker class and preloading under the same load.
+
+    python -m benchmarks.bench_gunicorn --workers 4 --users 32 --duration 30
+
+Each profile starts gunicorn with ``gunicorn.conf.py`` and its environment
+overrides against the same throwaway database, then runs the
+``bench_api`` mix. Reported per profile: seconds until the server answers,
+proportional memory (PSS) of the whole process tree once idle and at its
+peak under load, which is where preloading shows, and overall throughput
+and latency percentiles.
+"""
+import argparse
+import json
+import sys
+from .bench_api import MIXES, run_mix
+from .common import setup_django, server_database_url, timed
+from .http_load import MemorySampler, process_tree_pss, start_server, stop_server
+
+# Profile -> environment overrides of gunicorn.conf.py
+PROFILES = {
+    'sync': {'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_PRELOAD': 'False'},
+    'sync-preload': {'GUNICORN_WORKER_CLASS': 'sync', 'GUNICORN_PRELOAD': 'True'},
+    'gthread-preload': {'GUNICORN_WORKER_CLASS': 'gthread', 'GUNICORN_PRELOAD': 'True'},
+    'uvicorn-preload': {'GUNICORN_WORKER_CLASS': 'uvicorn', 'GUNICORN_PRELOAD': 'True'},
+}
+
+
+def config_command(port):
+    """gunicorn with the shipped configuration, bound to localhost only"""
+    return [
+        sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+        '--bind', f'127.0.0.1:{port}',
+    ]
+
+
+def run(profiles, workers, threads, users, duration, mix, upload_rows, port, database_url, output):
+    setup_django(database_url=database_url)
+    env = {
+        'DATABASE_URL': server_database_url(),
+        'DEBUG': 'False',
+        'WEB_CONCURRENCY': str(workers),
+        'GUNICORN_THREADS': str(threads),
+        'GUNICORN_TIMEOUT': '300',
+    }
+
+    print(f'workers: {workers}, threads: {threads}, users: {users}, mix: {mix}, {duration}s')
+    results = {}
+    for name in profiles:
+        server, boot_seconds = timed(start_server, config_command(port), port, env={**env, **PROFILES[name]})
+        try:
+            # Django loads the URLconf on a worker's first request
+            run_mix(f'http://127.0.0.1:{port}', 'read', workers, 1, 0, upload_rows, 0)
+            idle = process_tree_pss(server.pid)
+            with MemorySampler(server.pid, measure=process_tree_pss) as memory:
+                stats = run_mix(f'http://127.0.0.1:{port}', mix, users, duration, 0, upload_rows, 0)['all']
+        finally:
+            stop_server(server)
+
+        results[name] = {
+            'boot_seconds': boot_seconds,
+            'idle_pss_mb': idle / 2 ** 20,
+            'peak_pss_mb': memory.peak / 2 ** 20,
+            **stats,
+        }
+        print(
+            f'  {name:<16} boot {boot_seconds:5.1f}s'
+            f'  pss idle {idle / 2 ** 20:6.0f} MB peak {memory.peak / 2 ** 20:6.0f} MB'
+            f'  {stats["rps"]:7.1f} req/s  p50 {stats["p50"]:7.1f}ms'
+            f'  p95 {stats["p95"]:7.1f}ms  p99 {stats["p99"]:7.1f}ms  errors {stats["errors"]}'
+        )
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'results written to {output}')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profiles', default=','.join(PROFILES), help='comma separated subset of profiles')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='threads per gthread worker')
+    parser.add_argument('--users', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--mix', choices=MIXES, default='dashboard')
+    parser.add_argument('--upload-rows', type=int, default=1000)
+    parser.add_argument('--port', type=int, default=8798)
+    parser.add_argument('--database-url', help='PostgreSQL server to run against instead of SQLite')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+    profiles = [name.strip() for name in args.profiles.split(',') if name.strip()]
+    unknown = [name for name in profiles if name not in PROFILES]
+    if unknown:
+        parser.error(f"unknown profiles: {', '.join(unknown)}")
+    run(
+        profiles, args.workers, args.threads, args.users, args.duration, args.mix,
+        args.upload_rows, args.port, args.database_url, args.output
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Compare the sequential and pipelined ingest paths on a generated CSV.
+
+    python -m benchmarks.bench_ingest --rows 1000000 --repeat 3
+"""
+import argparse
+import os
+from .common import benchmark_user, setup_django, timed, write_equipment_csv
+
+
+def run(rows, repeat):
+    workdir = setup_django()
+
+    from api.models import Dataset
+    from api.pipeline import ingest_pipelined, ingest_sequential
+    from api.parsing import CSV_CHUNK_ROWS, iter_column_chunks
+
+    path = write_equipment_csv(os.path.join(workdir, 'bench.csv'), rows)
+    user = benchmark_user()
+
+    results = {'sequential': [], 'pipelined': []}
+    for _ in range(repeat):
+        for name, ingest in (('sequential', ingest_sequential), ('pipelined', ingest_pipelined)):
+            dataset = Dataset.objects.create(user=user, filename='bench.csv')
+            with open(path, 'rb') as f:
+                _, seconds = timed(ingest, iter_column_chunks(f), dataset)
+            results[name].append(seconds)
+
+    best = {name: min(times) for name, times in results.items()}
+    print(f'rows: {rows}, chunk rows: {CSV_CHUNK_ROWS}, best of {repeat}')
+    for name, seconds in best.items():
+        print(f'  {name:<10} {seconds:8.3f}s  {rows / seconds:12,.0f} rows/s')
+    print(f'  speedup    {best["sequential"] / best["pipelined"]:8.2f}x')
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Fail when importing the api app exceeds its time budget or loads heavy modules.
+
+    python -m benchmarks.check_imports --budget-ms 1000 --repeat 5
+
+A fresh interpreter run with ``-X importtime`` imports Django, sets it up
+and imports the URLconf with every view module, which is what a worker
+does before its first request. That wall time is measured in the child
+(the fastest of ``--repeat`` runs counts) and compared with the budget;
+the ``-X importtime`` report names the slowest top-level imports. The
+check also fails if any of ``HEAVY_MODULES`` got imported; those belong
+on the code paths that need them. Exit status 1 on failure, so it can
+gate CI.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from .common import BACKEND_DIR
+
+# Milliseconds allowed from ``import django`` to a loaded URLconf. The app
+# measures about 480 ms here but the best of five runs has swung up to
+# 630 ms on a busy machine, so the budget leaves room for that jitter;
+# heavy imports are caught by HEAVY_MODULES whatever the timing
+IMPORT_BUDGET_MS = 1000
+
+# Must stay out of a worker's startup imports
+HEAVY_MODULES = ['numpy', 'pandas', 'reportlab', 'pyarrow']
+
+STARTUP = (
+    'import sys, time; start = time.perf_counter(); '
+    'import django; django.setup(); '
+    'import chemparaviz.urls, api.async_views; '
+    'print(time.perf_counter() - start); '
+    'print(" ".join(sys.modules))'
+)
+
+
+def parse_importtime(output):
+    """
+    Yield ``(depth, self_us, cumulative_us, module)`` for every line of
+    ``-X importtime`` output
+    """
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        yield depth, int(self_us), int(cumulative_us), name.strip()
+
+
+def measure_startup():
+    """
+    Return ``(startup_ms, top_imports, loaded_modules)`` of one cold import
+    of the app in a fresh interpreter; ``top_imports`` are the top-level
+    ``(module, ms)`` entries from ``import django`` on. Modules Django loads
+    through ``importlib`` (settings, models, apps) are not listed by
+    ``-X importtime``, but their time is part of ``startup_ms``.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP],
+        cwd=BACKEND_DIR,
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'chemparaviz.settings'},
+        capture_output=True, text=True, check=True
+    )
+    seconds, modules = result.stdout.splitlines()[-2:]
+    top_imports = []
+    for depth, _, cumulative_us, name in parse_importtime(result.stderr):
+        if name == 'django':
+            top_imports = []
+        if depth == 0:
+            top_imports.append((name, cumulative_us / 1000))
+    return float(seconds) * 1000, top_imports, set(modules.split())
+
+
+def run(budget_ms, repeat):
+    runs = [measure_startup() for _ in range(repeat)]
+    startup_ms, top_imports, loaded = min(runs, key=lambda run: run[0])
+
+    print(f'app import: {startup_ms:.0f} ms (best of {repeat}, budget {budget_ms:.0f} ms)')
+    for name, ms in sorted(top_imports, key=lambda item: -item[1])[:10]:
+        print(f'  {name:<32} {ms:8.1f} ms')
+
+    failed = False
+    heavy = [module for module in HEAVY_MODULES if module in loaded]
+    if heavy:
+        print(f"FAIL: startup imports heavy modules: {', '.join(heavy)}")
+        failed = True
+    if startup_ms > budget_ms:
+        print(f'FAIL: {startup_ms:.0f} ms is over the {budget_ms:.0f} ms budget')
+        failed = True
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    sys.exit(run(args.budget_ms, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
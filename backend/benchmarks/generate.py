@@ -0,0 +1,28 @@
+"""
+Write a reproducible synthetic equipment CSV.
+
+    python -m benchmarks.generate equipment_1m.csv --rows 1000000 --seed 42
+
+The same rows and seed always produce the same file, so datasets of any
+size (1k to 10M rows and beyond) can be recreated instead of shared.
+"""
+import argparse
+from .common import timed, write_equipment_csv
+
+
+def run(path, rows, seed):
+    _, seconds = timed(write_equipment_csv, path, rows, seed)
+    print(f'{path}: {rows:,} rows (seed {seed}) in {seconds:.1f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run(args.path, args.rows, args.seed)
+
+
+if __name__ == '__main__':
+    main()
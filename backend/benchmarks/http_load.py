@@ -0,0 +1,194 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+
+from .common import BACKEND_DIR
+
+
+def run_load(urls, headers=None, concurrency=16, requests_per_client=10, timeout=300):
+    """
+    Send ``requests_per_client`` GET requests from each of ``concurrency``
+    concurrent clients, cycling through ``urls``, and summarize the latencies
+    of every url.
+
+    Each client keeps one HTTP connection open, like a browser tab would.
+    Returns ``{url: {'requests', 'errors', 'rps', 'p50', 'p95', 'p99'}}``
+    with latencies in milliseconds; ``rps`` is over the whole run.
+    """
+    if isinstance(urls, str):
+        urls = [urls]
+    latencies = {url: [] for url in urls}
+    errors = {url: 0 for url in urls}
+    lock = threading.Lock()
+
+    def client(index):
+        with requests.Session() as session:
+            for i in range(requests_per_client):
+                url = urls[(index + i) % len(urls)]
+                start = time.perf_counter()
+                try:
+                    response = session.get(url, headers=headers, timeout=timeout)
+                    ok = response.status_code < 400
+                except requests.RequestException:
+                    ok = False
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    if ok:
+                        latencies[url].append(elapsed)
+                    else:
+                        errors[url] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    seconds = time.perf_counter() - start
+
+    return summarize(latencies, errors, seconds)
+
+
+def summarize(latencies, errors, seconds):
+    """
+    Turn ``{key: [latency ms, ...]}`` and ``{key: error count}`` of a run
+    lasting ``seconds`` into ``{key: {'requests', 'errors', 'rps', 'p50',
+    'p95', 'p99'}}``
+    """
+    results = {}
+    for key, samples in latencies.items():
+        values = np.array(samples) if samples else np.array([np.nan])
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        results[key] = {
+            'requests': len(samples),
+            'errors': errors.get(key, 0),
+            'rps': len(samples) / seconds,
+            'p50': float(p50),
+            'p95': float(p95),
+            'p99': float(p99),
+        }
+    return results
+
+
+def process_tree(pid):
+    """Ids of a process and all of its descendants (Linux)"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces, so split after it
+                parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+
+    tree = {pid}
+    added = True
+    while added:
+        children = {child for child, parent in parents.items() if parent in tree} - tree
+        tree |= children
+        added = bool(children)
+    return tree
+
+
+def _sum_field(pids, filename, field):
+    total = 0
+    for member in pids:
+        try:
+            with open(f'/proc/{member}/{filename}') as f:
+                for line in f:
+                    if line.startswith(field):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of a process and all of its descendants (Linux)"""
+    return _sum_field(process_tree(pid), 'status', 'VmRSS:')
+
+
+def process_tree_pss(pid):
+    """
+    Proportional set size in bytes of a process tree (Linux): pages shared
+    between processes, e.g. copy-on-write after a preloading fork, are only
+    counted once in total, unlike with RSS
+    """
+    return _sum_field(process_tree(pid), 'smaps_rollup', 'Pss:')
+
+
+class MemorySampler:
+    """Track the peak memory of a process tree in the background"""
+
+    def __init__(self, pid, interval=0.2, measure=process_tree_rss):
+        self.pid = pid
+        self.interval = interval
+        self.measure = measure
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.measure(self.pid))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def start_server(args, port, env=None, ready_path='/api/', timeout=30):
+    """
+    Start a server process from the backend directory and wait until it
+    answers HTTP requests on ``port``
+    """
+    process = subprocess.Popen(
+        args,
+        cwd=BACKEND_DIR,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{args[0]} exited with code {process.returncode}')
+        try:
+            requests.get(f'http://127.0.0.1:{port}{ready_path}', timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{args[0]} did not start within {timeout}s')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def runserver_command(port):
+    """Command line for Django's development server, without the autoreloader"""
+    return [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']
+
+
+def gunicorn_command(app, port, workers, *extra):
+    """Command line for gunicorn from the current interpreter's environment"""
+    return [
+        sys.executable, '-m', 'gunicorn', app,
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers),
+        *extra,
+    ]
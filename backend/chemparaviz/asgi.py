@@ -3,6 +3,10 @@ ASGI config for chemparaviz project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it under gunicorn with uvicorn workers::
+
+    gunicorn chemparaviz.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -12,5 +16,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chemparaviz.settings')
+# Serve the read-heavy and streaming endpoints with their async views
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
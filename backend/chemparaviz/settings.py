@@ -14,6 +14,7 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Load environment variables
 load_dotenv()
@@ -50,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its wall time covers every other middleware
+    'api.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -59,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ReadYourWritesMiddleware',
 ]
 
 ROOT_URLCONF = 'chemparaviz.urls'
@@ -85,14 +89,50 @@ WSGI_APPLICATION = 'chemparaviz.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# How PostgreSQL connections are managed, chosen with DB_POOL (ignored for
+# other databases):
+#   off        every worker thread keeps its own connection open
+#   builtin    the threads of a worker process borrow connections from a
+#              pool (api/db_pool) of at most DB_POOL_MAX_SIZE for the length
+#              of a request, waiting up to DB_POOL_TIMEOUT seconds for a
+#              free one; connections idle for DB_POOL_MAX_IDLE seconds are
+#              closed. Keep WEB_CONCURRENCY * DB_POOL_MAX_SIZE below the
+#              database's connection limit.
+#   pgbouncer  DATABASE_URL points at PgBouncer in transaction pooling
+#              mode; server-side cursors, which need a session of their own,
+#              are disabled
+# Pool waits, timeouts and open connections are reported on /metrics.
+DB_POOL = os.environ.get('DB_POOL', 'off')
+if DB_POOL not in ('off', 'builtin', 'pgbouncer'):
+    raise ImproperlyConfigured('DB_POOL must be one of: off, builtin, pgbouncer')
+
+
+def database_from_url(url):
+    """Database settings for ``url`` with the connection handling of DB_POOL"""
+    database = dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True)
+    postgresql = database['ENGINE'] == 'django.db.backends.postgresql'
+    if DB_POOL == 'builtin' and postgresql:
+        database.update({
+            'ENGINE': 'api.db_pool',
+            # Hand the connection back to the pool after every request
+            'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': False,
+            'POOL': {
+                'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 4)),
+                'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+                'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                'MAX_IDLE': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+            },
+        })
+    elif DB_POOL == 'pgbouncer' and postgresql:
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return database
+
+
 # Use PostgreSQL in production (Render), SQLite for local development
 if os.environ.get('DATABASE_URL'):
     DATABASES = {
-        'default': dj_database_url.config(
-            default=os.environ.get('DATABASE_URL'),
-            conn_max_age=600,
-            conn_health_checks=True,
-        )
+        'default': database_from_url(os.environ['DATABASE_URL'])
     }
 else:
     DATABASES = {
@@ -102,6 +142,23 @@ else:
         }
     }
 
+# Optional read replica of the default database. The dashboard reads
+# (dataset list, history, dataset detail and report) run against it; all
+# other queries and every write use default. After a successful write
+# request (an upload, append, delete...) its user reads from default for
+# REPLICA_STICKY_SECONDS, so they see their own changes despite replication
+# lag. That pin lives in the default cache, so with several workers point
+# it at a shared backend; a 404 from the replica is retried on default
+# either way. Two SQLite files (one a copy of the other) are enough to try
+# it locally.
+if os.environ.get('REPLICA_DATABASE_URL'):
+    DATABASES['replica'] = {
+        **database_from_url(os.environ['REPLICA_DATABASE_URL']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 30))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -153,7 +210,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -161,6 +218,78 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Token lookups are cached per process for up to TIMEOUT seconds, which is
+# also the longest a token revoked in another worker can still be used.
+# Point 'tokens' at a shared backend (e.g. Redis) to make revocation global.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth-tokens',
+        'TIMEOUT': 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Store equipment measurements as 4-byte floats (PostgreSQL/MySQL only).
+# Takes effect for newly created tables; convert an existing PostgreSQL
+# database with: ALTER TABLE api_equipment ALTER COLUMN flowrate TYPE real,
+# ALTER COLUMN pressure TYPE real, ALTER COLUMN temperature TYPE real;
+EQUIPMENT_COMPACT_FLOATS = os.environ.get('EQUIPMENT_COMPACT_FLOATS', 'False') == 'True'
+
+# Also write each dataset as memory-mapped column files under
+# MEDIA_ROOT/columns/ so stats, exports and reports can scan it without
+# going through Equipment rows
+COLUMNAR_STORAGE = os.environ.get('COLUMNAR_STORAGE', 'False') == 'True'
+
+# Ingest uploads and appends through the threaded pipeline, which overlaps
+# parsing with inserts. Against the local SQLite database it measured no
+# faster than the sequential path (python -m benchmarks.bench_ingest), so
+# only enable it where the benchmark shows a gain, e.g. a network database
+INGEST_PIPELINED = os.environ.get('INGEST_PIPELINED', 'False') == 'True'
+
+# Default upload history kept per user; users can override it through
+# /api/retention/. A limit of None disables that rule.
+DATASET_RETENTION = {
+    'max_datasets': 5,
+    'max_age_days': None,
+    'max_total_rows': None,
+}
+
+# Resumable uploads not finalized within UPLOAD_SESSION_EXPIRY_HOURS of
+# being started are deleted, with their partial files, by
+# python manage.py prune_datasets
+UPLOAD_SESSION_EXPIRY_HOURS = int(os.environ.get('UPLOAD_SESSION_EXPIRY_HOURS', 24))
+
+# /api/datasets-changes/ reports deleted datasets for DATASET_TOMBSTONE_DAYS;
+# a client whose cursor is older is sent its whole list instead. Changes
+# from the last CHANGES_OVERLAP_SECONDS before a cursor are sent again, so
+# none are missed when an upload commits a while after saving its
+# statistics, or reaches the read replica late.
+DATASET_TOMBSTONE_DAYS = int(os.environ.get('DATASET_TOMBSTONE_DAYS', 7))
+CHANGES_OVERLAP_SECONDS = int(os.environ.get('CHANGES_OVERLAP_SECONDS', 60))
+
+# Route history, dataset detail, report and export requests to the
+# async views in api/async_views.py. Enabled by default by asgi.py; the
+# WSGI entry point keeps the sync DRF views.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False') == 'True'
+
+# Anomaly detection run on every ingest: readings more than ZSCORE_LIMIT
+# standard deviations from their equipment type's mean, or IQR_FACTOR IQRs
+# outside its quartiles, are flagged. Types with fewer than MIN_GROUP_SIZE
+# rows are only checked against the user's thresholds (/api/thresholds/).
+ANOMALY_DETECTION = {
+    'ZSCORE_LIMIT': 3.0,
+    'IQR_FACTOR': 1.5,
+    'MIN_GROUP_SIZE': 10,
+}
+
+# Clients allowed to scrape /metrics (per-endpoint timings, query counts,
+# response sizes and ingest/report stage spans in the Prometheus format)
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
 # CORS settings
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
 
@@ -184,4 +313,5 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-chunk-checksum',
 ]
@@ -0,0 +1,155 @@
+"""
+Gunicorn configuration for the ChemParaViz backend.
+
+Run from the ``backend`` directory (gunicorn also picks this file up on
+its own from there)::
+
+    gunicorn --config gunicorn.conf.py
+
+Every setting can be overridden through the environment:
+
+    WEB_CONCURRENCY               worker processes (default 2)
+    GUNICORN_WORKER_CLASS         sync (default), gthread or uvicorn; uvicorn
+                                  serves chemparaviz.asgi with the async views.
+                                  Threads pay off when requests mostly wait on
+                                  a remote database; on CPU-bound work sync
+                                  workers had the lower tail latency
+    GUNICORN_THREADS              threads per gthread worker (default 4)
+    GUNICORN_PRELOAD              import the app, pandas, numpy and ReportLab
+                                  once in the master so forked workers share
+                                  those pages copy-on-write (default True)
+    GUNICORN_MAX_REQUESTS         recycle a worker after this many requests,
+                                  plus up to GUNICORN_MAX_REQUESTS_JITTER
+                                  (default 1000 and 100; 0 disables)
+    GUNICORN_MAX_WORKER_MEMORY_MB recycle a worker once its private (not
+                                  shared) memory exceeds this many MB, checked every
+                                  GUNICORN_MEMORY_CHECK_INTERVAL seconds
+                                  (default 0, disabled, and 5)
+    GUNICORN_TIMEOUT              seconds before a silent worker is killed
+                                  (default 120; large PDF reports are slow)
+    PORT                          port to bind on all interfaces (default 8000)
+
+``python -m benchmarks.bench_gunicorn`` compares worker classes and
+preloading under load.
+"""
+import gc
+import os
+import signal
+import threading
+import time
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)) == 'True'
+
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'uvicorn': 'uvicorn.workers.UvicornWorker',
+}
+
+# Imported in the master when preloading, so they are shared with every
+# worker even where the app itself only imports them on first use. Django
+# loads the URLconf (and with it every view module) on the first request.
+PRELOAD_MODULES = [
+    'numpy', 'pandas', 'reportlab.platypus', 'reportlab.lib.styles', 'chemparaviz.urls',
+]
+
+_worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+if _worker_class not in WORKER_CLASSES:
+    raise ValueError(f"GUNICORN_WORKER_CLASS must be one of: {', '.join(WORKER_CLASSES)}")
+
+wsgi_app = 'chemparaviz.asgi:application' if _worker_class == 'uvicorn' else 'chemparaviz.wsgi:application'
+worker_class = WORKER_CLASSES[_worker_class]
+workers = _env_int('WEB_CONCURRENCY', 2)
+threads = _env_int('GUNICORN_THREADS', 4) if _worker_class == 'gthread' else 1
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+timeout = _env_int('GUNICORN_TIMEOUT', 120)
+graceful_timeout = 30
+keepalive = 5
+
+preload_app = _env_bool('GUNICORN_PRELOAD', True)
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+max_worker_memory_mb = _env_int('GUNICORN_MAX_WORKER_MEMORY_MB', 0)
+memory_check_interval = _env_int('GUNICORN_MEMORY_CHECK_INTERVAL', 5)
+
+# Heartbeat files on tmpfs, so a slow disk cannot make workers look stuck
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+errorlog = '-'
+
+
+def private_memory_mb():
+    """
+    Memory of this process in MB that is not shared with the master or other
+    workers (Linux), falling back to resident memory, or None
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            private_kb = sum(int(line.split()[1]) for line in f if line.startswith('Private_'))
+        return private_kb / 1024
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def on_starting(server):
+    # Runs after the preloaded app has set Django up
+    if preload_app:
+        import importlib
+        for module in PRELOAD_MODULES:
+            importlib.import_module(module)
+
+
+def pre_fork(server, worker):
+    # Move everything imported so far out of the garbage collector's reach;
+    # otherwise its first collections in a worker write to every shared
+    # object and copy those pages after all
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # The app was loaded in the master; make sure no database connection
+    # opened there is shared between workers
+    if preload_app:
+        from django.db import connections
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    if max_worker_memory_mb:
+        threading.Thread(
+            target=_watch_memory, args=(worker,), name='memory-watchdog', daemon=True
+        ).start()
+
+
+def _watch_memory(worker):
+    """
+    Ask the worker to shut down gracefully once it outgrows
+    ``max_worker_memory_mb``; the arbiter then forks a fresh one
+    """
+    while True:
+        time.sleep(memory_check_interval)
+        used = private_memory_mb()
+        if used is not None and used > max_worker_memory_mb:
+            worker.log.info(
+                'Worker %s uses %.0f MB of private memory (limit %s MB), recycling',
+                worker.pid, used, max_worker_memory_mb
+            )
+            os.kill(worker.pid, signal.SIGTERM)
+            return
@@ -1,5 +1,8 @@
 import sys
+import os
+import hashlib
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QLineEdit, QPushButton, QFileDialog, QTableWidget,
@@ -13,6 +16,12 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 import json
 
+# Files larger than this are sent through the chunked, resumable upload API
+RESUMABLE_UPLOAD_THRESHOLD = 16 * 1024 * 1024
+
+# How often the dashboard asks the backend for datasets changed elsewhere
+AUTO_REFRESH_INTERVAL_MS = 10000
+
 
 class APIClient:
     """Client for communicating with Django backend"""
@@ -21,6 +30,7 @@ class APIClient:
         self.base_url = "http://localhost:8000/api"
         self.token = None
         self.headers = {"Content-Type": "application/json"}
+        self.upload_state_path = os.path.join(os.path.expanduser("~"), ".chemparaviz_uploads.json")
     
     def set_token(self, token):
         self.token = token
@@ -32,6 +42,11 @@ class APIClient:
         response = requests.post(url, json=data)
         return response.json()
     
+    def logout(self):
+        url = f"{self.base_url}/auth/logout/"
+        response = requests.post(url, headers=self.headers)
+        return response.json()
+    
     def register(self, username, password, email=""):
         url = f"{self.base_url}/auth/register/"
         data = {"username": username, "password": password, "email": email}
@@ -46,16 +61,120 @@ class APIClient:
             response = requests.post(url, files=files, headers=headers)
         return response.json()
     
+    def append_dataset(self, dataset_id, file_path):
+        url = f"{self.base_url}/dataset/{dataset_id}/append/"
+        with open(file_path, 'rb') as f:
+            files = {'file': f}
+            headers = {"Authorization": f"Token {self.token}"}
+            response = requests.post(url, files=files, headers=headers)
+        return response.json()
+    
+    def upload_dataset_resumable(self, file_path, chunk_size=8 * 1024 * 1024, workers=4, retries=3):
+        """Upload a large CSV in parallel chunks, resuming an earlier attempt if possible"""
+        headers = {"Authorization": f"Token {self.token}"}
+        total_size = os.path.getsize(file_path)
+        state_key = f"{os.path.abspath(file_path)}:{total_size}:{os.path.getmtime(file_path)}"
+        state = self._load_upload_state()
+        
+        session = None
+        upload_id = state.get(state_key)
+        if upload_id:
+            response = requests.get(f"{self.base_url}/uploads/{upload_id}/", headers=headers)
+            if response.status_code == 200:
+                session = response.json()
+        
+        if session is None:
+            data = {
+                "filename": os.path.basename(file_path),
+                "total_size": total_size,
+                "chunk_size": chunk_size
+            }
+            response = requests.post(f"{self.base_url}/uploads/", json=data, headers=headers)
+            session = response.json()
+            if response.status_code != 201:
+                return session
+            state[state_key] = session['id']
+            self._save_upload_state(state)
+        
+        def send_chunk(offset):
+            with open(file_path, 'rb') as f:
+                f.seek(offset)
+                chunk = f.read(session['chunk_size'])
+            chunk_headers = dict(headers)
+            chunk_headers["Content-Type"] = "application/octet-stream"
+            chunk_headers["X-Chunk-Checksum"] = hashlib.sha256(chunk).hexdigest()
+            url = f"{self.base_url}/uploads/{session['id']}/chunks/{offset}/"
+            for attempt in range(retries):
+                try:
+                    response = requests.put(url, data=chunk, headers=chunk_headers)
+                    if response.status_code == 200:
+                        return
+                except requests.ConnectionError:
+                    if attempt == retries - 1:
+                        raise
+            response.raise_for_status()
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(send_chunk, session['missing_offsets']))
+        
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        
+        url = f"{self.base_url}/uploads/{session['id']}/finalize/"
+        response = requests.post(url, json={"checksum": digest.hexdigest()}, headers=headers)
+        if response.status_code == 201:
+            state.pop(state_key, None)
+            self._save_upload_state(state)
+        return response.json()
+    
+    def _load_upload_state(self):
+        try:
+            with open(self.upload_state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_upload_state(self, state):
+        with open(self.upload_state_path, 'w') as f:
+            json.dump(state, f)
+    
     def get_datasets(self):
         url = f"{self.base_url}/datasets-list/"
         response = requests.get(url, headers=self.headers)
         return response.json()
     
+    def get_dataset_changes(self, since=None):
+        url = f"{self.base_url}/datasets-changes/"
+        params = {"since": since} if since else {}
+        response = requests.get(url, headers=self.headers, params=params, timeout=30)
+        return response.json()
+    
     def get_dataset_detail(self, dataset_id):
         url = f"{self.base_url}/dataset/{dataset_id}/"
         response = requests.get(url, headers=self.headers)
         return response.json()
     
+    def get_dataset_series(self, dataset_id, parameter, points=500, method="lttb", equipment_type=None):
+        url = f"{self.base_url}/dataset/{dataset_id}/series/"
+        params = {"parameter": parameter, "points": points, "method": method}
+        if equipment_type:
+            params["type"] = equipment_type
+        response = requests.get(url, headers=self.headers, params=params)
+        return response.json()
+    
+    def get_anomalies(self, dataset_id, **filters):
+        url = f"{self.base_url}/dataset/{dataset_id}/anomalies/"
+        response = requests.get(url, headers=self.headers, params=filters)
+        return response.json()
+    
+    def compare_datasets(self, dataset_ids):
+        url = f"{self.base_url}/compare/"
+        params = {"ids": ",".join(str(i) for i in dataset_ids)}
+        response = requests.get(url, headers=self.headers, params=params)
+        return response.json()
+    
     def delete_dataset(self, dataset_id):
         url = f"{self.base_url}/dataset/{dataset_id}/delete/"
         response = requests.delete(url, headers=self.headers)
@@ -65,6 +184,21 @@ class APIClient:
         url = f"{self.base_url}/dataset/{dataset_id}/report/"
         response = requests.get(url, headers=self.headers)
         return response.content
+    
+    def export_dataset(self, dataset_id, file_path, file_format="csv", fields=None, types=None):
+        """Stream a dataset export to ``file_path`` without holding it in memory"""
+        url = f"{self.base_url}/dataset/{dataset_id}/export/"
+        params = {"file_format": file_format}
+        if fields:
+            params["fields"] = ",".join(fields)
+        if types:
+            params["type"] = ",".join(types)
+        with requests.get(url, headers=self.headers, params=params, stream=True) as response:
+            response.raise_for_status()
+            with open(file_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(chunk)
+        return file_path
 
 
 class LoginWindow(QWidget):
@@ -342,8 +476,8 @@ class ChartWidget(QWidget):
         self.figure.clear()
         ax = self.figure.add_subplot(111)
         ax.set_facecolor('#ffffff')
-        colors = ['#0284c7', '#14b8a6', '#84cc16']
-        bars = ax.bar(labels, values, color=colors[:len(labels)], 
+        colors = ['#0284c7', '#14b8a6', '#84cc16', '#8b5cf6']
+        bars = ax.bar(labels, values, color=[colors[i % len(colors)] for i in range(len(labels))], 
                      edgecolor='#e5e5e5', linewidth=1)
         if title:
             ax.set_title(title, fontsize=14, fontweight='bold', color='#171717', pad=20)
@@ -359,6 +493,57 @@ class ChartWidget(QWidget):
         ax.set_axisbelow(True)
         self.figure.subplots_adjust(left=0.15, right=0.95, top=0.9, bottom=0.15)
         self.canvas.draw()
+    
+    def plot_series_chart(self, series_list):
+        """Plot downsampled parameter series, one row per parameter"""
+        self.figure.clear()
+        colors = ['#0284c7', '#14b8a6', '#84cc16']
+        for i, series in enumerate(series_list):
+            ax = self.figure.add_subplot(len(series_list), 1, i + 1)
+            ax.set_facecolor('#ffffff')
+            ax.plot([x + 1 for x in series['x']], series['y'],
+                    color=colors[i % len(colors)], linewidth=1)
+            ax.set_ylabel(series['parameter'].capitalize(), fontsize=10, color='#737373')
+            ax.tick_params(colors='#737373', labelsize=9)
+            ax.spines['top'].set_visible(False)
+            ax.spines['right'].set_visible(False)
+            ax.spines['left'].set_color('#e5e5e5')
+            ax.spines['bottom'].set_color('#e5e5e5')
+            ax.grid(axis='y', alpha=0.2, linestyle='-', linewidth=0.5)
+        self.figure.subplots_adjust(left=0.12, right=0.97, top=0.95, bottom=0.08, hspace=0.35)
+        self.canvas.draw()
+
+
+class ChangePoller(QThread):
+    """Polls the backend for dataset changes without blocking the UI"""
+    
+    changes_ready = pyqtSignal(dict)
+    
+    def __init__(self, api_client, interval_ms=AUTO_REFRESH_INTERVAL_MS):
+        super().__init__()
+        self.api_client = api_client
+        self.interval_ms = interval_ms
+        self.cursor = None
+    
+    def run(self):
+        while not self.isInterruptionRequested():
+            try:
+                changes = self.api_client.get_dataset_changes(self.cursor)
+            except (requests.RequestException, ValueError):
+                changes = {}
+            # Errors (e.g. an expired token) keep the cursor for the next try
+            if 'cursor' in changes:
+                self.cursor = changes['cursor']
+                self.changes_ready.emit(changes)
+            # Sleep in short steps so stop() does not wait a whole interval
+            for _ in range(self.interval_ms // 100):
+                if self.isInterruptionRequested():
+                    return
+                self.msleep(100)
+    
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
 
 
 class DashboardWindow(QMainWindow):
@@ -369,9 +554,16 @@ class DashboardWindow(QMainWindow):
         self.api_client = api_client
         self.user = user
         self.datasets = []
+        # Dataset id -> its sidebar button
+        self.dataset_buttons = {}
         self.current_dataset = None
         self.init_ui()
         self.load_datasets()
+        
+        # Datasets uploaded, appended or deleted by other sessions
+        self.poller = ChangePoller(self.api_client)
+        self.poller.changes_ready.connect(self.apply_dataset_changes)
+        self.poller.start()
     
     def init_ui(self):
         self.setWindowTitle("ChemParaViz - Dashboard")
@@ -563,37 +755,88 @@ class DashboardWindow(QMainWindow):
             child = self.datasets_layout.takeAt(0)
             if child.widget():
                 child.widget().deleteLater()
+        self.dataset_buttons = {}
         
         # Add dataset items
         for dataset in self.datasets:
-            item = QPushButton(f"{dataset['filename']}\n{dataset['uploaded_at'][:10]}")
-            item.setStyleSheet("""
-                QPushButton {
-                    background: transparent;
-                    border: 1px solid transparent;
-                    border-radius: 2px;
-                    padding: 12px;
-                    text-align: left;
-                    font-size: 13px;
-                    color: #171717;
-                }
-                QPushButton:hover {
-                    background: #fafafa;
-                    border-color: #e5e5e5;
-                }
-            """)
-            item.clicked.connect(lambda checked, d=dataset: self.load_dataset_detail(d['id']))
-            self.datasets_layout.addWidget(item)
+            self.datasets_layout.addWidget(self.create_dataset_button(dataset))
+    
+    def apply_dataset_changes(self, changes):
+        """
+        Patch the sidebar with polled changes: only buttons of added, changed
+        or deleted datasets are touched. The open dataset is reloaded when it
+        changed and closed when it was deleted.
+        """
+        changed = {dataset['id']: dataset for dataset in changes['changed']}
+        known = {dataset['id']: dataset for dataset in self.datasets}
+        deleted = set(changes['deleted']) & known.keys()
+        if changes['reset']:
+            deleted |= known.keys() - changed.keys()
+        
+        for dataset_id in deleted:
+            button = self.dataset_buttons.pop(dataset_id)
+            self.datasets_layout.removeWidget(button)
+            button.deleteLater()
+        self.datasets = [dataset for dataset in self.datasets if dataset['id'] not in deleted]
+        
+        for dataset_id, dataset in changed.items():
+            previous = known.get(dataset_id)
+            if previous is None:
+                # Keep the newest-first order of the list
+                position = sum(1 for other in self.datasets if other['uploaded_at'] > dataset['uploaded_at'])
+                self.datasets.insert(position, dataset)
+                self.datasets_layout.insertWidget(position, self.create_dataset_button(dataset))
+            elif previous.get('updated_at') != dataset['updated_at']:
+                previous.update(dataset)
+                self.dataset_buttons[dataset_id].setText(self.dataset_label(dataset))
+                if dataset_id == self.current_dataset:
+                    self.load_dataset_detail(dataset_id)
+        
+        if self.current_dataset in deleted:
+            self.current_dataset = None
+            self.data_view.hide()
+            self.empty_state.show()
+    
+    def dataset_label(self, dataset):
+        return f"{dataset['filename']}\n{dataset['uploaded_at'][:10]}"
+    
+    def create_dataset_button(self, dataset):
+        item = QPushButton(self.dataset_label(dataset))
+        item.setStyleSheet("""
+            QPushButton {
+                background: transparent;
+                border: 1px solid transparent;
+                border-radius: 2px;
+                padding: 12px;
+                text-align: left;
+                font-size: 13px;
+                color: #171717;
+            }
+            QPushButton:hover {
+                background: #fafafa;
+                border-color: #e5e5e5;
+            }
+        """)
+        item.clicked.connect(lambda checked, d=dataset: self.load_dataset_detail(d['id']))
+        self.dataset_buttons[dataset['id']] = item
+        return item
     
     def upload_file(self):
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "Select CSV File", "", "CSV Files (*.csv)"
+            self, "Select CSV File", "", "CSV Files (*.csv *.csv.gz *.csv.zst *.zip)"
         )
         
         if file_path:
             try:
-                result = self.api_client.upload_dataset(file_path)
-                QMessageBox.information(self, "Success", "Dataset uploaded successfully!")
+                if os.path.getsize(file_path) > RESUMABLE_UPLOAD_THRESHOLD:
+                    result = self.api_client.upload_dataset_resumable(file_path)
+                else:
+                    result = self.api_client.upload_dataset(file_path)
+                message = "Dataset uploaded successfully!"
+                skipped = result.get('validation_report', {}).get('rows_rejected', 0)
+                if skipped:
+                    message += f" {skipped} invalid rows were skipped."
+                QMessageBox.information(self, "Success", message)
                 self.load_datasets()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to upload: {str(e)}")
@@ -655,11 +898,15 @@ class DashboardWindow(QMainWindow):
         stats_layout.setSpacing(16)
         stats_layout.setContentsMargins(0, 0, 0, 20)
         
-        stats_data = [
-            ("TOTAL EQUIPMENT", str(detail['total_count'])),
-            ("AVG FLOWRATE", f"{detail['averages']['flowrate']:.2f}"),
-            ("AVG PRESSURE", f"{detail['averages']['pressure']:.2f}"),
-            ("AVG TEMPERATURE", f"{detail['averages']['temperature']:.2f}")
+        # Core parameters first, then any extras from the column mapping
+        parameters = detail['parameters']
+        averages = detail['averages']
+        stats_data = [("TOTAL EQUIPMENT", str(detail['total_count']))] + [
+            (
+                f"AVG {parameter['label'].upper()}",
+                '-' if averages[parameter['key']] is None else f"{averages[parameter['key']]:.2f}"
+            )
+            for parameter in parameters
         ]
         
         for i, (label, value) in enumerate(stats_data):
@@ -684,7 +931,7 @@ class DashboardWindow(QMainWindow):
             stat_value.setStyleSheet("color: #171717; background: transparent; border: none;")
             stat_layout_inner.addWidget(stat_value)
             
-            stats_layout.addWidget(stat_card, 0, i)
+            stats_layout.addWidget(stat_card, i // 4, i % 4)
         
         self.data_view_layout.addWidget(stats_widget)
         
@@ -705,11 +952,10 @@ class DashboardWindow(QMainWindow):
         # Bar chart
         bar_container = self.create_chart_card("Average Parameters")
         bar_widget = ChartWidget()
+        averaged = [parameter for parameter in parameters if averages[parameter['key']] is not None]
         bar_widget.plot_bar_chart(
-            ['Flowrate', 'Pressure', 'Temperature'],
-            [detail['averages']['flowrate'], 
-             detail['averages']['pressure'],
-             detail['averages']['temperature']],
+            [parameter['label'] for parameter in averaged],
+            [averages[parameter['key']] for parameter in averaged],
             ""
         )
         bar_container.layout().addWidget(bar_widget)
@@ -717,27 +963,35 @@ class DashboardWindow(QMainWindow):
         
         self.data_view_layout.addWidget(charts_widget)
         
+        # Parameter trends, downsampled server-side to a fixed point budget
+        trend_container = self.create_chart_card("Parameter Trends")
+        trend_widget = ChartWidget()
+        trend_widget.setMinimumHeight(360)
+        trend_widget.plot_series_chart([
+            self.api_client.get_dataset_series(self.current_dataset, parameter)
+            for parameter in ['flowrate', 'pressure', 'temperature']
+        ])
+        trend_container.layout().addWidget(trend_widget)
+        self.data_view_layout.addWidget(trend_container)
+        
         # Table
         table_container = self.create_chart_card("Equipment Details")
         table = QTableWidget()
-        table.setColumnCount(5)
-        table.setHorizontalHeaderLabels(['Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'])
+        table.setColumnCount(2 + len(parameters))
+        table.setHorizontalHeaderLabels(['Name', 'Type'] + [parameter['label'] for parameter in parameters])
         table.setRowCount(len(detail['equipment_details']))
         
         for i, eq in enumerate(detail['equipment_details']):
             table.setItem(i, 0, QTableWidgetItem(eq['equipment_name']))
             table.setItem(i, 1, QTableWidgetItem(eq['equipment_type']))
-            table.setItem(i, 2, QTableWidgetItem(str(eq['flowrate'])))
-            table.setItem(i, 3, QTableWidgetItem(str(eq['pressure'])))
-            table.setItem(i, 4, QTableWidgetItem(str(eq['temperature'])))
+            for j, parameter in enumerate(parameters):
+                value = eq[parameter['key']]
+                table.setItem(i, 2 + j, QTableWidgetItem('-' if value is None else str(value)))
         
         # Stretch columns to fill space
         header = table.horizontalHeader()
-        header.setSectionResizeMode(0, header.Stretch)
-        header.setSectionResizeMode(1, header.Stretch)
-        header.setSectionResizeMode(2, header.Stretch)
-        header.setSectionResizeMode(3, header.Stretch)
-        header.setSectionResizeMode(4, header.Stretch)
+        for column in range(table.columnCount()):
+            header.setSectionResizeMode(column, header.Stretch)
         table.verticalHeader().setVisible(False)
         table.setAlternatingRowColors(True)
         table.setMinimumHeight(300)
@@ -803,11 +1057,19 @@ class DashboardWindow(QMainWindow):
                 QMessageBox.critical(self, "Error", f"Failed to delete dataset: {str(e)}")
     
     def logout(self):
+        try:
+            self.api_client.logout()
+        except requests.RequestException:
+            pass
         self.close()
         login_window = LoginWindow(self.api_client)
         login_window.login_success.connect(lambda token, user: show_dashboard(self.api_client, user))
         login_window.show()
         self.login_window = login_window
+    
+    def closeEvent(self, event):
+        self.poller.stop()
+        super().closeEvent(event)
 
 
 def show_dashboard(api_client, user):
@@ -8,6 +8,17 @@ import './Dashboard.css';
 
 ChartJS.register(ArcElement, Tooltip, Legend, CategoryScale, LinearScale, BarElement, Title, PointElement, LineElement, BoxPlotController, BoxAndWiskers);
 
+// Maximum points requested for the dynamic visualizer, whatever the dataset size
+const SERIES_POINT_BUDGET = 1000;
+
+const PARAMETER_COLORS = {
+  flowrate: '#0284c7',
+  pressure: '#14b8a6',
+  temperature: '#84cc16',
+};
+// Extra parameters from a column mapping
+const EXTRA_PARAMETER_COLOR = '#8b5cf6';
+
 const Dashboard = () => {
   const [datasets, setDatasets] = useState([]);
   const [selectedDataset, setSelectedDataset] = useState(null);
@@ -20,6 +31,7 @@ const Dashboard = () => {
   const [selectedEquipmentType, setSelectedEquipmentType] = useState('all');
   const [selectedParameter, setSelectedParameter] = useState('flowrate');
   const [selectedChartType, setSelectedChartType] = useState('scatter');
+  const [series, setSeries] = useState(null);
 
   useEffect(() => {
     fetchDatasets();
@@ -38,11 +50,34 @@ const Dashboard = () => {
     }
   };
 
+  // Fetch a server-side downsampled series for the dynamic visualizer
+  useEffect(() => {
+    if (!selectedDataset) {
+      setSeries(null);
+      return;
+    }
+    const params = {
+      parameter: selectedParameter,
+      points: SERIES_POINT_BUDGET,
+      method: 'lttb',
+    };
+    if (selectedEquipmentType !== 'all') {
+      params.type = selectedEquipmentType;
+    }
+    datasetAPI.getSeries(selectedDataset, params)
+      .then((response) => setSeries(response.data))
+      .catch(() => setSeries(null));
+  }, [selectedDataset, selectedEquipmentType, selectedParameter]);
+
   const loadDatasetDetail = async (datasetId) => {
     try {
       const response = await datasetAPI.getDetail(datasetId);
       setDatasetDetail(response.data);
       setSelectedDataset(datasetId);
+      // Extra parameters differ between datasets
+      if (!response.data.parameters.some((parameter) => parameter.key === selectedParameter)) {
+        setSelectedParameter('flowrate');
+      }
     } catch (err) {
       setError('Failed to load dataset details');
     }
@@ -52,8 +87,8 @@ const Dashboard = () => {
     const file = e.target.files[0];
     if (!file) return;
 
-    if (!file.name.endsWith('.csv')) {
-      setError('Please upload a CSV file');
+    if (!/\.(csv|csv\.gz|csv\.zst|zip)$/i.test(file.name)) {
+      setError('Please upload a CSV file (.csv, .csv.gz, .csv.zst or .zip)');
       return;
     }
 
@@ -62,8 +97,13 @@ const Dashboard = () => {
     setSuccess('');
 
     try {
-      await datasetAPI.upload(file);
-      setSuccess('Dataset uploaded successfully!');
+      const response = await datasetAPI.upload(file);
+      const skipped = response.data.validation_report?.rows_rejected || 0;
+      setSuccess(
+        skipped
+          ? `Dataset uploaded successfully! ${skipped} invalid rows were skipped.`
+          : 'Dataset uploaded successfully!'
+      );
       fetchDatasets();
       e.target.value = '';
     } catch (err) {
@@ -132,16 +172,14 @@ const Dashboard = () => {
     if (!datasetDetail) return null;
 
     return {
-      labels: ['Flowrate', 'Pressure', 'Temperature'],
+      labels: datasetDetail.parameters.map((parameter) => parameter.label),
       datasets: [
         {
           label: 'Average Values',
-          data: [
-            datasetDetail.averages.flowrate,
-            datasetDetail.averages.pressure,
-            datasetDetail.averages.temperature,
-          ],
-          backgroundColor: ['#0284c7', '#14b8a6', '#84cc16'],
+          data: datasetDetail.parameters.map((parameter) => datasetDetail.averages[parameter.key]),
+          backgroundColor: datasetDetail.parameters.map(
+            (parameter) => PARAMETER_COLORS[parameter.key] || EXTRA_PARAMETER_COLOR
+          ),
           borderWidth: 1,
           borderColor: '#e5e5e5',
         },
@@ -284,40 +322,27 @@ const Dashboard = () => {
     return Object.keys(datasetDetail.equipment_type_distribution);
   };
 
-  // Filter equipment data based on selected type
-  const getFilteredEquipment = () => {
-    if (!datasetDetail) return [];
-    if (selectedEquipmentType === 'all') {
-      return datasetDetail.equipment_details;
-    }
-    return datasetDetail.equipment_details.filter(
-      eq => eq.equipment_type === selectedEquipmentType
-    );
-  };
-
-  // Generate dynamic chart data
+  // Generate dynamic chart data from the downsampled series
   const getDynamicChartData = () => {
-    const filtered = getFilteredEquipment();
-    if (filtered.length === 0) return null;
+    if (!series || series.x.length === 0) return null;
 
-    const labels = filtered.map((_, idx) => `#${idx + 1}`);
-    const parameterData = filtered.map(eq => parseFloat(eq[selectedParameter]));
+    const positions = series.x.map(x => x + 1);
+    const labels = positions.map(position => `#${position}`);
+    const parameterData = series.y;
 
-    const colors = {
-      flowrate: '#0284c7',
-      pressure: '#14b8a6',
-      temperature: '#84cc16',
-    };
+    const color = PARAMETER_COLORS[selectedParameter] || EXTRA_PARAMETER_COLOR;
+    const parameter = datasetDetail?.parameters.find((item) => item.key === selectedParameter);
+    const label = parameter ? parameter.label : selectedParameter;
 
     if (selectedChartType === 'line') {
       return {
         labels,
         datasets: [
           {
-            label: selectedParameter.charAt(0).toUpperCase() + selectedParameter.slice(1),
+            label,
             data: parameterData,
-            borderColor: colors[selectedParameter],
-            backgroundColor: colors[selectedParameter] + '40',
+            borderColor: color,
+            backgroundColor: color + '40',
             tension: 0.4,
             fill: true,
           },
@@ -327,10 +352,10 @@ const Dashboard = () => {
       return {
         datasets: [
           {
-            label: selectedParameter.charAt(0).toUpperCase() + selectedParameter.slice(1),
-            data: parameterData.map((value, idx) => ({ x: idx + 1, y: value })),
-            backgroundColor: colors[selectedParameter],
-            borderColor: colors[selectedParameter],
+            label,
+            data: parameterData.map((value, idx) => ({ x: positions[idx], y: value })),
+            backgroundColor: color,
+            borderColor: color,
             pointRadius: 4,
           },
         ],
@@ -341,9 +366,9 @@ const Dashboard = () => {
         labels,
         datasets: [
           {
-            label: selectedParameter.charAt(0).toUpperCase() + selectedParameter.slice(1),
+            label,
             data: parameterData,
-            backgroundColor: colors[selectedParameter],
+            backgroundColor: color,
             borderWidth: 1,
             borderColor: '#e5e5e5',
           },
@@ -363,7 +388,7 @@ const Dashboard = () => {
             <label className="file-upload">
               <input
                 type="file"
-                accept=".csv"
+                accept=".csv,.gz,.zst,.zip"
                 onChange={handleFileUpload}
                 disabled={uploading}
               />
@@ -417,18 +442,12 @@ const Dashboard = () => {
                   <h3>Total Equipment</h3>
                   <p className="stat-value">{datasetDetail.total_count}</p>
                 </div>
-                <div className="stat-card">
-                  <h3>Avg Flowrate</h3>
-                  <p className="stat-value">{datasetDetail.averages.flowrate}</p>
-                </div>
-                <div className="stat-card">
-                  <h3>Avg Pressure</h3>
-                  <p className="stat-value">{datasetDetail.averages.pressure}</p>
-                </div>
-                <div className="stat-card">
-                  <h3>Avg Temperature</h3>
-                  <p className="stat-value">{datasetDetail.averages.temperature}</p>
-                </div>
+                {datasetDetail.parameters.map((parameter) => (
+                  <div className="stat-card" key={parameter.key}>
+                    <h3>Avg {parameter.label}</h3>
+                    <p className="stat-value">{datasetDetail.averages[parameter.key] ?? '-'}</p>
+                  </div>
+                ))}
               </div>
 
               <div className="charts-grid">
@@ -569,9 +588,9 @@ const Dashboard = () => {
                       value={selectedParameter} 
                       onChange={(e) => setSelectedParameter(e.target.value)}
                     >
-                      <option value="flowrate">Flowrate</option>
-                      <option value="pressure">Pressure</option>
-                      <option value="temperature">Temperature</option>
+                      {datasetDetail.parameters.map((parameter) => (
+                        <option key={parameter.key} value={parameter.key}>{parameter.label}</option>
+                      ))}
                     </select>
                   </div>
                   <div className="filter-group">
@@ -587,9 +606,13 @@ const Dashboard = () => {
                   </div>
                 </div>
                 <div className="chart-container">
-                  {selectedChartType === 'line' && <Line data={getDynamicChartData()} />}
-                  {selectedChartType === 'scatter' && <Scatter data={getDynamicChartData()} />}
-                  {selectedChartType === 'bar' && <Bar data={getDynamicChartData()} />}
+                  {getDynamicChartData() && (
+                    <>
+                      {selectedChartType === 'line' && <Line data={getDynamicChartData()} />}
+                      {selectedChartType === 'scatter' && <Scatter data={getDynamicChartData()} />}
+                      {selectedChartType === 'bar' && <Bar data={getDynamicChartData()} />}
+                    </>
+                  )}
                 </div>
               </div>
 
@@ -601,9 +624,9 @@ const Dashboard = () => {
                       <tr>
                         <th>Equipment Name</th>
                         <th>Type</th>
-                        <th>Flowrate</th>
-                        <th>Pressure</th>
-                        <th>Temperature</th>
+                        {datasetDetail.parameters.map((parameter) => (
+                          <th key={parameter.key}>{parameter.label}</th>
+                        ))}
                       </tr>
                     </thead>
                     <tbody>
@@ -611,9 +634,9 @@ const Dashboard = () => {
                         <tr key={idx}>
                           <td>{eq.equipment_name}</td>
                           <td>{eq.equipment_type}</td>
-                          <td>{eq.flowrate}</td>
-                          <td>{eq.pressure}</td>
-                          <td>{eq.temperature}</td>
+                          {datasetDetail.parameters.map((parameter) => (
+                            <td key={parameter.key}>{eq[parameter.key] ?? '-'}</td>
+                          ))}
                         </tr>
                       ))}
                     </tbody>
@@ -57,6 +57,10 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    // Revoke the token server side; local state is cleared either way
+    if (token) {
+      authAPI.logout(token).catch(() => {});
+    }
     localStorage.removeItem('token');
     localStorage.removeItem('user');
     setToken(null);
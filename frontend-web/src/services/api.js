@@ -31,6 +31,10 @@ export const authAPI = {
     api.post('/auth/register/', { username, password, email }),
   login: (username, password) =>
     api.post('/auth/login/', { username, password }),
+  // The token is passed explicitly since it is cleared from storage right away
+  logout: (token) =>
+    api.post('/auth/logout/', null, { headers: { Authorization: `Token ${token}` } }),
+  rotateToken: () => api.post('/auth/token/rotate/'),
 };
 
 // Dataset APIs
@@ -44,12 +48,30 @@ export const datasetAPI = {
       },
     });
   },
+  append: (id, file) => {
+    const formData = new FormData();
+    formData.append('file', file);
+    return api.post(`/dataset/${id}/append/`, formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    });
+  },
   getAll: () => api.get('/datasets-list/'),
   getDetail: (id) => api.get(`/dataset/${id}/`),
   delete: (id) => api.delete(`/dataset/${id}/delete/`),
+  getSeries: (id, params) =>
+    api.get(`/dataset/${id}/series/`, { params }),
+  exportDataset: (id, params) =>
+    api.get(`/dataset/${id}/export/`, { params, responseType: 'blob' }),
   downloadReport: (id) => 
     api.get(`/dataset/${id}/report/`, { responseType: 'blob' }),
+  getAnomalies: (id, params) =>
+    api.get(`/dataset/${id}/anomalies/`, { params }),
+  getThresholds: () => api.get('/thresholds/'),
+  setThresholds: (thresholds) => api.put('/thresholds/', thresholds),
   getHistory: () => api.get('/history/'),
+  compare: (ids) => api.get('/compare/', { params: { ids: ids.join(',') } }),
 };
 
 export default api;